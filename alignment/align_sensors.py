@@ -0,0 +1,639 @@
+#!/usr/bin/env python3
+import argparse
+import csv
+import heapq
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# The decoders live in the sensor folders next to this one
+_ROOT = Path(__file__).resolve().parent.parent
+for _folder in ("omniscan450", "pings", "telemetry"):
+    if str(_ROOT / _folder) not in sys.path:
+        sys.path.insert(0, str(_ROOT / _folder))
+from compressed_io import open_output, strip_compression_suffix
+
+"""
+    Puts the Omniscan 450, Ping1D/Ping360 and telemetry (.tlog) data on one timeline, and
+    interpolates the vehicle's attitude, position and altitude at every sonar ping.
+
+    Every sensor keeps its own clock:
+
+        Omniscan 450    timestamp_ms, milliseconds since the sonar powered up
+        Ping1D/Ping360  the file name's start time (topside computer's local time) plus an
+                        'hh:mm:ss.xxx' offset
+        .tlog           time_boot_ms, milliseconds since the autopilot booted; SYSTEM_TIME
+                        messages pair it with the Unix time, and every record also carries
+                        the (UTC) time QGroundControl received it
+
+    A ClockModel maps a device clock onto UTC nanoseconds since 1970 ("time_ns"). Each sensor
+    is then read as a Stream of blocks (dicts of NumPy arrays, one row per sample), so only a
+    block or two per sensor is in memory at once, however long the dive.
+
+    merge_streams() does a k-way merge of the streams into one timeline. align() follows that
+    timeline, buffering just enough of the attitude/position/altitude streams to interpolate
+    them (with np.searchsorted, a whole block of pings at a time) at each ping.
+"""
+
+NS_PER_MS = 1000000
+NS_PER_S = 1000000000
+
+# ==========================================================================
+# Section: Mapping device clocks onto a common epoch
+# ==========================================================================
+
+class ClockModel:
+    """
+    Maps a device clock onto UTC nanoseconds since 1970:
+
+        time_ns = epoch_ns + scale * (device_time * unit_ns - device_ns)
+
+    i.e. device time device_ns (in ns) happened at epoch_ns, and the device clock runs at 1/scale
+    of real time (scale is 1 unless fitted from several pairs, to take out clock drift).
+
+    Args:
+        device_ns: A device time, in ns.
+        epoch_ns: The UTC time (ns since 1970) that device time corresponds to.
+        scale: Real ns per device ns.
+        unit_ns: Length of one unit of the device clock, in ns (e.g. 1e6 for milliseconds).
+    """
+
+    def __init__(self, device_ns, epoch_ns, scale=1.0, unit_ns=1):
+        self.device_ns = int(device_ns)
+        self.epoch_ns = int(epoch_ns)
+        self.scale = float(scale)
+        self.unit_ns = unit_ns
+
+    @classmethod
+    def from_pair(cls, device_time, epoch_ns, unit_ns=1):
+        """A clock with no drift, where device_time (in units) happened at epoch_ns."""
+        return cls(int(device_time) * unit_ns, epoch_ns, 1.0, unit_ns)
+
+    @classmethod
+    def fit(cls, device_times, epoch_ns, unit_ns=1, lower_envelope=False):
+        """
+        Fit a clock (offset and drift) to pairs of (device time, UTC time) by least squares.
+
+        Args:
+            device_times: Device times, in units.
+            epoch_ns: The UTC time (ns since 1970) of each device time.
+            lower_envelope: If True, the UTC times are taken to be late by a varying delay (e.g. the
+                time a message was received), so the line is moved down to the earliest of them.
+        """
+        device_ns = np.asarray(device_times, dtype=np.int64) * unit_ns
+        epoch_ns = np.asarray(epoch_ns, dtype=np.int64)
+        if len(device_ns) == 0:
+            raise ValueError("Can't fit a clock to no pairs")
+        x0 = int(device_ns[0])
+        y0 = int(epoch_ns[0])
+        # Work relative to the first pair, so that nothing is lost to floating point
+        x = (device_ns - x0).astype(np.float64)
+        y = (epoch_ns - y0).astype(np.float64)
+        if len(x) > 1 and np.ptp(x) > 0:
+            scale, intercept = np.polyfit(x, y, 1)
+        else:
+            scale, intercept = 1.0, float(np.median(y - x))
+        if lower_envelope:
+            intercept += float(np.min(y - (scale * x + intercept)))
+        return cls(x0, y0 + int(round(intercept)), scale, unit_ns)
+
+    def to_epoch_ns(self, device_time):
+        """Convert device times (in units) to int64 UTC ns since 1970."""
+        device_ns = np.asarray(device_time, dtype=np.int64) * self.unit_ns - self.device_ns
+        if self.scale == 1.0:
+            return device_ns + self.epoch_ns
+        return np.rint(device_ns * self.scale).astype(np.int64) + self.epoch_ns
+
+    def __repr__(self):
+        start = pd.Timestamp(self.epoch_ns)
+        return f"ClockModel(device {self.device_ns} ns = {start}, drift {(self.scale - 1) * 1e6:+.1f} ppm)"
+
+
+def local_to_utc_ns(naive_ns, timezone="UTC"):
+    """
+    Convert times that are in some timezone's local time (but stored as if they were UTC, like
+    PingViewer's file names) to real UTC. The offset is taken at the first time, so a dive that
+    runs across a daylight saving change keeps one offset.
+    """
+    naive_ns = np.asarray(naive_ns, dtype=np.int64)
+    if timezone in (None, "UTC") or len(naive_ns) == 0:
+        return naive_ns
+    offset = pd.Timestamp(int(naive_ns.flat[0])).tz_localize(timezone).utcoffset()
+    return naive_ns - int(offset.total_seconds() * NS_PER_S)
+
+# ==========================================================================
+# Section: Streams and the k-way merge
+# ==========================================================================
+
+class Stream:
+    """
+    One sensor's samples, in time order, as blocks: dicts of equally long NumPy arrays with a
+    "time_ns" column. Blocks are produced lazily from an iterable, and each is sorted by time as
+    it arrives. Samples that would go back in time past the end of an earlier block (e.g. after a
+    device reboot resets its clock) are dropped and counted in self.dropped.
+
+    Args:
+        name: Name of the stream, e.g. "attitude".
+        blocks: Iterable of blocks.
+    """
+
+    def __init__(self, name, blocks):
+        self.name = name
+        self.blocks = blocks
+        self.dropped = 0
+
+    def __iter__(self):
+        last = None
+        for block in self.blocks:
+            times = block["time_ns"]
+            if len(times) > 1 and np.any(times[1:] < times[:-1]):
+                order = np.argsort(times, kind="stable")
+                block = {name: column[order] for name, column in block.items()}
+                times = block["time_ns"]
+            if last is not None and len(times) and times[0] < last:
+                keep = np.searchsorted(times, last)
+                self.dropped += int(keep)
+                block = {name: column[keep:] for name, column in block.items()}
+                times = block["time_ns"]
+            if len(times):
+                last = int(times[-1])
+                yield block
+
+
+class TimelineBatch:
+    """
+    A piece of the merged timeline: every sample of every stream between two points in time.
+
+    Attributes:
+        blocks: {stream name: block} of this batch's samples from each stream (missing if none).
+        time_ns: Times of all the samples, merged in time order.
+        stream: Index (into names) of the stream of each sample in time_ns.
+        row: Row of each sample within its stream's block.
+        names: Stream names, in the order given to merge_streams.
+        ended: Names of the streams that have no samples after this batch.
+    """
+
+    def __init__(self, names, blocks, ended=()):
+        self.names = names
+        self.blocks = blocks
+        self.ended = set(ended)
+        indices = [(names.index(name), block) for name, block in blocks.items()]
+        times = np.concatenate([block["time_ns"] for _, block in indices])
+        streams = np.concatenate([np.full(len(block["time_ns"]), index, dtype=np.int16) for index, block in indices])
+        rows = np.concatenate([np.arange(len(block["time_ns"])) for _, block in indices])
+        order = np.lexsort((streams, times))  # By time, then by stream order for ties
+        self.time_ns = times[order]
+        self.stream = streams[order]
+        self.row = rows[order]
+
+
+def merge_streams(streams):
+    """
+    K-way merge of time-ordered streams into one timeline, a batch at a time.
+
+    Each stream has one block buffered at a time. A heap keyed on the last time in each stream's
+    buffer gives the watermark: the earliest of those times. Every buffered sample up to the
+    watermark can be emitted in one batch, since no stream can produce anything earlier; the
+    stream(s) that reached the watermark then read their next block. A stream that runs out is
+    reported in the ended set of the batch that holds its last samples (or of the first batch,
+    if it has none at all).
+
+    Args:
+        streams: Streams to merge.
+
+    Yields:
+        TimelineBatch: Consecutive batches of the timeline, in time order.
+    """
+    names = [stream.name for stream in streams]
+    iterators = [iter(stream) for stream in streams]
+    buffers = [None] * len(streams)
+    heap = []  # (last time in the stream's buffer, stream index)
+
+    def refill(index):
+        block = next(iterators[index], None)
+        buffers[index] = block
+        if block is not None:
+            heapq.heappush(heap, (int(block["time_ns"][-1]), index))
+
+    for index in range(len(streams)):
+        refill(index)
+    ended = {names[index] for index, block in enumerate(buffers) if block is None}
+
+    while heap:
+        watermark, _ = heap[0]
+        batch = {}
+        for index, block in enumerate(buffers):
+            if block is None:
+                continue
+            end = int(np.searchsorted(block["time_ns"], watermark, side="right"))
+            if end == 0:
+                continue
+            batch[names[index]] = {name: column[:end] for name, column in block.items()}
+            buffers[index] = {name: column[end:] for name, column in block.items()}
+        # Streams whose buffer is now empty read their next block, so the batch can tell which ran out
+        while heap and len(buffers[heap[0][1]]["time_ns"]) == 0:
+            _, index = heapq.heappop(heap)
+            refill(index)
+            if buffers[index] is None:
+                ended.add(names[index])
+        yield TimelineBatch(names, batch, ended)
+        ended = set()
+
+# ==========================================================================
+# Section: Interpolating reference streams at the sonar pings
+# ==========================================================================
+
+def interpolate(times, values, query_times, max_gap_ns, wrap=None):
+    """
+    Linearly interpolate samples at query times, with np.searchsorted.
+
+    Args:
+        times: int64 sample times (sorted).
+        values: Sample values.
+        query_times: int64 times to interpolate at.
+        max_gap_ns: Query times between samples further apart than this (or outside the
+            samples) get NaN.
+        wrap: For angles, the (low, high) range they wrap around in, e.g. (-pi, pi) or (0, 360):
+            values are unwrapped first, so interpolating across the wrap-around goes the short way,
+            and the results are wrapped back into the range.
+
+    Returns:
+        np.ndarray: float64 interpolated values.
+    """
+    query_times = np.asarray(query_times, dtype=np.int64)
+    result = np.full(len(query_times), np.nan)
+    if len(times) == 0:
+        return result
+    values = np.asarray(values, dtype=np.float64)
+    if wrap is not None:
+        low, high = wrap
+        values = np.unwrap(values, period=high - low)
+    after = np.searchsorted(times, query_times, side="left")
+    exact = (after < len(times)) & (times[np.minimum(after, len(times) - 1)] == query_times)
+    result[exact] = values[after[exact]]
+
+    inside = ~exact & (after > 0) & (after < len(times))
+    right = after[inside]
+    left = right - 1
+    span = times[right] - times[left]
+    ok = span <= max_gap_ns
+    weight = (query_times[inside] - times[left]) / span
+    interpolated = values[left] + weight * (values[right] - values[left])
+    result[np.flatnonzero(inside)[ok]] = interpolated[ok]
+    if wrap is not None:
+        result = (result - low) % (high - low) + low
+    return result
+
+
+class Reference:
+    """
+    A stream to interpolate at the pings.
+
+    Args:
+        stream: The Stream.
+        columns: {output column name: stream column name} to interpolate.
+        wraps: {output column name: (low, high)} for the angular columns (see interpolate()).
+    """
+
+    def __init__(self, stream, columns, wraps=None):
+        self.stream = stream
+        self.columns = columns
+        self.wraps = wraps or {}
+
+
+def align(targets, references, max_gap_ns=NS_PER_S):
+    """
+    Follow the merged timeline of target (e.g. sonar ping) and reference (e.g. attitude) streams,
+    and interpolate every reference at every target sample.
+
+    A target sample can be interpolated once every reference has a sample at or after it, has
+    ended, or has had no sample up to it (its samples can only come later, so it gives NaN).
+    Until then it waits, and each reference keeps only the samples from the one just before the
+    earliest waiting target onwards, so memory stays bounded.
+
+    Args:
+        targets: Streams whose samples to interpolate at.
+        references: References to interpolate.
+        max_gap_ns: Don't interpolate across gaps in a reference longer than this (the result is NaN).
+
+    Yields:
+        dict: Blocks of aligned target samples, in time order: the targets' own columns (so all the
+            targets must have the same columns), a "stream" column with the name of each sample's
+            target stream, and one column per interpolated reference column.
+    """
+    reference_names = {reference.stream.name: reference for reference in references}
+    target_names = [target.name for target in targets]
+    buffers = {name: None for name in reference_names}  # Buffered reference samples
+    pending = {name: [] for name in target_names}  # Target blocks waiting for the references to catch up
+    finished = set()
+    streams = list(targets) + [reference.stream for reference in references]
+
+    def extend(buffer, block):
+        if buffer is None:
+            return block
+        return {name: np.concatenate([buffer[name], block[name]]) for name in buffer}
+
+    def ready_until(watermark):
+        # Targets up to this time have every reference sample they need. Nothing in the timeline
+        # comes before the watermark any more, so a reference with no samples yet can't help them.
+        limits = [int(buffer["time_ns"][-1]) if buffer is not None else watermark
+                  for name, buffer in buffers.items() if name not in finished]
+        return min(limits, default=np.iinfo(np.int64).max)
+
+    def concatenate(pieces):
+        if len(pieces) == 1:
+            return pieces[0]
+        return {column: np.concatenate([piece[column] for piece in pieces]) for column in pieces[0]}
+
+    def take(blocks, limit):
+        # Remove and return the samples up to limit (all of them for None) from a list of blocks
+        taken = []
+        while blocks:
+            block = blocks[0]
+            end = len(block["time_ns"]) if limit is None else int(np.searchsorted(block["time_ns"], limit, side="right"))
+            if end == len(block["time_ns"]):
+                taken.append(blocks.pop(0))
+                continue
+            if end:
+                taken.append({column: values[:end] for column, values in block.items()})
+                blocks[0] = {column: values[end:] for column, values in block.items()}
+            break
+        return taken
+
+    def emit(limit):
+        # Take the ready part of every target, and put them together in time order
+        ready = []
+        for name in target_names:
+            taken = take(pending[name], limit)
+            if taken:
+                piece = concatenate(taken)
+                piece["stream"] = np.full(len(piece["time_ns"]), name, dtype=object)
+                ready.append(piece)
+        if not ready:
+            return
+        aligned = concatenate(ready)
+        if len(ready) > 1:
+            order = np.argsort(aligned["time_ns"], kind="stable")
+            aligned = {column: values[order] for column, values in aligned.items()}
+        for reference_name, reference in reference_names.items():
+            buffer = buffers[reference_name]
+            for output, column in reference.columns.items():
+                if buffer is None:
+                    aligned[output] = np.full(len(aligned["time_ns"]), np.nan)
+                else:
+                    aligned[output] = interpolate(buffer["time_ns"], buffer[column], aligned["time_ns"],
+                                                  max_gap_ns, reference.wraps.get(output))
+        yield aligned
+
+    def trim():
+        # Keep each reference from its last sample before the earliest waiting target (or its last sample)
+        waiting = [int(pending[name][0]["time_ns"][0]) for name in target_names if pending[name]]
+        for name, buffer in buffers.items():
+            if buffer is None:
+                continue
+            keep_from = min(waiting) if waiting else int(buffer["time_ns"][-1])
+            start = max(0, int(np.searchsorted(buffer["time_ns"], keep_from, side="right")) - 1)
+            if start:
+                buffers[name] = {column: values[start:] for column, values in buffer.items()}
+
+    for batch in merge_streams(streams):
+        for name, block in batch.blocks.items():
+            if name in buffers:
+                buffers[name] = extend(buffers[name], block)
+            else:
+                pending[name].append(block)
+        finished.update(batch.ended & buffers.keys())
+        yield from emit(ready_until(int(batch.time_ns[-1])))
+        trim()
+    finished.update(buffers)
+    yield from emit(None)
+
+# ==========================================================================
+# Section: Reading each sensor as a stream
+# ==========================================================================
+
+def omniscan_stream(svlog, sender_id, clock, channels=None, block_size=4096):
+    """
+    The mono profile pings of one Omniscan 450 (sender) in an .svlog file. Each sonar has its
+    own power-up clock, so each sender is a separate stream with its own ClockModel.
+
+    Columns: time_ns, sender_id, channel_number, ping_number, timestamp_ms, position (byte
+    offset of the packet in the file, to go back to the ping's pwr_results).
+    """
+    from waterfall import iter_mono_profile_blocks
+
+    def blocks():
+        for columns, _, _ in iter_mono_profile_blocks(svlog, block_size, sender_ids=[sender_id], channels=channels):
+            yield {
+                "time_ns": clock.to_epoch_ns(columns["timestamp_ms"]),
+                "sender_id": columns["sender_id"].copy(),
+                "channel_number": columns["channel_number"].copy(),
+                "ping_number": columns["ping_number"].copy(),
+                "timestamp_ms": columns["timestamp_ms"].copy(),
+                "position": columns["position"].copy(),
+            }
+    return Stream(f"omniscan_sender{sender_id}", blocks())
+
+
+def first_omniscan_timestamp_ms(svlog, sender_id):
+    """timestamp_ms of the first mono profile ping of a sender, or None if it has none."""
+    from waterfall import iter_mono_profile_blocks
+    blocks = iter_mono_profile_blocks(svlog, 1, sender_ids=[sender_id])
+    try:
+        for columns, _, _ in blocks:
+            return int(columns["timestamp_ms"][0])
+    finally:
+        blocks.close()
+    return None
+
+
+def omniscan_senders(svlog):
+    """The sender IDs that have mono profile pings in an .svlog file."""
+    from waterfall import iter_mono_profile_blocks
+    senders = set()
+    for columns, _, _ in iter_mono_profile_blocks(svlog):
+        senders.update(np.unique(columns["sender_id"]).tolist())
+    return sorted(senders)
+
+
+def ping1d_stream(bin_file, timezone="UTC", batch_size=4096):
+    """
+    The distance measurements of a Ping1D .bin file (messages 1211, 1212 and 1300).
+
+    Columns: time_ns, altitude_m (the distance to the bottom), confidence.
+    """
+    from pingviewer_log import PingViewerLogReader
+    from ping_time import TimestampConverter
+
+    def blocks():
+        converter = TimestampConverter(strip_compression_suffix(bin_file).stem)
+        batch = []
+        for timestamp, message in PingViewerLogReader(str(bin_file)).parser({1211, 1212, 1300}):
+            batch.append((timestamp, message.distance, message.confidence))
+            if len(batch) == batch_size:
+                yield make_block(converter, batch)
+                batch = []
+        if batch:
+            yield make_block(converter, batch)
+
+    def make_block(converter, batch):
+        timestamps, distances, confidences = zip(*batch)
+        return {
+            "time_ns": local_to_utc_ns(converter.convert(timestamps), timezone),
+            "altitude_m": np.array(distances, dtype=np.float64) / 1000.0,
+            "confidence": np.array(confidences, dtype=np.uint16),
+        }
+    return Stream("ping1d", blocks())
+
+
+def tlog_clock(tlog):
+    """
+    Fit a ClockModel for the autopilot's time_boot_ms, from the SYSTEM_TIME messages (which pair
+    time_boot_ms with the Unix time) or, if those don't have the Unix time, from the times the
+    ATTITUDE messages were received.
+    """
+    from tlog_extract import iter_tlog_blocks
+    boot_ms, unix_ns, received_boot_ms, received_ns = [], [], [], []
+    for tables in iter_tlog_blocks(tlog, ["SYSTEM_TIME", "ATTITUDE"]):
+        system_time = tables["SYSTEM_TIME"]
+        known = system_time["time_unix_usec"] > 10**15  # Zero (or nonsense) until the autopilot knows the time
+        boot_ms.append(system_time["time_boot_ms"][known])
+        unix_ns.append(system_time["time_unix_usec"][known].astype(np.int64) * 1000)
+        # Only every 10th ATTITUDE is needed to fit the received times
+        received_boot_ms.append(tables["ATTITUDE"]["time_boot_ms"][::10])
+        received_ns.append(tables["ATTITUDE"]["timestamp_us"][::10].astype(np.int64) * 1000)
+    boot_ms = np.concatenate(boot_ms) if boot_ms else np.zeros(0)
+    if len(boot_ms) >= 2:
+        return ClockModel.fit(boot_ms, np.concatenate(unix_ns), NS_PER_MS)
+    received_boot_ms = np.concatenate(received_boot_ms) if received_boot_ms else np.zeros(0)
+    if len(received_boot_ms) == 0:
+        raise ValueError(f"{tlog} has neither SYSTEM_TIME nor ATTITUDE messages to set its clock")
+    return ClockModel.fit(received_boot_ms, np.concatenate(received_ns), NS_PER_MS, lower_envelope=True)
+
+
+def tlog_stream(tlog, message_type, columns, clock):
+    """
+    One message type of a .tlog file, with time_ns from its time_boot_ms through the clock.
+
+    Args:
+        columns: {output column name: (field name, scale)}; each output is field * scale, as float64.
+    """
+    from tlog_extract import iter_tlog_blocks
+
+    def blocks():
+        for tables in iter_tlog_blocks(tlog, [message_type]):
+            table = tables[message_type]
+            block = {"time_ns": clock.to_epoch_ns(table["time_boot_ms"])}
+            for output, (field, scale) in columns.items():
+                block[output] = table[field].astype(np.float64) * scale
+            yield block
+    return Stream(message_type.lower(), blocks())
+
+
+def tlog_references(tlog, clock):
+    """The attitude (ATTITUDE) and position (GLOBAL_POSITION_INT) of the vehicle, as References."""
+    attitude = tlog_stream(tlog, "ATTITUDE", {"roll": ("roll", 1.0), "pitch": ("pitch", 1.0), "yaw": ("yaw", 1.0)}, clock)
+    position = tlog_stream(tlog, "GLOBAL_POSITION_INT", {
+        "lat": ("lat", 1e-7), "lon": ("lon", 1e-7),
+        "relative_alt_m": ("relative_alt", 1e-3),  # Negative below the surface (i.e. minus the depth)
+        "heading_deg": ("hdg", 1e-2),
+    }, clock)
+    return [
+        Reference(attitude, {"roll": "roll", "pitch": "pitch", "yaw": "yaw"}, {"yaw": (-np.pi, np.pi)}),
+        Reference(position, {"lat": "lat", "lon": "lon", "relative_alt_m": "relative_alt_m", "heading_deg": "heading_deg"},
+                  {"heading_deg": (0.0, 360.0)}),
+    ]
+
+# ==========================================================================
+# Section: Writing the aligned pings
+# ==========================================================================
+
+def write_aligned_csv(blocks, output_csv):
+    """
+    Write aligned blocks to a CSV (compressed if its name ends in .gz, .xz or .zst), one block at
+    a time. Returns the number of rows written.
+    """
+    rows = 0
+    with open_output(output_csv) as csvfile:
+        writer = None
+        for block in blocks:
+            if writer is None:
+                fieldnames = ["time_ns", "time_utc"] + [name for name in block if name != "time_ns"]
+                writer = csv.writer(csvfile)
+                writer.writerow(fieldnames)
+            block = dict(block)
+            block["time_utc"] = np.datetime_as_string(block["time_ns"].astype("datetime64[ns]"), unit="ms")
+            writer.writerows(zip(*(block[name].tolist() for name in fieldnames)))
+            rows += len(block["time_ns"])
+    return rows
+
+
+def parse_time(text, timezone="UTC"):
+    """Parse a date/time (e.g. "2025-03-24 12:14:03.250") in the given timezone to UTC ns since 1970."""
+    return int(local_to_utc_ns([pd.Timestamp(text).value], timezone)[0])
+
+
+def svlog_start_from_name(svlog):
+    """The start time in an .svlog file name like "2025-03-24-12-14.svlog" (minute precision), or None."""
+    try:
+        return pd.to_datetime(strip_compression_suffix(svlog).stem, format="%Y-%m-%d-%H-%M").value
+    except ValueError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Interpolate the vehicle's attitude, position and altitude at every Omniscan 450 ping, on one UTC timeline"
+    )
+    parser.add_argument("--svlog", required=True, help="Omniscan 450 .svlog file")
+    parser.add_argument("--tlog", default=None, help="Telemetry .tlog file (attitude and position)")
+    parser.add_argument("--ping1d", default=None, help="Ping1D .bin file (altitude above the bottom)")
+    parser.add_argument("-o", "--output", default="aligned.csv", help="Output CSV file, compressed if it ends in .gz, .xz or .zst (default: aligned.csv)")
+    parser.add_argument("--timezone", default="UTC",
+                        help="Timezone of the topside computer's clock (e.g. America/Los_Angeles), used for the times in "
+                             "Ping1D and .svlog file names and --omniscan-start (default: UTC)")
+    parser.add_argument("--omniscan-start", nargs="+", default=None, metavar="[SENDER=]TIME",
+                        help="Time of the first ping of each sonar, e.g. '1=2025-03-24 12:14:03.2' '2=2025-03-24 12:14:03.5' "
+                             "(without SENDER=, for every sonar). Default: the time in the .svlog file name, "
+                             "which is only to the minute")
+    parser.add_argument("--max-gap", type=float, default=1.0,
+                        help="Don't interpolate across gaps longer than this many seconds (default: 1)")
+    args = parser.parse_args()
+
+    # Set each sonar's clock from the time of its first ping
+    starts = {}
+    for item in args.omniscan_start or []:
+        sender, _, text = item.rpartition("=")
+        starts[int(sender) if sender else None] = parse_time(text, args.timezone)
+    file_start = svlog_start_from_name(args.svlog)
+    targets = []
+    for sender_id in omniscan_senders(args.svlog):
+        start_ns = starts.get(sender_id, starts.get(None))
+        if start_ns is None:
+            if file_start is None:
+                parser.error(f"give the time of the first ping with --omniscan-start (the file name has no time)")
+            start_ns = int(local_to_utc_ns([file_start], args.timezone)[0])
+            print(f"Sender {sender_id}: using the file name's time for the first ping, which is only to the minute "
+                  f"(see --omniscan-start)")
+        clock = ClockModel.from_pair(first_omniscan_timestamp_ms(args.svlog, sender_id), start_ns, NS_PER_MS)
+        print(f"Sender {sender_id}: {clock}")
+        targets.append(omniscan_stream(args.svlog, sender_id, clock))
+
+    references = []
+    if args.tlog:
+        clock = tlog_clock(args.tlog)
+        print(f"Autopilot: {clock}")
+        references.extend(tlog_references(args.tlog, clock))
+    if args.ping1d:
+        references.append(Reference(ping1d_stream(args.ping1d, args.timezone), {"altitude_m": "altitude_m", "confidence": "confidence"}))
+
+    rows = write_aligned_csv(align(targets, references, int(args.max_gap * NS_PER_S)), args.output)
+    print(f"{rows} pings written to {args.output}")
+    for stream in targets + [reference.stream for reference in references]:
+        if stream.dropped:
+            print(f"  {stream.name}: {stream.dropped} samples dropped for going back in time")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+import argparse
+import gzip
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+from synthetic_logs import MB, parse_size, write_pingviewer_log, write_svlog
+
+_ROOT = Path(__file__).resolve().parent.parent
+for _folder in ("omniscan450", "pings"):
+    if str(_ROOT / _folder) not in sys.path:
+        sys.path.insert(0, str(_ROOT / _folder))
+
+"""
+    Benchmarks the parsing, decoding and export of .svlog and PingViewer .bin files, on synthetic
+    files of a given size (see synthetic_logs.py), and writes the results as JSON so that runs
+    can be compared.
+
+    Every benchmark runs in a fresh Python process, so that its peak RSS (resident memory) is its
+    own. Note that pages of a memory-mapped file that have been read count towards RSS too.
+
+    For each benchmark and file size, the results hold:
+
+        seconds         wall-clock time (the best of --repeat runs)
+        mb_per_s        file size / seconds, in MB (10^6 bytes) per second
+        packets_per_s   packets (or pings/messages) processed / seconds
+        peak_rss_mb     peak resident memory of the process, in MB
+"""
+
+# ================================================================
+# Section: The benchmarks
+# ================================================================
+
+def bench_svlog_scan(path, workdir):
+    """Find every valid frame (the FrameScanner alone)."""
+    from svlog_parser import FrameScanner, map_svlog_file
+    with map_svlog_file(path) as data:
+        frames = FrameScanner().scan(data)
+        count = sum(1 for _ in frames)
+        frames.close()
+    return count
+
+
+def bench_svlog_decode(path, workdir):
+    """Decode every packet to Packet objects."""
+    from svlog_parser import iter_svlog_packets
+    return sum(1 for _ in iter_svlog_packets(path))
+
+
+def bench_svlog_waterfall(path, workdir):
+    """Decode the pings to NumPy blocks."""
+    from waterfall import iter_mono_profile_blocks
+    return sum(len(counts) for _, _, counts in iter_mono_profile_blocks(path))
+
+
+def bench_svlog_decode_gzip(path, workdir):
+    """Decode every packet of the gzip-compressed file (decompressed on a background thread)."""
+    from svlog_parser import iter_svlog_packets
+    return sum(1 for _ in iter_svlog_packets(path))
+
+
+def bench_svlog_waterfall_gzip(path, workdir):
+    """Decode the pings of the gzip-compressed file to NumPy blocks."""
+    from waterfall import iter_mono_profile_blocks
+    return sum(len(counts) for _, _, counts in iter_mono_profile_blocks(path))
+
+
+def bench_svlog_export_csv(path, workdir):
+    """Write the pings to one CSV per sonar channel (svlog_decode.py)."""
+    from svlog_decode import decode_mono_profiles_by_channel
+    return sum(decode_mono_profiles_by_channel(path, os.path.join(workdir, "out.csv")).values())
+
+
+def bench_svlog_export_parquet(path, workdir):
+    """Write the pings to Parquet (columnar_writer.py; needs pyarrow)."""
+    from columnar_writer import export_mono_profiles
+    export_mono_profiles(path, os.path.join(workdir, "out.parquet"))
+    return None  # Counted as the packets in the file
+
+
+def bench_ping1d_decode(path, workdir):
+    """Decode every Ping1D message (PingViewerLogReader)."""
+    from pingviewer_log import PingViewerLogReader
+    return sum(1 for _ in PingViewerLogReader(path).parser({1211, 1212, 1300}))
+
+
+def bench_ping1d_export_csv(path, workdir):
+    """Write the Ping1D messages to CSV and the profiles to .npz (decodePing1D_2csv.py)."""
+    from decodePing1D_2csv import decode_file
+    decode_file(path, os.path.join(workdir, "out.csv"), os.path.join(workdir, "profiles.npz"))
+    return None
+
+
+def bench_ping360_decode(path, workdir):
+    """Decode every Ping360 message (PingViewerLogReader)."""
+    from pingviewer_log import PingViewerLogReader
+    return sum(1 for _ in PingViewerLogReader(path).parser({2300}))
+
+
+def bench_ping360_export_npz(path, workdir):
+    """Write the Ping360 messages to the one-row-per-message .npz (decodePing360_2csv.py)."""
+    from decodePing360_2csv import decode_file
+    decode_file(path, os.path.join(workdir, "out.npz"))
+    return None
+
+
+# name: (function, kind of input file). A function returns the number of packets it processed,
+# or None to count every packet in the file.
+BENCHMARKS = {
+    "svlog_scan": (bench_svlog_scan, "svlog"),
+    "svlog_decode": (bench_svlog_decode, "svlog"),
+    "svlog_waterfall": (bench_svlog_waterfall, "svlog"),
+    "svlog_decode_gzip": (bench_svlog_decode_gzip, "svlog_gz"),
+    "svlog_waterfall_gzip": (bench_svlog_waterfall_gzip, "svlog_gz"),
+    "svlog_export_csv": (bench_svlog_export_csv, "svlog"),
+    "svlog_export_parquet": (bench_svlog_export_parquet, "svlog"),
+    "ping1d_decode": (bench_ping1d_decode, "ping1d"),
+    "ping1d_export_csv": (bench_ping1d_export_csv, "ping1d"),
+    "ping360_decode": (bench_ping360_decode, "ping360"),
+    "ping360_export_npz": (bench_ping360_export_npz, "ping360"),
+}
+OPTIONAL_MODULES = {"svlog_export_parquet": "pyarrow"}
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process so far, in MB."""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / MB if sys.platform == "darwin" else peak * 1024 / MB  # bytes on macOS, KiB on Linux
+
+
+def run_child(name, path, packets):
+    """Run one benchmark in this process and print its result as JSON (called by run_benchmark)."""
+    function, _ = BENCHMARKS[name]
+    workdir = tempfile.mkdtemp(prefix="bench_")
+    try:
+        start = time.perf_counter()
+        count = function(path, workdir)
+        seconds = time.perf_counter() - start
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps({"seconds": seconds, "packets": count if count is not None else packets, "peak_rss_mb": peak_rss_mb()}))
+
+
+def run_benchmark(name, path, packets):
+    """Run a benchmark in a fresh process. Returns its result dict."""
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", name, str(path), str(packets)],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{name} failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+# ================================================================
+# Section: Input files
+# ================================================================
+
+def input_file(data_dir, kind, size, seed):
+    """
+    The synthetic input file of a kind and size, written on first use and reused afterwards.
+
+    Returns:
+        tuple: (path, number of packets in it)
+    """
+    if kind == "svlog_gz":
+        # A gzip-compressed copy of the svlog file of the same size (which is its size uncompressed)
+        path, packets = input_file(data_dir, "svlog", size, seed)
+        compressed = path.with_name(path.name + ".gz")
+        if not compressed.exists():
+            print(f"Compressing {path}...")
+            temporary = compressed.with_name(compressed.name + ".tmp")
+            with open(path, "rb") as source, gzip.open(temporary, "wb", compresslevel=6) as destination:
+                shutil.copyfileobj(source, destination, 1 << 24)
+            os.replace(temporary, compressed)
+        return compressed, packets
+    # PingViewer file names give the start time, so each one gets its own folder
+    folder = Path(data_dir) / f"{kind}_{size}_seed{seed}"
+    path = folder / ("2025-03-06-11-53.svlog" if kind == "svlog" else "20250306-115300000.bin")
+    stats_path = folder / "stats.json"
+    if not stats_path.exists():
+        folder.mkdir(parents=True, exist_ok=True)
+        print(f"Writing a {size / MB:g} MB {kind} file to {path}...")
+        if kind == "svlog":
+            stats = write_svlog(path, size, seed)
+        else:
+            stats = write_pingviewer_log(path, size, kind, seed)
+        with open(stats_path, "w") as file:
+            json.dump(stats, file)
+    with open(stats_path) as file:
+        return path, json.load(file)["packets"]
+
+
+def environment():
+    """Where and with what the benchmarks ran, so that results from different machines aren't mixed up."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=_ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {"date": datetime.now(timezone.utc).isoformat(timespec="seconds"), "commit": commit,
+            "python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(),
+            "processor": platform.processor() or platform.machine(), "cpus": os.cpu_count()}
+
+
+def compare(results, baseline):
+    """Print each benchmark's throughput next to the baseline's."""
+    previous = {(entry["benchmark"], entry["size_bytes"]): entry for entry in baseline["results"]}
+    print(f"\n{'benchmark':<24}{'size':>10}{'MB/s':>10}{'before':>10}{'change':>9}{'RSS MB':>9}{'before':>9}")
+    for entry in results:
+        old = previous.get((entry["benchmark"], entry["size_bytes"]))
+        if old is None:
+            continue
+        change = entry["mb_per_s"] / old["mb_per_s"] - 1 if old["mb_per_s"] else float("nan")
+        print(f"{entry['benchmark']:<24}{entry['size']:>10}{entry['mb_per_s']:>10.1f}{old['mb_per_s']:>10.1f}"
+              f"{change:>+9.0%}{entry['peak_rss_mb']:>9.0f}{old['peak_rss_mb']:>9.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the svlog and PingViewer decoders on synthetic files")
+    parser.add_argument("--sizes", nargs="+", default=["10MB"], help="File sizes, e.g. 10MB 1GB 10GB (default: 10MB)")
+    parser.add_argument("--benchmarks", nargs="+", choices=list(BENCHMARKS), default=None, help="Benchmarks to run (default: all)")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "bluerov_benchmark_data"),
+                        help="Where the synthetic files are written and kept between runs")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic files (default: 0)")
+    parser.add_argument("--repeat", type=int, default=1, help="Run each benchmark this many times and keep the fastest (default: 1)")
+    parser.add_argument("-o", "--output", default="benchmark_results.json", help="Output JSON (default: benchmark_results.json)")
+    parser.add_argument("--compare", default=None, help="Earlier results JSON to compare against")
+    parser.add_argument("--child", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        name, path, packets = args.child
+        run_child(name, path, int(packets))
+        return
+
+    names = args.benchmarks or list(BENCHMARKS)
+    results = []
+    for size_text in args.sizes:
+        size = parse_size(size_text)
+        for name in names:
+            module = OPTIONAL_MODULES.get(name)
+            if module is not None and importlib.util.find_spec(module) is None:
+                print(f"Skipping {name} ({module} is not installed)")
+                continue
+            path, packets = input_file(args.data_dir, BENCHMARKS[name][1], size, args.seed)
+            runs = [run_benchmark(name, path, packets) for _ in range(args.repeat)]
+            best = min(runs, key=lambda run: run["seconds"])
+            entry = {
+                "benchmark": name,
+                "size": size_text,
+                "size_bytes": size,
+                "packets": best["packets"],
+                "seconds": round(best["seconds"], 4),
+                "mb_per_s": round(size / MB / best["seconds"], 2),
+                "packets_per_s": round(best["packets"] / best["seconds"], 1),
+                "peak_rss_mb": round(max(run["peak_rss_mb"] for run in runs), 1),
+            }
+            results.append(entry)
+            print(f"{name:<24}{size_text:>8}: {entry['seconds']:8.3f} s  {entry['mb_per_s']:9.1f} MB/s  "
+                  f"{entry['packets_per_s']:11.0f} packets/s  {entry['peak_rss_mb']:7.0f} MB peak RSS")
+
+    with open(args.output, "w") as file:
+        json.dump({"environment": environment(), "results": results}, file, indent=1)
+    print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as file:
+            compare(results, json.load(file))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import struct
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# The message layouts come from the parser itself, so the generated files always match it
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT / "omniscan450") not in sys.path:
+    sys.path.insert(0, str(_ROOT / "omniscan450"))
+from svlog_parser import OsMonoProfileMessage, Ping1DDistanceSimpleMessage, Ping1DProfileMessage, Ping360DeviceDataMessage
+
+"""
+    Deterministic generators of synthetic sensor logs, for benchmarking (and testing) the
+    decoders on files of any size without needing real data.
+
+    write_svlog() writes an Omniscan 450 .svlog: valid Ping Protocol packets ("BR" header,
+    payload, checksum) of
+        - os_mono_profile pings (2198) from two sonars, with a configurable num_results,
+        - a JSON header message (10) at the start and NACK messages (2) now and then,
+    mixed with the things a real log has:
+        - packets with a corrupted byte (so their checksum fails),
+        - "BR" inside pwr_results (false sync candidates),
+        - junk between packets that starts with "BR",
+        - a packet cut short at the very end.
+
+    write_pingviewer_log() writes a PingViewer .bin file of Ping1D (1300 and 1211) or Ping360
+    (2300) messages in the same way, with a corrupted message now and then.
+
+    The same arguments (including the seed) always give the same bytes. Packets are generated
+    a batch at a time as NumPy arrays, so even multi-GB files are written quickly.
+"""
+
+BATCH_SIZE = 1024  # Packets generated at once
+MB = 1000000
+
+# ================================================================
+# Section: Ping Protocol packets
+# ================================================================
+
+def ping_frame(message_id, payload, sender_id=1, receiver_id=0):
+    """One Ping Protocol packet: "BR", payload_length, message_id, sender, receiver, payload, checksum."""
+    header = b"BR" + struct.pack("<HHBB", len(payload), message_id, sender_id, receiver_id)
+    return header + payload + struct.pack("<H", sum(header + payload) & 0xFFFF)
+
+
+def frame_batch(message_id, prefixes, tails, sender_ids, receiver_id=0):
+    """
+    A batch of packets of the same length, as one (packets x packet size) uint8 array.
+
+    Args:
+        message_id: Message ID of every packet.
+        prefixes: Structured array of the fixed part of each payload.
+        tails: uint8 (packets x bytes) trailing array of each payload.
+        sender_ids: Sender ID of each packet.
+    """
+    count = len(prefixes)
+    payload_length = prefixes.dtype.itemsize + tails.shape[1]
+    frames = np.empty((count, 8 + payload_length + 2), dtype=np.uint8)
+    frames[:, :6] = np.frombuffer(b"BR" + struct.pack("<HH", payload_length, message_id), dtype=np.uint8)
+    frames[:, 6] = sender_ids
+    frames[:, 7] = receiver_id
+    frames[:, 8:8 + prefixes.dtype.itemsize] = prefixes.view(np.uint8).reshape(count, -1)
+    frames[:, 8 + prefixes.dtype.itemsize:-2] = tails
+    checksums = (frames[:, :-2].sum(axis=1, dtype=np.uint64) & 0xFFFF).astype("<u2")
+    frames[:, -2:] = checksums.view(np.uint8).reshape(count, 2)
+    return frames
+
+
+def corrupt(rng, frames, rate):
+    """Flip one payload byte in about rate of the packets, so that their checksums fail. Returns the number corrupted."""
+    rows = np.flatnonzero(rng.random(len(frames)) < rate)
+    columns = rng.integers(8, frames.shape[1] - 2, len(rows))
+    frames[rows, columns] ^= 0xFF
+    return len(rows)
+
+# ================================================================
+# Section: Omniscan 450 .svlog files
+# ================================================================
+
+MONO_PREFIX_DTYPE = OsMonoProfileMessage.LAYOUT.numpy_dtype()
+
+
+def mono_profile_batch(rng, first_ping, count, num_results, ping_period_ms=50, br_rate=0.05):
+    """
+    A batch of os_mono_profile packets, alternating between sender 1 (channel 0) and sender 2 (channel 1).
+
+    Args:
+        first_ping: Index of the first ping of the batch (sets ping_number and timestamp_ms).
+        num_results: Number of pwr_results samples per ping.
+        br_rate: Fraction of pings with "BR" somewhere in their pwr_results.
+    """
+    index = first_ping + np.arange(count)
+    sender_ids = (1 + index % 2).astype(np.uint8)
+    prefixes = np.zeros(count, dtype=MONO_PREFIX_DTYPE)
+    prefixes["ping_number"] = index // 2
+    prefixes["start_mm"] = 100
+    prefixes["length_mm"] = 30000
+    prefixes["timestamp_ms"] = index // 2 * ping_period_ms + sender_ids
+    prefixes["ping_hz"] = 450000
+    prefixes["gain_index"] = 3
+    prefixes["num_results"] = num_results
+    prefixes["sos_dmps"] = 15000
+    prefixes["channel_number"] = index % 2
+    prefixes["pulse_duration_sec"] = 1e-4
+    prefixes["analog_gain"] = 1.0
+    prefixes["max_pwr_db"] = 10.0
+    prefixes["min_pwr_db"] = -60.0
+    prefixes["transducer_heading_deg"] = np.where(index % 2 == 0, -90.0, 90.0)
+    prefixes["vehicle_heading_deg"] = (index * 0.01) % 360
+
+    pwr_results = rng.integers(0, 65536, (count, num_results), dtype=np.uint16)
+    rows = np.flatnonzero(rng.random(count) < br_rate)
+    pwr_results[rows, rng.integers(0, num_results, len(rows))] = 0x5242  # "BR" in little-endian
+    return frame_batch(OsMonoProfileMessage.MESSAGE_ID, prefixes, pwr_results.view(np.uint8), sender_ids)
+
+
+def write_svlog(path, size, seed=0, num_results=1000, corrupt_rate=0.001, nack_rate=0.002, junk_rate=0.001, br_rate=0.05):
+    """
+    Write a synthetic .svlog of exactly size bytes (the last packet is cut short to fit).
+
+    Returns:
+        dict: What was written: "packets" (whole packets), "pings", "corrupted", "nacks", "junk".
+    """
+    rng = np.random.default_rng(seed)
+    stats = {"packets": 0, "pings": 0, "corrupted": 0, "nacks": 0, "junk": 0}
+    written = 0
+    with open(path, "wb") as file:
+        header = ping_frame(10, json.dumps({"source": "synthetic", "seed": seed, "num_results": num_results}).encode())
+        file.write(header)
+        written += len(header)
+        stats["packets"] += 1
+        while written < size:
+            frames = mono_profile_batch(rng, stats["pings"], BATCH_SIZE, num_results, br_rate=br_rate)
+            stats["corrupted"] += corrupt(rng, frames, corrupt_rate)
+            pieces = [frames.tobytes()]
+            packets = len(frames)
+            # Occasional NACKs and junk between the batches
+            for _ in range(rng.binomial(BATCH_SIZE, nack_rate)):
+                pieces.append(ping_frame(2, struct.pack("<H", 2198) + b"checksum error\x00", sender_id=int(rng.integers(1, 3))))
+                packets += 1
+                stats["nacks"] += 1
+            for _ in range(rng.binomial(BATCH_SIZE, junk_rate)):
+                pieces.append(b"BR" + rng.integers(0, 256, int(rng.integers(1, 64)), dtype=np.uint8).tobytes())
+                stats["junk"] += 1
+            data = b"".join(pieces)
+            if written + len(data) > size:
+                data = data[:size - written]
+                packets = len(data) // frames.shape[1]  # Roughly; only the whole pings are counted
+                stats["pings"] += packets
+                stats["packets"] += packets
+            else:
+                stats["pings"] += len(frames)
+                stats["packets"] += packets
+            file.write(data)
+            written += len(data)
+    return stats
+
+# ================================================================
+# Section: PingViewer .bin files
+# ================================================================
+
+def _qstring(text):
+    raw = text.encode("utf-16-be")
+    return struct.pack(">I", len(raw)) + raw
+
+
+def pingviewer_header(sensor_family=1):
+    """The header of a version 2 PingViewer .bin file."""
+    fields = [_qstring("PingViewer sensor log file"), struct.pack(">i", 2)]
+    fields += [_qstring(text) for text in ("0000000", "2025-03-06", "synthetic", "linux", "6.1")]
+    fields.append(struct.pack(">ii", sensor_family, 0))
+    return b"".join(fields)
+
+
+def timestamp_strings(milliseconds):
+    """'hh:mm:ss.xxx' of each time, as UTF-16BE bytes (packets x 24), built without formatting any strings."""
+    milliseconds = np.asarray(milliseconds, dtype=np.int64)
+    parts = [milliseconds // 3600000 % 100, milliseconds // 60000 % 60, milliseconds // 1000 % 60, milliseconds % 1000]
+    widths = [2, 2, 2, 3]
+    separators = [":", ":", ".", ""]
+    characters = []
+    for part, width, separator in zip(parts, widths, separators):
+        for power in range(width - 1, -1, -1):
+            characters.append(ord("0") + part // 10 ** power % 10)
+        if separator:
+            characters.append(np.full(len(milliseconds), ord(separator)))
+    return np.stack(characters, axis=1).astype(">u2").view(np.uint8)
+
+
+def record_batch(milliseconds, frames):
+    """A batch of .bin records (QString timestamp + QByteArray packet), as one uint8 array."""
+    count = len(frames)
+    timestamps = timestamp_strings(milliseconds)
+    records = np.empty((count, 4 + timestamps.shape[1] + 4 + frames.shape[1]), dtype=np.uint8)
+    records[:, :4] = np.frombuffer(struct.pack(">I", timestamps.shape[1]), dtype=np.uint8)
+    records[:, 4:4 + timestamps.shape[1]] = timestamps
+    start = 4 + timestamps.shape[1]
+    records[:, start:start + 4] = np.frombuffer(struct.pack(">I", frames.shape[1]), dtype=np.uint8)
+    records[:, start + 4:] = frames
+    return records
+
+
+def ping1d_batch(rng, first, count, profile_length=200):
+    """A batch of Ping1D profile (1300) packets, and a few distance_simple (1211) packets to go after them."""
+    index = first + np.arange(count)
+    prefixes = np.zeros(count, dtype=Ping1DProfileMessage.LAYOUT.numpy_dtype())
+    prefixes["distance"] = 2000 + (index % 1000)
+    prefixes["confidence"] = 100
+    prefixes["transmit_duration"] = 50
+    prefixes["ping_number"] = index
+    prefixes["scan_length"] = 5000
+    prefixes["gain_setting"] = 3
+    prefixes["profile_data_length"] = profile_length
+    profiles = rng.integers(0, 256, (count, profile_length), dtype=np.uint8)
+    profile_frames = frame_batch(Ping1DProfileMessage.MESSAGE_ID, prefixes, profiles, 1)
+
+    simple = np.zeros(count // 8, dtype=Ping1DDistanceSimpleMessage.LAYOUT.numpy_dtype())
+    simple["distance"] = 2000 + (index[::8][:len(simple)] % 1000)
+    simple["confidence"] = 90
+    simple_frames = frame_batch(Ping1DDistanceSimpleMessage.MESSAGE_ID, simple, np.zeros((len(simple), 0), dtype=np.uint8), 1)
+    return profile_frames, simple_frames
+
+
+def ping360_batch(rng, first, count, number_of_samples=1200):
+    """A batch of Ping360 device_data (2300) packets, sweeping the head round one gradian at a time."""
+    index = first + np.arange(count)
+    prefixes = np.zeros(count, dtype=Ping360DeviceDataMessage.LAYOUT.numpy_dtype())
+    prefixes["mode"] = 1
+    prefixes["gain_setting"] = 1
+    prefixes["angle"] = index % 400
+    prefixes["transmit_duration"] = 32
+    prefixes["sample_period"] = 80
+    prefixes["transmit_frequency"] = 750
+    prefixes["number_of_samples"] = number_of_samples
+    prefixes["data_length"] = number_of_samples
+    data = rng.integers(0, 256, (count, number_of_samples), dtype=np.uint8)
+    return frame_batch(Ping360DeviceDataMessage.MESSAGE_ID, prefixes, data, 2)
+
+
+def write_pingviewer_log(path, size, kind="ping1d", seed=0, corrupt_rate=0.001, samples=None, period_ms=None):
+    """
+    Write a synthetic PingViewer .bin file of about size bytes (whole records; the last one is cut short).
+
+    Args:
+        kind: "ping1d" or "ping360".
+        samples: profile_data length (Ping1D, default 200) or number_of_samples (Ping360, default 1200).
+        period_ms: Time between records (default: 100 ms for Ping1D, 25 ms for Ping360).
+
+    Returns:
+        dict: What was written: "packets" (whole records), "corrupted".
+    """
+    rng = np.random.default_rng(seed)
+    period_ms = period_ms or (100 if kind == "ping1d" else 25)
+    stats = {"packets": 0, "corrupted": 0}
+    written = 0
+    with open(path, "wb") as file:
+        header = pingviewer_header(1 if kind == "ping1d" else 2)
+        file.write(header)
+        written += len(header)
+        while written < size:
+            first = stats["packets"]
+            if kind == "ping1d":
+                profile_frames, simple_frames = ping1d_batch(rng, first, BATCH_SIZE, samples or 200)
+                batches = [profile_frames, simple_frames]
+            else:
+                batches = [ping360_batch(rng, first, BATCH_SIZE, samples or 1200)]
+            pieces = []
+            for frames in batches:
+                stats["corrupted"] += corrupt(rng, frames, corrupt_rate)
+                milliseconds = (first + np.arange(len(frames))) * period_ms
+                pieces.append(record_batch(milliseconds, frames))
+                first += len(frames)
+            data = b"".join(piece.tobytes() for piece in pieces)
+            if written + len(data) > size:
+                data = data[:size - written]
+                stats["packets"] += len(data) // pieces[0].shape[1]  # Roughly; only whole records are counted
+            else:
+                stats["packets"] = first
+            file.write(data)
+            written += len(data)
+    return stats
+
+
+def parse_size(text):
+    """Parse a size like "10MB", "1GB" or "500kB" (decimal units) to bytes."""
+    units = {"KB": 1000, "MB": MB, "GB": 1000 * MB, "TB": 1000000 * MB, "B": 1}
+    text = text.strip().upper()
+    for unit, factor in units.items():
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * factor)
+    return int(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write deterministic synthetic .svlog and PingViewer .bin files")
+    parser.add_argument("kind", choices=["svlog", "ping1d", "ping360"], help="Type of file to write")
+    parser.add_argument("output", help="Output file (for PingViewer files, name it like 20250306-115328280.bin)")
+    parser.add_argument("--size", default="10MB", help="Size of the file, e.g. 10MB or 1GB (default: 10MB)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("--samples", type=int, default=None,
+                        help="Samples per ping: num_results (svlog, default 1000), profile length (ping1d, default 200) "
+                             "or number_of_samples (ping360, default 1200)")
+    args = parser.parse_args()
+
+    size = parse_size(args.size)
+    if args.kind == "svlog":
+        stats = write_svlog(args.output, size, args.seed, args.samples or 1000)
+    else:
+        stats = write_pingviewer_log(args.output, size, args.kind, args.seed, samples=args.samples)
+    print(f"Wrote {size} bytes to {args.output}: {stats}")
+
+if __name__ == "__main__":
+    main()
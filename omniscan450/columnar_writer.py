@@ -0,0 +1,183 @@
+# columnar_writer.py
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+from svlog_parser import ParseStats, add_stats_arguments, report_stats
+from decode_cache import add_cache_arguments, cache_from_args, cached_mono_profile_blocks
+
+# ===================================================================
+# Section: Writers for typed, columnar output of mono profile pings
+# ===================================================================
+
+"""
+    Every writer takes blocks as produced by waterfall.iter_mono_profile_blocks, i.e.
+    (columns, pwr_results, sample_counts), and appends them to the output one block at a
+    time, so memory use is bounded by the block size rather than by the size of the log.
+
+    Scalar payload fields become one typed column each, alongside "sender_id" and "position".
+    pwr_results is written as:
+        - Parquet: a list<uint16> column (ragged, one list per ping), one row group per block.
+        - HDF5: a 2-D uint16 dataset (pings x samples), zero padded, plus a "sample_counts" column.
+
+    pyarrow (for Parquet) and h5py (for HDF5) are only needed for the format you use.
+"""
+
+
+class ParquetProfileWriter:
+    """Write mono profile blocks to a Parquet file, one row group per block."""
+
+    def __init__(self, filename):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Writing Parquet requires pyarrow (pip install pyarrow)")
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.filename = filename
+        self.writer = None  # Created on the first block, once the schema is known
+
+    def write_block(self, columns, pwr_results, sample_counts):
+        pa = self.pa
+        # Flatten the valid samples of every row, and describe the row boundaries with offsets
+        valid = np.arange(pwr_results.shape[1]) < sample_counts[:, None]
+        offsets = np.concatenate(([0], np.cumsum(sample_counts))).astype(np.int32)
+        arrays = [pa.array(column) for column in columns.values()]
+        arrays.append(pa.ListArray.from_arrays(pa.array(offsets), pa.array(pwr_results[valid])))
+        table = pa.Table.from_arrays(arrays, names=list(columns) + ["pwr_results"])
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.filename, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class HDF5ProfileWriter:
+    """Write mono profile blocks to an HDF5 file, growing resizable datasets block by block."""
+
+    def __init__(self, filename):
+        try:
+            import h5py
+        except ImportError:
+            raise ImportError("Writing HDF5 requires h5py (pip install h5py)")
+        self.file = h5py.File(filename, "w")
+        self.rows = 0
+
+    def _append(self, name, values):
+        if name not in self.file:
+            self.file.create_dataset(name, shape=(0,) + values.shape[1:], maxshape=(None,) + values.shape[1:],
+                                     dtype=values.dtype, chunks=True)
+        dataset = self.file[name]
+        dataset.resize(self.rows + len(values), axis=0)
+        dataset[self.rows:] = values
+
+    def write_block(self, columns, pwr_results, sample_counts):
+        for name, column in columns.items():
+            self._append(name, column)
+        self._append("sample_counts", sample_counts.astype(np.uint16))
+
+        if "pwr_results" not in self.file:
+            self.file.create_dataset("pwr_results", shape=(0, 0), maxshape=(None, None), dtype=pwr_results.dtype,
+                                     chunks=(256, 512), compression="gzip", compression_opts=1)
+        dataset = self.file["pwr_results"]
+        width = max(dataset.shape[1], pwr_results.shape[1])
+        dataset.resize((self.rows + len(pwr_results), width))
+        dataset[self.rows:, :pwr_results.shape[1]] = pwr_results
+        self.rows += len(pwr_results)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+WRITERS = {
+    "parquet": ParquetProfileWriter,
+    "hdf5": HDF5ProfileWriter,
+}
+
+EXTENSIONS = {".parquet": "parquet", ".pq": "parquet", ".h5": "hdf5", ".hdf5": "hdf5"}
+
+
+def open_profile_writer(output_filename, output_format=None):
+    """Create the writer for output_format, inferring the format from the file extension if not given."""
+    if output_format is None:
+        output_format = EXTENSIONS.get(Path(output_filename).suffix.lower())
+        if output_format is None:
+            raise ValueError(f"Cannot infer the output format of {output_filename}; use one of {sorted(WRITERS)}")
+    return WRITERS[output_format](output_filename)
+
+
+def export_mono_profiles(input_filename, output_filename, output_format=None, sender_ids=None, channels=None, block_size=4096,
+                         stats=None, cache=None):
+    """
+    Decode the os_mono_profile packets of a .svlog file straight into a columnar file.
+
+    Args:
+        input_filename: Path to the input .svlog file.
+        output_filename: Path to the output file.
+        output_format: "parquet" or "hdf5" (inferred from the extension if None).
+        sender_ids: If given, only pings from these sender IDs are written.
+        channels: If given, only pings with these channel numbers are written.
+        block_size: Number of pings per row group / write.
+        stats: Optional ParseStats to collect counters and stage timings into.
+        cache: Optional DecodeCache (see decode_cache.py) to load the decoded pings from, or store them in.
+
+    Returns:
+        int: The number of pings written.
+    """
+    pings = 0
+    with open_profile_writer(output_filename, output_format) as writer:
+        for columns, pwr_results, sample_counts in cached_mono_profile_blocks(input_filename, block_size, sender_ids, channels,
+                                                                              cache=cache, stats=stats):
+            if stats is None:
+                writer.write_block(columns, pwr_results, sample_counts)
+            else:
+                with stats.timed("write", len(sample_counts)):
+                    writer.write_block(columns, pwr_results, sample_counts)
+            pings += len(sample_counts)
+    return pings
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Decode the sidescan (2198) messages of an svlog file into a Parquet or HDF5 file.")
+    parser.add_argument("input_file", help="Path to the input svlog file.")
+    parser.add_argument("output_file", help="Path to the output file (.parquet or .h5).")
+    parser.add_argument("--format", choices=sorted(WRITERS), default=None, help="Output format (default: inferred from the output file extension).")
+    parser.add_argument("--sender_ids", nargs="*", type=int, default=[], help="List of sender IDs to include (default: all).")
+    parser.add_argument("--channels", nargs="*", type=int, default=[], help="List of channel numbers to include (default: all).")
+    parser.add_argument("--block_size", type=int, default=4096, help="Number of pings per row group.")
+    add_stats_arguments(parser)
+    add_cache_arguments(parser)
+
+    args = parser.parse_args()
+    stats = ParseStats() if args.stats or args.json_stats else None
+
+    pings = export_mono_profiles(
+        args.input_file,
+        args.output_file,
+        output_format=args.format,
+        sender_ids=args.sender_ids or None,
+        channels=args.channels or None,
+        block_size=args.block_size,
+        stats=stats,
+        cache=cache_from_args(args)
+    )
+    print(f"{pings} pings successfully written to {args.output_file}")
+    if stats is not None:
+        report_stats(args, stats)
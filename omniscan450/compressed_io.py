@@ -0,0 +1,209 @@
+# compressed_io.py
+
+import argparse
+import gzip
+import lzma
+import queue
+import threading
+import time
+from pathlib import Path
+
+"""
+    Reading and writing gzip, xz and zstd compressed logs and outputs.
+
+    Archived logs (.svlog, PingViewer .bin, .tlog) are often kept compressed. Their compression
+    is recognised from the first bytes of the file, not from its name, so a log that was
+    compressed without being renamed is read correctly too. Compressed files can't be
+    memory-mapped, so they are decompressed in chunks, on a background thread, while the parser
+    works on the chunks already decompressed (zlib and lzma release the GIL while they work).
+    Nothing is ever written to a temporary file.
+
+    Outputs are compressed when their name ends in .gz, .xz or .zst (e.g. out.csv.gz).
+
+    zstd needs the zstandard package (pip install zstandard), or Python 3.14's compression.zstd;
+    gzip and xz only need the standard library.
+"""
+
+# ================================================================
+# Section: Recognising compressed files
+# ================================================================
+
+MAGIC_NUMBERS = {
+    b"\x1f\x8b": "gzip",
+    b"\xfd7zXZ\x00": "xz",
+    b"\x28\xb5\x2f\xfd": "zstd",
+}
+SUFFIXES = {".gz": "gzip", ".xz": "xz", ".zst": "zstd"}
+CHUNK_SIZE = 1 << 24  # Bytes handed to the parser at a time
+READ_SIZE = 1 << 20  # Bytes decompressed per read; a truncated archive loses at most this much before the error
+PREFETCH_CHUNKS = 2  # Chunks the background thread may decompress ahead of the parser
+GZIP_LEVEL = 6  # zlib's default; 9 (gzip.open's default) is much slower for little gain
+
+
+def detect_compression(filename):
+    """Return "gzip", "xz" or "zstd" if the file starts with that format's magic number, else None."""
+    with open(filename, "rb") as f:
+        head = f.read(max(len(magic) for magic in MAGIC_NUMBERS))
+    for magic, compression in MAGIC_NUMBERS.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def compression_from_suffix(filename):
+    """Return the compression that the name of an output file asks for ("gzip", "xz", "zstd"), or None."""
+    return SUFFIXES.get(Path(filename).suffix.lower())
+
+
+def strip_compression_suffix(path):
+    """Return path without its .gz/.xz/.zst suffix, if it has one (e.g. "out.csv.gz" -> "out.csv")."""
+    path = Path(path)
+    return path.with_suffix("") if compression_from_suffix(path) else path
+
+
+def glob_logs(folder, pattern, recursive=False):
+    """
+    Find the files in folder that match pattern, compressed or not.
+
+    Example usage:
+        glob_logs("logs", "*.bin")  # a.bin, b.bin.gz, c.bin.zst, ...
+
+    Returns:
+        list: The matching paths, sorted.
+    """
+    folder = Path(folder)
+    search = folder.rglob if recursive else folder.glob
+    return sorted(path for suffix in ("", *SUFFIXES) for path in search(pattern + suffix))
+
+
+def _zstd():
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        pass
+    try:
+        from compression import zstd  # Python 3.14+
+        return zstd
+    except ImportError:
+        raise ImportError("Reading or writing zstd files requires zstandard (pip install zstandard)")
+
+# ================================================================
+# Section: Opening files
+# ================================================================
+
+def open_compressed(filename):
+    """
+    Open a file for reading as binary, decompressing it if it is compressed.
+
+    Returns:
+        A binary file object (its read() returns the decompressed bytes).
+    """
+    compression = detect_compression(filename)
+    if compression == "gzip":
+        return gzip.open(filename, "rb")
+    if compression == "xz":
+        return lzma.open(filename, "rb")
+    if compression == "zstd":
+        return _zstd().open(filename, "rb")
+    return open(filename, "rb")
+
+
+def open_output(filename, newline="", encoding="utf-8"):
+    """
+    Open a text file for writing, compressed if its name ends in .gz, .xz or .zst.
+
+    Returns:
+        A text file object.
+    """
+    compression = compression_from_suffix(filename)
+    if compression == "gzip":
+        return gzip.open(filename, "wt", compresslevel=GZIP_LEVEL, newline=newline, encoding=encoding)
+    if compression == "xz":
+        return lzma.open(filename, "wt", newline=newline, encoding=encoding)
+    if compression == "zstd":
+        return _zstd().open(filename, "wt", newline=newline, encoding=encoding)
+    return open(filename, "w", newline=newline, encoding=encoding)
+
+# ================================================================
+# Section: Decompressing on a background thread
+# ================================================================
+
+def iter_decompressed_chunks(filename, chunk_size=CHUNK_SIZE, prefetch=PREFETCH_CHUNKS):
+    """
+    Yield the (decompressed) content of a file in chunks, decompressing the next chunks on a
+    background thread while the caller works on the current one.
+
+    At most prefetch chunks are held waiting, so memory use does not grow with the file. Errors
+    raised while reading (e.g. EOFError for a truncated archive) are raised here, after the data
+    that was decompressed before them. Closing the generator early stops the thread.
+
+    Args:
+        filename: Path to the file, compressed or not.
+        chunk_size: Bytes per chunk (the last chunk may be shorter).
+        prefetch: Number of chunks that may wait to be consumed.
+
+    Yields:
+        bytes: The next chunk of the file.
+    """
+    chunks = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+
+    def put(item):
+        # Wait for room in the queue, but give up as soon as the consumer has gone
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def read():
+        pieces = []
+        try:
+            with open_compressed(filename) as f:
+                while not stop.is_set():
+                    pieces = []
+                    size = 0
+                    while size < chunk_size:
+                        piece = f.read(min(READ_SIZE, chunk_size - size))
+                        if not piece:
+                            break
+                        pieces.append(piece)
+                        size += len(piece)
+                    chunk = b"".join(pieces)
+                    pieces = []
+                    put(chunk)
+                    if not chunk:
+                        return
+        except Exception as e:
+            if pieces:
+                put(b"".join(pieces))  # What was decompressed before the error
+            put(e)
+
+    thread = threading.Thread(target=read, name=f"decompress {Path(filename).name}", daemon=True)
+    thread.start()
+    try:
+        while True:
+            chunk = chunks.get()
+            if isinstance(chunk, Exception):
+                raise chunk
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        stop.set()
+        thread.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report the compression of log files, and how fast they decompress.")
+    parser.add_argument("files", nargs="+", help="Files to check")
+    args = parser.parse_args()
+
+    for filename in args.files:
+        started = time.perf_counter()
+        size = sum(len(chunk) for chunk in iter_decompressed_chunks(filename))
+        seconds = time.perf_counter() - started
+        print(f"{filename}: {detect_compression(filename) or 'not compressed'}, {size} bytes decompressed "
+              f"in {seconds:.2f} s ({size / max(seconds, 1e-9) / 1e6:.0f} MB/s)")
@@ -1,29 +1,39 @@
 # csv_writer.py
 
 import csv
-from svlog_parser import parse_svlog_file
+import itertools
+import time
+from svlog_parser import ParseStats, add_stats_arguments, report_stats
+from decode_cache import add_cache_arguments, cache_from_args, cached_svlog_packets
+from compressed_io import open_output
 import json
 import argparse
 
 
-def write_packets_to_csv(packets, output_filename):
+def write_packets_to_csv(packets, output_filename, stats=None):
     """
     Writes the packet data to a CSV file.
     
     Args:
-        packets (list): A list of Packet objects to be written to the CSV file.
-        output_filename (str): The name of the output CSV file.
+        packets (iterable): Packet objects to be written to the CSV file. This can be a generator
+            (e.g. from iter_svlog_packets), in which case packets are written as they are parsed.
+        output_filename (str): The name of the output CSV file (gzip/xz/zstd compressed if it
+            ends in .gz, .xz or .zst).
+        stats (ParseStats): Optional, to add the time spent formatting and writing rows to its
+            "write" stage.
     """
     fieldnames = [
         "Packet Position", "Message ID", "Message Type", "Sender ID", "Receiver ID",
         "Payload Data"
     ]
 
-    with open(output_filename, mode="w", newline='') as csvfile:
+    with open_output(output_filename) as csvfile:  # Compressed if the name ends in .gz/.xz/.zst
         writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
 
         writer.writeheader()
+        seconds = 0.0
         for packet in packets:
+            started = time.perf_counter()
             # Prepare the row data from the packet object
             row = {
                 "Packet Position": packet.pos,
@@ -31,9 +41,12 @@ def write_packets_to_csv(packets, output_filename):
                 "Message Type": packet.payload.message_type,
                 "Sender ID": packet.header.sender_id,
                 "Receiver ID": packet.header.receiver_id,
-                "Payload Data": json.dumps(packet.payload.__dict__, skipkeys=True)
+                "Payload Data": json.dumps(packet.payload.to_dict(), skipkeys=True, default=lambda value: value.tolist())  # NumPy arrays as lists
             }
             writer.writerow(row)
+            seconds += time.perf_counter() - started
+        if stats is not None:
+            stats.add_time("write", seconds)
 
     print(f"Data successfully written to {output_filename}")
 
@@ -41,18 +54,31 @@ def write_packets_to_csv(packets, output_filename):
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description="Parse an svlog file and write packets to a CSV file.")
-    parser.add_argument("input_file", help="Path to the input svlog file.")
-    parser.add_argument("output_file", help="Path to the output CSV file.")
+    parser.add_argument("input_file", help="Path to the input svlog file (may be gzip/xz/zstd compressed).")
+    parser.add_argument("output_file", help="Path to the output CSV file (compressed if it ends in .gz, .xz or .zst).")
     parser.add_argument("--included_ids", nargs="*", type=int, default=[], help="List of included IDs.")
     parser.add_argument("--excluded_ids", nargs="*", type=int, default=[], help="List of excluded IDs.")
     parser.add_argument("--max_packets", type=int, default=None, help="Maximum number of packets to process.")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of CPU cores to parse with (default: 1).")
+    add_stats_arguments(parser)
+    add_cache_arguments(parser)
 
     args = parser.parse_args()
+    stats = ParseStats() if args.stats or args.json_stats else None
 
-    packets = parse_svlog_file(
+    # An empty ID list means "no filter", not "exclude everything".
+    # Packets stream straight from the file (or from the decode cache, if this file was parsed
+    # with the same IDs before) into the CSV, so the whole log is never held in memory. With
+    # --jobs the file is parsed on several cores; the packets come back in file order, exactly
+    # as a serial parse.
+    packets = itertools.islice(cached_svlog_packets(
         args.input_file,
-        included_ids=args.included_ids,
-        excluded_ids=args.excluded_ids,
-        max_packets=args.max_packets
-    )
-    write_packets_to_csv(packets, args.output_file)
+        included_ids=args.included_ids or None,
+        excluded_ids=args.excluded_ids or None,
+        cache=cache_from_args(args),
+        jobs=args.jobs,
+        stats=stats
+    ), args.max_packets)
+    write_packets_to_csv(packets, args.output_file, stats=stats)
+    if stats is not None:
+        report_stats(args, stats)
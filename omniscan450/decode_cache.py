@@ -0,0 +1,369 @@
+# decode_cache.py
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from svlog_parser import PARSER_VERSION, Packet, iter_svlog_packets
+from parallel_svlog import parse_svlog_file_parallel
+from waterfall import iter_mono_profile_blocks
+
+"""
+    An on-disk cache of decoded results, so that running the decoders again on the same raw log
+    loads what was decoded last time instead of parsing the whole file again.
+
+    Each entry is keyed by:
+
+        - the input file: its size, modification time and a hash of 16 evenly spaced 64 KB
+          samples of its content (hashing all of a multi-GB log would take longer than parsing it)
+        - PARSER_VERSION (svlog_parser.py) and CACHE_VERSION (below)
+        - what was decoded and with which filters (message IDs, senders, channels, ...)
+
+    An entry is a folder of .npz files, one per block of decoded results, and a meta.json that is
+    written last, so an entry that was cut short (e.g. by --max_packets, or Ctrl-C) never gets
+    used. Only complete decodes are cached.
+
+    Two kinds of results are cached:
+
+        - decoded pings (cached_mono_profile_blocks): the arrays of waterfall.py, which load
+          straight from disk on a hit
+        - valid packets (cached_svlog_packets): the frames found by the scan, zlib-compressed.
+          A hit skips reading, scanning and checking the whole log, but the payloads of the
+          packets are still decoded as they are used.
+
+    The command-line tools use the cache unless run with --no-cache. When it grows past its size
+    cap, the least recently used entries are deleted. It lives in ~/.cache/bluerov_decode, unless
+    the BLUEROV_DECODE_CACHE environment variable or --cache-dir says otherwise.
+"""
+
+CACHE_VERSION = 1  # Bump when the layout of the entries changes
+DEFAULT_CACHE_DIR = os.environ.get("BLUEROV_DECODE_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "bluerov_decode"))
+DEFAULT_MAX_BYTES = 4 << 30  # 4 GB
+HASH_SAMPLES = 16  # Number of samples of the input file that are hashed
+HASH_SAMPLE_SIZE = 1 << 16
+STALE_TEMPORARY_SECONDS = 24 * 3600  # Unfinished entries older than this were left by a run that crashed
+BLOCK_SIZE = 4096  # Packets per cached block
+
+# ================================================================
+# Section: Identifying the input
+# ================================================================
+
+def file_fingerprint(path):
+    """
+    Identify a file by its size, modification time and a hash of samples of its content.
+
+    Returns:
+        dict: {"size", "mtime_ns", "sample_hash"}
+    """
+    stat = os.stat(path)
+    size = stat.st_size
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        if size <= HASH_SAMPLES * HASH_SAMPLE_SIZE:
+            digest.update(f.read())
+        else:
+            for i in range(HASH_SAMPLES):
+                f.seek((size - HASH_SAMPLE_SIZE) * i // (HASH_SAMPLES - 1))
+                digest.update(f.read(HASH_SAMPLE_SIZE))
+    return {"size": size, "mtime_ns": stat.st_mtime_ns, "sample_hash": digest.hexdigest()}
+
+
+def _normalize(value):
+    """Make filter arguments JSON-serializable and independent of order (sets become sorted lists)."""
+    if isinstance(value, dict):
+        return {str(key): _normalize(item) for key, item in value.items()}
+    if isinstance(value, (set, frozenset)):
+        return sorted(_normalize(item) for item in value)
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+def parse_size(text):
+    """Parse a size such as 500MB or 10GB into bytes."""
+    text = text.strip().upper()
+    for suffix, factor in (("GB", 1 << 30), ("MB", 1 << 20), ("KB", 1 << 10), ("B", 1)):
+        if text.endswith(suffix):
+            return int(float(text[:-len(suffix)]) * factor)
+    return int(text)
+
+# ================================================================
+# Section: The cache
+# ================================================================
+
+class DecodeCache:
+    """
+    An on-disk, size-capped cache of decoded blocks of NumPy arrays.
+
+    Example usage:
+        cache = DecodeCache()
+        for block in cache.blocks("2025-03-24-12-14.svlog", "my_decode", {"sender_ids": [1]}, decode_blocks):
+            ...  # Decoded by decode_blocks() the first time, loaded from the cache afterwards
+
+    Args:
+        directory: Folder holding the cache.
+        max_bytes: Size cap of the cache; least recently used entries are deleted beyond it.
+        rebuild: If True, cached entries are ignored, and replaced by a fresh decode.
+
+    Attributes:
+        hits: Number of decodes loaded from the cache.
+        misses: Number of decodes that had to be done (and were cached, if they completed).
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, rebuild=False):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.rebuild = rebuild
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, source, kind, params=None):
+        """The key of the entry for decoding source as kind with params."""
+        description = {"cache_version": CACHE_VERSION, "parser_version": PARSER_VERSION, "kind": kind,
+                       "source": file_fingerprint(source), "params": _normalize(params or {})}
+        return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+    def blocks(self, source, kind, params, compute, encode=None, decode=None, compress=False):
+        """
+        Yield the decoded blocks of a file, from the cache if they are there, and otherwise from
+        compute(), caching them as they go by.
+
+        Args:
+            source: Path to the input file.
+            kind: Name of what is decoded (part of the key).
+            params: dict of the arguments that change the result, e.g. filters (part of the key).
+            compute: Function returning an iterable of blocks, called on a cache miss.
+            encode: Optional function turning a block into a dict of NumPy arrays to store
+                (by default, blocks must already be such dicts).
+            decode: Optional function turning a stored dict of arrays back into a block.
+            compress: If True, blocks are stored zlib-compressed (np.savez_compressed): smaller,
+                but slower to store and load.
+
+        Yields:
+            Each block, in order.
+        """
+        entry = self.directory / self.key(source, kind, params)
+        meta_path = entry / "meta.json"
+        if not self.rebuild and meta_path.exists():
+            self.hits += 1
+            os.utime(meta_path)  # Marks the entry as recently used
+            with open(meta_path) as f:
+                count = json.load(f)["blocks"]
+            for i in range(count):
+                with np.load(entry / f"block_{i:06d}.npz", allow_pickle=False) as data:
+                    arrays = {name: data[name] for name in data.files}
+                yield decode(arrays) if decode is not None else arrays
+            return
+        self.misses += 1
+        yield from self._store(entry, source, kind, params, compute(), encode, compress)
+
+    def _store(self, entry, source, kind, params, blocks, encode, compress):
+        """Pass the blocks through, writing them to a temporary folder that becomes the entry once complete."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        temporary = Path(tempfile.mkdtemp(prefix=".tmp_", dir=self.directory))
+        save = np.savez_compressed if compress else np.savez
+        count = 0
+        try:
+            for block in blocks:
+                save(temporary / f"block_{count:06d}.npz", **(encode(block) if encode is not None else block))
+                count += 1
+                yield block
+            with open(temporary / "meta.json", "w") as f:
+                json.dump({"source": str(source), "kind": kind, "params": _normalize(params or {}), "blocks": count}, f)
+        except BaseException:
+            # Includes the consumer stopping early (GeneratorExit): a partial decode is not cached
+            shutil.rmtree(temporary, ignore_errors=True)
+            raise
+        if self.rebuild:
+            shutil.rmtree(entry, ignore_errors=True)
+        try:
+            os.replace(temporary, entry)
+        except OSError:
+            shutil.rmtree(temporary, ignore_errors=True)  # Another run stored the same entry first
+        self.evict()
+
+    def entries(self):
+        """
+        Every complete entry, least recently used first.
+
+        Returns:
+            list: (last used time, size in bytes, path) tuples.
+        """
+        entries = []
+        if not self.directory.is_dir():
+            return entries
+        for entry in self.directory.iterdir():
+            meta_path = entry / "meta.json"
+            if entry.name.startswith("."):
+                continue
+            try:
+                size = sum(path.stat().st_size for path in entry.iterdir())
+                entries.append((meta_path.stat().st_mtime, size, entry))
+            except (FileNotFoundError, NotADirectoryError):
+                continue  # Deleted by another run meanwhile, or not an entry at all
+        return sorted(entries)
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes, and any stale unfinished entries."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+        now = time.time()
+        for temporary in self.directory.glob(".tmp_*"):
+            try:
+                if now - temporary.stat().st_mtime > STALE_TEMPORARY_SECONDS:
+                    shutil.rmtree(temporary, ignore_errors=True)
+            except FileNotFoundError:
+                continue
+
+    def clear(self):
+        """Delete every entry."""
+        for _, _, entry in self.entries():
+            shutil.rmtree(entry, ignore_errors=True)
+
+
+def add_cache_arguments(parser):
+    """Add the decode cache options to a command-line parser."""
+    group = parser.add_argument_group("decode cache")
+    group.add_argument("--no-cache", action="store_true", help="Don't use the decode cache (neither read nor write it).")
+    group.add_argument("--rebuild", action="store_true", help="Decode the file again, replacing what is cached for it.")
+    group.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help=f"Folder of the decode cache (default: {DEFAULT_CACHE_DIR}).")
+    group.add_argument("--cache-size", type=parse_size, default=DEFAULT_MAX_BYTES,
+                       help="Size cap of the decode cache, e.g. 500MB or 10GB (default: 4GB).")
+
+
+def cache_from_args(args):
+    """The DecodeCache asked for by the options of add_cache_arguments, or None for --no-cache."""
+    if args.no_cache:
+        return None
+    return DecodeCache(args.cache_dir, args.cache_size, rebuild=args.rebuild)
+
+# ================================================================
+# Section: Caching decoded packets and pings
+# ================================================================
+
+def packets_to_block(packets):
+    """Store a list of Packets as arrays: their positions, checksums and concatenated frame bytes."""
+    frames = [packet.frame for packet in packets]
+    return {
+        "pos": np.array([packet.pos for packet in packets], dtype=np.int64),
+        "checksum": np.array([packet.checksum for packet in packets], dtype=np.uint16),
+        "frame_length": np.array([len(frame) for frame in frames], dtype=np.int64),
+        "frames": np.frombuffer(b"".join(frames), dtype=np.uint8),
+    }
+
+
+def block_to_packets(block):
+    """
+    Yield the Packets stored by packets_to_block (their payloads are decoded on access, as usual).
+    They are built one at a time rather than as a list, so that the payloads the caller decodes
+    don't pile up for a whole block.
+    """
+    data = block["frames"].tobytes()
+    lengths = block["frame_length"].tolist()
+    starts = itertools.accumulate(lengths, initial=0)
+    for pos, checksum, start, length in zip(block["pos"].tolist(), block["checksum"].tolist(), starts, lengths):
+        packet = Packet.from_frame(start, data, length - 8, checksum)
+        packet.pos = pos
+        yield packet
+
+
+def batched(iterable, size=BLOCK_SIZE):
+    """Yield lists of up to size items of an iterable."""
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def cached_svlog_packets(filename, included_ids=None, excluded_ids=None, sender_ids=None, cache=None, jobs=1, stats=None):
+    """
+    iter_svlog_packets (or parse_svlog_file_parallel, for jobs > 1) through the decode cache.
+
+    Args:
+        cache: DecodeCache to use; if None, the file is simply parsed.
+        stats: Optional ParseStats. Nothing is parsed on a cache hit, so nothing is counted then.
+
+    Yields:
+        Packet: Each valid packet, in file order.
+    """
+    def parse():
+        if jobs > 1:
+            return parse_svlog_file_parallel(filename, included_ids, excluded_ids, jobs=jobs, sender_ids=sender_ids, stats=stats)
+        return iter_svlog_packets(filename, included_ids, excluded_ids, sender_ids=sender_ids, stats=stats)
+
+    if cache is None:
+        yield from parse()
+        return
+    params = {"included_ids": included_ids, "excluded_ids": excluded_ids, "sender_ids": sender_ids}
+    for packets in cache.blocks(filename, "svlog_packets", params, lambda: batched(parse()), packets_to_block, block_to_packets,
+                                compress=True):
+        yield from packets
+
+
+def _encode_profile_block(block):
+    columns, pwr_results, sample_counts = block
+    arrays = {f"column_{name}": column for name, column in columns.items()}
+    arrays["pwr_results"] = pwr_results
+    arrays["sample_counts"] = sample_counts
+    return arrays
+
+
+def _decode_profile_block(arrays):
+    columns = {name[len("column_"):]: array for name, array in arrays.items() if name.startswith("column_")}
+    return columns, arrays["pwr_results"], arrays["sample_counts"]
+
+
+def cached_mono_profile_blocks(filename, block_size=4096, sender_ids=None, channels=None, cache=None, stats=None):
+    """
+    iter_mono_profile_blocks through the decode cache: on a hit, the blocks of arrays are loaded
+    straight from disk.
+
+    Args:
+        cache: DecodeCache to use; if None, the file is simply decoded.
+        stats: Optional ParseStats. Nothing is parsed on a cache hit, so nothing is counted then.
+
+    Yields:
+        tuple: (columns, pwr_results, sample_counts) as returned by waterfall.decode_mono_profiles.
+    """
+    def decode():
+        return iter_mono_profile_blocks(filename, block_size, sender_ids, channels, stats=stats)
+
+    if cache is None:
+        yield from decode()
+        return
+    params = {"block_size": block_size, "sender_ids": sender_ids, "channels": channels}
+    yield from cache.blocks(filename, "mono_profile_blocks", params, decode, _encode_profile_block, _decode_profile_block)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show or clear the decode cache")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help=f"Folder of the decode cache (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--clear", action="store_true", help="Delete every entry")
+    args = parser.parse_args()
+
+    cache = DecodeCache(args.cache_dir)
+    if args.clear:
+        cache.clear()
+    entries = cache.entries()
+    for last_used, size, entry in entries:
+        with open(entry / "meta.json") as f:
+            meta = json.load(f)
+        print(f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(last_used))}  {size / 1e6:9.1f} MB  "
+              f"{meta['kind']:<20} {meta['source']}  {json.dumps(meta['params'])}")
+    print(f"{len(entries)} entries, {sum(size for _, size, _ in entries) / 1e6:.1f} MB in {cache.directory}")
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,7 @@ import csv
 import json
 import argparse
 
-def process_payload_data(input_csv, output_csv):
+def process_payload_data(input_csv, output_csv, message_id_filter=2198, sender_id_filter=1):
     decoded_data = []
 
     # Open and read the large CSV file.
@@ -17,8 +17,8 @@ def process_payload_data(input_csv, output_csv):
                 # If conversion fails, skip the row.
                 continue
 
-            # Filter on Message ID = 2198 and Sender ID = 2.
-            if message_id == 2198 and sender_id == 1:
+            # Filter on the requested Message ID and Sender ID.
+            if message_id == message_id_filter and sender_id == sender_id_filter:
                 payload_text = row.get("Payload Data", "").strip()
                 if payload_text:
                     try:
@@ -57,9 +57,12 @@ def process_payload_data(input_csv, output_csv):
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
-        description="Extract and decode the 'Payload Data' JSON from rows with Message ID 2198 and Sender ID 1 into a new CSV."
+        description="Extract and decode the 'Payload Data' JSON from rows with the given Message ID and Sender ID into a new CSV. "
+                    "(To go straight from an svlog to decoded rows in one pass, use svlog_decode.py instead.)"
     )
     parser.add_argument("input_csv", help="Path to the input CSV file")
     parser.add_argument("output_csv", help="Path to the output CSV file where decoded payloads will be written")
+    parser.add_argument("--message-id", type=int, default=2198, help="Message ID to extract (default: 2198)")
+    parser.add_argument("--sender-id", type=int, default=1, help="Sender ID to extract (default: 1)")
     args = parser.parse_args()
-    process_payload_data(args.input_csv, args.output_csv)
+    process_payload_data(args.input_csv, args.output_csv, message_id_filter=args.message_id, sender_id_filter=args.sender_id)
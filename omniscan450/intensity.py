@@ -0,0 +1,274 @@
+# intensity.py
+
+import argparse
+import json
+import os
+
+import numpy as np
+from waterfall import iter_mono_profile_blocks
+
+"""
+    Converts mono profile pwr_results to calibrated intensities, a whole block of pings at a time.
+
+    pwr_results are 16-bit values scaled between each ping's min_pwr_db and max_pwr_db:
+
+        dB = min_pwr_db + pwr / 65535 * (max_pwr_db - min_pwr_db)
+
+    pwr_to_db() does that for a (pings x samples) block in one step, as float32, with NaN for the
+    zero padding of shorter pings. normalize_db() can then take out the analog gain and/or apply
+    a time-varying gain (TVG) for spreading and absorption losses, so that pings with different
+    gains, and near and far samples, can be compared.
+
+    A long waterfall is too big to look at whole, so build_pyramid() also keeps averaged copies
+    of every channel's waterfall, decimated 2x, 4x and 8x in both pings and samples, in a cache
+    file next to the .svlog ("example.svlog.pyramid.npz"). Browsing and thumbnails then read the
+    small levels only. The cache is rebuilt when the .svlog or the settings change.
+"""
+
+PYRAMID_FACTORS = (2, 4, 8)
+PYRAMID_VERSION = 1  # Bump when the way levels are computed changes, to invalidate old caches
+
+# ================================================================
+# Section: Converting to dB
+# ================================================================
+
+def sample_ranges(columns, sample_counts, width, sound_speed=None):
+    """
+    Slant range (m) of the middle of every sample: start_mm + (sample + 0.5) * length_mm / num_results.
+
+    Args:
+        columns: Ping columns, as from decode_mono_profiles.
+        sample_counts: Number of valid samples of each ping.
+        width: Number of samples per row.
+        sound_speed: Real speed of sound (m/s); if given, ranges are rescaled from the sonar's sos_dmps.
+
+    Returns:
+        np.ndarray: float64 (pings x width).
+    """
+    counts = np.maximum(sample_counts, 1).astype(np.float64)
+    spacing = columns["length_mm"] / counts / 1000.0
+    ranges = columns["start_mm"][:, None] / 1000.0 + (np.arange(width) + 0.5) * spacing[:, None]
+    if sound_speed is not None:
+        sonar_speed = columns["sos_dmps"] / 10.0
+        scale = np.where(sonar_speed > 0, sound_speed / np.where(sonar_speed > 0, sonar_speed, 1), 1.0)
+        ranges *= scale[:, None]
+    return ranges
+
+
+def pwr_to_db(pwr_results, min_pwr_db, max_pwr_db, sample_counts=None):
+    """
+    Scale a block of pwr_results to dB.
+
+    Args:
+        pwr_results: uint16 (pings x samples).
+        min_pwr_db, max_pwr_db: Per-ping scale.
+        sample_counts: Optional number of valid samples per ping; the padding after them is NaN.
+
+    Returns:
+        np.ndarray: float32 (pings x samples).
+    """
+    low = np.asarray(min_pwr_db, dtype=np.float32)[:, None]
+    step = ((np.asarray(max_pwr_db, dtype=np.float32) - np.asarray(min_pwr_db, dtype=np.float32)) / np.float32(65535))[:, None]
+    db = pwr_results * step  # uint16 * float32 stays float32
+    db += low
+    if sample_counts is not None:
+        db[np.arange(db.shape[1]) >= np.asarray(sample_counts)[:, None]] = np.nan
+    return db
+
+
+def normalize_db(db, columns, sample_counts=None, gain=False, spreading=None, absorption=0.0):
+    """
+    Normalize a block of dB intensities in place (and return it).
+
+    Args:
+        db: float32 (pings x samples), as from pwr_to_db.
+        columns: Ping columns, as from decode_mono_profiles.
+        sample_counts: Number of valid samples of each ping (default: the full width).
+        gain: Take out each ping's analog gain, 20 * log10(analog_gain) (analog_gain is taken to
+            be a linear amplitude factor; pings with no gain are left as they are).
+        spreading: TVG spreading coefficient, e.g. 20 (spherical, one way) to 40 (two way): adds
+            spreading * log10(range).
+        absorption: TVG absorption in dB/m (one way): adds 2 * absorption * range.
+    """
+    if gain:
+        analog_gain = columns["analog_gain"].astype(np.float64)
+        with np.errstate(divide="ignore"):
+            correction = np.where(analog_gain > 0, 20 * np.log10(analog_gain), 0.0)
+        db -= correction.astype(np.float32)[:, None]
+    if spreading or absorption:
+        if sample_counts is None:
+            sample_counts = np.full(len(db), db.shape[1])
+        ranges = np.maximum(sample_ranges(columns, sample_counts, db.shape[1]), 1e-3)
+        tvg = 2 * absorption * ranges
+        if spreading:
+            tvg += spreading * np.log10(ranges)
+        db += tvg.astype(np.float32)
+    return db
+
+
+def calibrated_db(columns, pwr_results, sample_counts, gain=False, spreading=None, absorption=0.0):
+    """pwr_to_db followed by normalize_db, for a block from iter_mono_profile_blocks (or a Waterfall's arrays)."""
+    db = pwr_to_db(pwr_results, columns["min_pwr_db"], columns["max_pwr_db"], sample_counts)
+    return normalize_db(db, columns, sample_counts, gain, spreading, absorption)
+
+# ================================================================
+# Section: Multi-resolution pyramid
+# ================================================================
+
+def decimate(db, factor):
+    """
+    Average each factor x factor block of pings and samples, ignoring NaN. A ragged last block
+    is averaged over what it has.
+
+    Returns:
+        np.ndarray: float32 (ceil(pings / factor) x ceil(samples / factor)).
+    """
+    pings, width = db.shape
+    rows = -(-pings // factor)
+    columns = -(-width // factor)
+    padded = np.full((rows * factor, columns * factor), np.nan, dtype=np.float32)
+    padded[:pings, :width] = db
+    blocks = padded.reshape(rows, factor, columns, factor)
+    finite = np.isfinite(blocks)
+    total = np.where(finite, blocks, 0).sum(axis=(1, 3), dtype=np.float64)
+    count = finite.sum(axis=(1, 3))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(count > 0, total / count, np.nan).astype(np.float32)
+
+
+class _LevelBuilder:
+    """Decimates one channel's pings as they arrive, carrying over rows that don't fill a whole block."""
+
+    def __init__(self, factors):
+        self.factors = factors
+        self.step = max(factors)
+        self.carry_db = None
+        self.carry_timestamps = np.zeros(0, dtype=np.uint32)
+        self.pieces = {factor: [] for factor in factors}
+        self.timestamps = {factor: [] for factor in factors}
+        self.pings = 0
+
+    def add(self, db, timestamp_ms, final=False):
+        if self.carry_db is not None:
+            width = max(db.shape[1], self.carry_db.shape[1])
+            db = np.concatenate([_pad(self.carry_db, width), _pad(db, width)])
+            timestamp_ms = np.concatenate([self.carry_timestamps, timestamp_ms])
+        # Only whole blocks of the largest factor, so every level stays aligned across calls
+        end = len(db) if final else len(db) - len(db) % self.step
+        self.carry_db = db[end:] if end < len(db) else None
+        self.carry_timestamps = timestamp_ms[end:]
+        if end == 0:
+            return
+        for factor in self.factors:
+            self.pieces[factor].append(decimate(db[:end], factor))
+            self.timestamps[factor].append(timestamp_ms[:end:factor])
+        self.pings += end
+
+    def finish(self):
+        if self.carry_db is not None:
+            self.add(np.zeros((0, self.carry_db.shape[1]), dtype=np.float32), np.zeros(0, dtype=np.uint32), final=True)
+        levels = {}
+        for factor in self.factors:
+            width = max(piece.shape[1] for piece in self.pieces[factor])
+            levels[factor] = (np.concatenate([_pad(piece, width) for piece in self.pieces[factor]]),
+                              np.concatenate(self.timestamps[factor]))
+        return levels
+
+
+def _pad(array, width):
+    if array.shape[1] == width:
+        return array
+    padded = np.full((len(array), width), np.nan, dtype=np.float32)
+    padded[:, :array.shape[1]] = array
+    return padded
+
+
+def pyramid_path(svlog_path):
+    """Return the path of the pyramid cache for an svlog file."""
+    return str(svlog_path) + ".pyramid.npz"
+
+
+def _pyramid_settings(svlog_path, factors, gain, spreading, absorption):
+    stat = os.stat(svlog_path)
+    return {"version": PYRAMID_VERSION, "source_size": stat.st_size, "source_mtime_ns": stat.st_mtime_ns,
+            "factors": list(factors), "gain": bool(gain), "spreading": spreading, "absorption": absorption}
+
+
+def build_pyramid(svlog_path, factors=PYRAMID_FACTORS, gain=False, spreading=None, absorption=0.0, block_size=4096):
+    """
+    Read every mono profile ping of an svlog once and write the decimated levels of each channel's
+    calibrated waterfall to the pyramid cache. The full-resolution waterfall is never held in memory.
+
+    Returns:
+        dict: {(sender_id, channel_number): {factor: (image, timestamp_ms)}}, where image is float32
+            (pings / factor x samples / factor) and timestamp_ms is that of the first ping of each row.
+    """
+    builders = {}
+    for columns, pwr_results, sample_counts in iter_mono_profile_blocks(svlog_path, block_size):
+        db = calibrated_db(columns, pwr_results, sample_counts, gain, spreading, absorption)
+        keys = columns["sender_id"].astype(np.int64) * 256 + columns["channel_number"]
+        for key in dict.fromkeys(keys.tolist()):  # Unique keys, in order of first appearance
+            rows = keys == key
+            builder = builders.setdefault(divmod(key, 256), _LevelBuilder(factors))
+            builder.add(db[rows], columns["timestamp_ms"][rows])
+    pyramid = {key: builder.finish() for key, builder in builders.items()}
+
+    arrays = {"settings": np.array(json.dumps(_pyramid_settings(svlog_path, factors, gain, spreading, absorption)))}
+    for (sender_id, channel_number), levels in pyramid.items():
+        for factor, (image, timestamp_ms) in levels.items():
+            arrays[f"s{sender_id}c{channel_number}_x{factor}"] = image
+            arrays[f"s{sender_id}c{channel_number}_x{factor}_timestamp_ms"] = timestamp_ms
+    temporary = pyramid_path(svlog_path) + ".tmp.npz"
+    np.savez(temporary, **arrays)
+    os.replace(temporary, pyramid_path(svlog_path))
+    return pyramid
+
+
+def load_pyramid(svlog_path, factors=PYRAMID_FACTORS, gain=False, spreading=None, absorption=0.0, rebuild=False):
+    """
+    Load the pyramid of an svlog from its cache, (re)building the cache first if it is missing,
+    out of date, or was built with different settings.
+
+    Example usage:
+        pyramid = load_pyramid("2025-03-24-12-14.svlog", spreading=20)
+        thumbnail, timestamp_ms = pyramid[1, 0][8]  # sender 1, channel 0, decimated 8x
+
+    Returns:
+        dict: As build_pyramid.
+    """
+    path = pyramid_path(svlog_path)
+    if not rebuild and os.path.exists(path):
+        with np.load(path) as data:
+            settings = json.loads(str(data["settings"]))
+            if settings == _pyramid_settings(svlog_path, factors, gain, spreading, absorption):
+                pyramid = {}
+                for name in data.files:
+                    if name == "settings" or name.endswith("_timestamp_ms"):
+                        continue
+                    channel, factor = name.split("_x")
+                    sender_id, channel_number = channel[1:].split("c")
+                    pyramid.setdefault((int(sender_id), int(channel_number)), {})[int(factor)] = (
+                        data[name], data[f"{name}_timestamp_ms"])
+                return pyramid
+    return build_pyramid(svlog_path, factors, gain, spreading, absorption)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build (or refresh) the cached multi-resolution pyramid of an svlog's waterfalls")
+    parser.add_argument("input_files", nargs="+", help="Input .svlog file(s)")
+    parser.add_argument("--gain", action="store_true", help="Take out each ping's analog gain")
+    parser.add_argument("--spreading", type=float, default=None, help="TVG spreading coefficient, e.g. 20 or 40")
+    parser.add_argument("--absorption", type=float, default=0.0, help="TVG absorption in dB/m (default: 0)")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the cache even if it is up to date")
+    args = parser.parse_args()
+
+    for input_file in args.input_files:
+        pyramid = load_pyramid(input_file, gain=args.gain, spreading=args.spreading, absorption=args.absorption,
+                               rebuild=args.rebuild)
+        print(f"{input_file} -> {pyramid_path(input_file)}")
+        for (sender_id, channel_number), levels in pyramid.items():
+            shapes = ", ".join(f"{factor}x: {image.shape[0]} x {image.shape[1]}" for factor, (image, _) in levels.items())
+            print(f"  sender {sender_id}, channel {channel_number}: {shapes}")
+
+if __name__ == "__main__":
+    main()
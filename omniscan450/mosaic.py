@@ -0,0 +1,492 @@
+# mosaic.py
+
+import argparse
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from intensity import pwr_to_db, sample_ranges
+from waterfall import iter_mono_profile_blocks
+
+"""
+    Builds a georeferenced side-scan mosaic from Omniscan 450 pings, one survey line at a time.
+
+    Every sample of every ping is placed on the seafloor:
+
+        slant range    start_mm + (sample + 0.5) * length_mm / num_results, rescaled if the real
+                       speed of sound differs from the sonar's sos_dmps
+        ground range   sqrt(slant_range**2 - altitude**2), using the altitude above the bottom
+                       (samples closer than the altitude are water column and are dropped)
+        bearing        vehicle_heading_deg + transducer_heading_deg, clockwise from north
+        position       the vehicle's position (from the track) + ground range along the bearing
+
+    and its intensity (in dB) is added to the cell of a regular grid that it falls in. The grid is
+    split into square tiles of tile_size x tile_size cells, each stored as its own .npz file with
+    the running sum, count and maximum of every cell, so both the mean and the max mosaic can be
+    rendered. Adding a survey line only reads and rewrites the tiles it touches, and a manifest
+    (mosaic.json) records which lines have been added, so the same ping is never added twice:
+    lines are recorded by file, with the senders and channels added from each, so adding a file
+    again with a different filter only adds the pings it didn't include before.
+
+    While a line is being added, tiles that have to be written out go to a staging folder, and
+    only replace the mosaic's tiles once the whole line is done and recorded in the manifest. If
+    adding a line is interrupted (a crash, Ctrl-C), the next run discards the partial line, or
+    finishes moving its tiles if it had already been recorded, so the mosaic never holds part of
+    a line.
+
+    Positions are metres east/north of the mosaic's origin, from an equirectangular projection
+    of the track's latitude/longitude, which is accurate enough over a survey area of a few km.
+"""
+
+MANIFEST_NAME = "mosaic.json"
+STAGING_NAME = "staging"  # Folder of the tiles written while a line is being added
+DEFAULT_CELL_SIZE = 0.1  # m
+DEFAULT_TILE_SIZE = 256  # cells
+MAX_CACHED_TILES = 64  # Tiles kept in memory while adding a line, before they are written out
+EARTH_RADIUS = 6371008.8  # m, mean radius
+
+# ================================================================
+# Section: Placing the samples on the seafloor
+# ================================================================
+
+def to_local_xy(lat, lon, origin):
+    """Metres east (x) and north (y) of origin (lat, lon), by an equirectangular projection."""
+    origin_lat, origin_lon = origin
+    x = np.radians(np.asarray(lon, dtype=np.float64) - origin_lon) * EARTH_RADIUS * np.cos(np.radians(origin_lat))
+    y = np.radians(np.asarray(lat, dtype=np.float64) - origin_lat) * EARTH_RADIUS
+    return x, y
+
+
+def place_samples(columns, sample_counts, width, x, y, altitude, sound_speed=None):
+    """
+    Seafloor position of every sample of a block of pings.
+
+    Args:
+        columns: Ping columns, as from decode_mono_profiles.
+        sample_counts: Number of valid samples of each ping.
+        width: Number of samples per row (the width of pwr_results).
+        x, y: Position of the vehicle at each ping, in metres.
+        altitude: Altitude above the bottom at each ping, in metres.
+        sound_speed: Real speed of sound (m/s), if it differs from the sonar's setting.
+
+    Returns:
+        tuple: (sample_x, sample_y, valid), each (pings x width).
+    """
+    slant = sample_ranges(columns, sample_counts, width, sound_speed)
+    altitude = np.asarray(altitude, dtype=np.float64)[:, None]
+    valid = (np.arange(width) < sample_counts[:, None]) & (slant > altitude) & np.isfinite(altitude)
+    valid &= (np.isfinite(x) & np.isfinite(y))[:, None]
+    ground = np.sqrt(np.where(valid, slant ** 2 - altitude ** 2, 0.0))
+
+    bearing = np.radians(columns["vehicle_heading_deg"].astype(np.float64) + columns["transducer_heading_deg"])
+    sample_x = x[:, None] + ground * np.sin(bearing)[:, None]
+    sample_y = y[:, None] + ground * np.cos(bearing)[:, None]
+    return sample_x, sample_y, valid
+
+# ================================================================
+# Section: Tiles
+# ================================================================
+
+class Tile:
+    """The running sum, count and maximum intensity of every cell of one tile (rows go north)."""
+
+    def __init__(self, tile_size, total=None, count=None, maximum=None):
+        self.total = np.zeros((tile_size, tile_size)) if total is None else total
+        self.count = np.zeros((tile_size, tile_size), dtype=np.uint32) if count is None else count
+        self.maximum = np.full((tile_size, tile_size), -np.inf, dtype=np.float32) if maximum is None else maximum
+
+    @classmethod
+    def load(cls, path, tile_size):
+        if not os.path.exists(path):
+            return cls(tile_size)
+        with np.load(path) as data:
+            return cls(tile_size, data["total"], data["count"], data["maximum"])
+
+    def save(self, path):
+        temporary = f"{path}.tmp.npz"
+        np.savez(temporary, total=self.total, count=self.count, maximum=self.maximum)
+        os.replace(temporary, path)
+
+    def statistic(self, name):
+        """The mean or max of each cell, NaN where nothing has been added."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            values = self.total / self.count if name == "mean" else self.maximum.astype(np.float64)
+        return np.where(self.count > 0, values, np.nan)
+
+
+class Mosaic:
+    """
+    A tiled mosaic on disk: a folder with the manifest (mosaic.json) and one .npz file per tile.
+
+    Example usage:
+        mosaic = Mosaic.open_or_create("mosaics/beyster", origin=(32.8663, -117.2546))
+        mosaic.add_svlog("2025-03-24-12-14.svlog", "aligned.csv")  # Only updates the tiles this line touches
+        image, extent = mosaic.render("mean")
+
+    Args:
+        directory: Folder of an existing mosaic.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        with open(self.directory / MANIFEST_NAME) as file:
+            self.manifest = json.load(file)
+        self.cell_size = self.manifest["cell_size"]
+        self.tile_size = self.manifest["tile_size"]
+        self.origin = tuple(self.manifest["origin"]) if self.manifest["origin"] is not None else None
+        self._tiles = {}  # (tile x, tile y) -> Tile, not yet written out
+        self._staging = None  # Folder that tiles are written to while a line is being added
+        self._recover()
+
+    @classmethod
+    def create(cls, directory, origin=None, cell_size=DEFAULT_CELL_SIZE, tile_size=DEFAULT_TILE_SIZE):
+        """Create an empty mosaic. Without an origin, the first position added becomes the origin."""
+        directory = Path(directory)
+        (directory / "tiles").mkdir(parents=True, exist_ok=True)
+        manifest = {"cell_size": cell_size, "tile_size": tile_size,
+                    "origin": list(origin) if origin is not None else None, "lines": {}, "pending": None}
+        _save_manifest(directory / MANIFEST_NAME, manifest)
+        return cls(directory)
+
+    @classmethod
+    def open_or_create(cls, directory, origin=None, cell_size=DEFAULT_CELL_SIZE, tile_size=DEFAULT_TILE_SIZE):
+        if (Path(directory) / MANIFEST_NAME).exists():
+            return cls(directory)
+        return cls.create(directory, origin, cell_size, tile_size)
+
+    def tile_path(self, key):
+        return self.directory / "tiles" / f"tile_{key[0]}_{key[1]}.npz"
+
+    def _tile(self, key):
+        if key not in self._tiles:
+            if len(self._tiles) >= MAX_CACHED_TILES:
+                self.flush()
+            path = self.tile_path(key)
+            if self._staging is not None and (self._staging / path.name).exists():
+                path = self._staging / path.name  # Already written out earlier in this line
+            self._tiles[key] = Tile.load(path, self.tile_size)
+        return self._tiles[key]
+
+    def add_samples(self, sample_x, sample_y, values):
+        """
+        Add samples (positions in metres from the origin, and intensities) to the mosaic.
+
+        Returns:
+            set: The (tile x, tile y) keys of the tiles touched.
+        """
+        cell_x = np.floor(sample_x / self.cell_size).astype(np.int64)
+        cell_y = np.floor(sample_y / self.cell_size).astype(np.int64)
+        tile_x = cell_x // self.tile_size
+        tile_y = cell_y // self.tile_size
+        local = (cell_y - tile_y * self.tile_size) * self.tile_size + (cell_x - tile_x * self.tile_size)
+        values = np.asarray(values, dtype=np.float32)
+
+        # Sort by tile and cell, then reduce each run of samples in the same cell at once
+        order = np.lexsort((local, tile_y, tile_x))
+        tile_x, tile_y, local, values = tile_x[order], tile_y[order], local[order], values[order]
+        if len(values) == 0:
+            return set()
+        new_cell = np.ones(len(values), dtype=bool)
+        new_cell[1:] = (local[1:] != local[:-1]) | (tile_x[1:] != tile_x[:-1]) | (tile_y[1:] != tile_y[:-1])
+        starts = np.flatnonzero(new_cell)
+        totals = np.add.reduceat(values.astype(np.float64), starts)
+        counts = np.diff(np.append(starts, len(values))).astype(np.uint32)
+        maxima = np.maximum.reduceat(values, starts)
+        cell_tile_x, cell_tile_y, cell_local = tile_x[starts], tile_y[starts], local[starts]
+
+        new_tile = np.ones(len(starts), dtype=bool)
+        new_tile[1:] = (cell_tile_x[1:] != cell_tile_x[:-1]) | (cell_tile_y[1:] != cell_tile_y[:-1])
+        bounds = np.append(np.flatnonzero(new_tile), len(starts))
+        touched = set()
+        for start, stop in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+            key = (int(cell_tile_x[start]), int(cell_tile_y[start]))
+            tile = self._tile(key)
+            cells = cell_local[start:stop]  # Unique within the tile, so fancy-index updates are safe
+            tile.total.flat[cells] += totals[start:stop]
+            tile.count.flat[cells] += counts[start:stop]
+            tile.maximum.flat[cells] = np.maximum(tile.maximum.flat[cells], maxima[start:stop])
+            touched.add(key)
+        return touched
+
+    def add_pings(self, columns, pwr_results, sample_counts, lat, lon, altitude, sound_speed=None):
+        """
+        Add a block of pings (as from iter_mono_profile_blocks) with the vehicle's position and
+        altitude above the bottom at each ping. Pings with no position or altitude (NaN) are skipped.
+
+        Returns:
+            tuple: (number of pings added, set of tiles touched)
+        """
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        if self.origin is None:
+            known = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+            if len(known) == 0:
+                return 0, set()
+            self.origin = (float(lat[known[0]]), float(lon[known[0]]))
+            self.manifest["origin"] = list(self.origin)
+            _save_manifest(self.directory / MANIFEST_NAME, self.manifest)  # Before any tile is placed against it
+        x, y = to_local_xy(lat, lon, self.origin)
+        sample_x, sample_y, valid = place_samples(columns, sample_counts, pwr_results.shape[1], x, y, altitude, sound_speed)
+        db = pwr_to_db(pwr_results, columns["min_pwr_db"], columns["max_pwr_db"])
+        touched = self.add_samples(sample_x[valid], sample_y[valid], db[valid])
+        return int(np.count_nonzero(valid.any(axis=1))), touched
+
+    def add_svlog(self, svlog, track_csv, sender_ids=None, channels=None, altitude=None, sound_speed=None, block_size=4096):
+        """
+        Add the pings of an .svlog file as one survey line, skipping any that have already been added.
+
+        Args:
+            svlog: Path to the .svlog file.
+            track_csv: The pings' positions: a CSV with "position" (the packet's byte offset in the
+                .svlog), "lat", "lon" and optionally "altitude_m" columns, one row per ping, as
+                written by alignment/align_sensors.py.
+            sender_ids: Only add pings from these sender IDs.
+            channels: Only add pings with these channel numbers.
+            altitude: Altitude above the bottom (m) to use where the track has none.
+            sound_speed: Real speed of sound (m/s), if it differs from the sonar's setting.
+
+        Returns:
+            dict: The manifest record of this pass over the line (the senders and channels added,
+                and the pings and tiles), or None if these pings had all already been added.
+        """
+        svlog = Path(svlog).resolve()
+        stat = svlog.stat()
+        key = str(svlog)
+        line = self.manifest["lines"].get(key)
+        if line is not None:
+            if line["size"] != stat.st_size or line["mtime_ns"] != stat.st_mtime_ns:
+                raise ValueError(f"{svlog} has changed since it was added to the mosaic; rebuild the mosaic to add it again")
+            if any(_covers(done, sender_ids, channels) for done in line["passes"]):
+                return None
+        passes = line["passes"] if line is not None else []
+
+        track = load_track(track_csv)
+        self._begin_line(key)
+        try:
+            pings = added = 0
+            tiles = set()
+            for columns, pwr_results, sample_counts in iter_mono_profile_blocks(svlog, block_size, sender_ids, channels):
+                new = ~_already_added(passes, columns["sender_id"], columns["channel_number"])
+                if not new.all():
+                    columns = {name: values[new] for name, values in columns.items()}
+                    pwr_results, sample_counts = pwr_results[new], sample_counts[new]
+                lat, lon, ping_altitude = track.lookup(columns["position"])
+                if altitude is not None:
+                    ping_altitude = np.where(np.isfinite(ping_altitude), ping_altitude, altitude)
+                block_added, touched = self.add_pings(columns, pwr_results, sample_counts, lat, lon, ping_altitude, sound_speed)
+                pings += len(sample_counts)
+                added += block_added
+                tiles |= touched
+            self.flush()
+        except BaseException:
+            self._abort_line()
+            raise
+
+        entry = {"senders": sorted(sender_ids) if sender_ids is not None else None,
+                 "channels": sorted(channels) if channels is not None else None,
+                 "track": str(Path(track_csv).resolve()), "pings": pings, "pings_added": added,
+                 "tiles": sorted(f"{x}_{y}" for x, y in tiles)}
+        self.manifest["lines"][key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "passes": passes + [entry]}
+        self._commit_line()
+        return entry
+
+    def _begin_line(self, key):
+        """Mark the line as being added, before any of its tiles are written out."""
+        self.manifest["pending"] = {"line": key, "state": "adding"}
+        _save_manifest(self.directory / MANIFEST_NAME, self.manifest)
+        self._staging = self.directory / STAGING_NAME
+        shutil.rmtree(self._staging, ignore_errors=True)
+        self._staging.mkdir()
+
+    def _commit_line(self):
+        """Record the line (already in the manifest), then move its staged tiles into the mosaic."""
+        self.manifest["pending"]["state"] = "committing"
+        _save_manifest(self.directory / MANIFEST_NAME, self.manifest)
+        self._move_staged_tiles()
+        self._staging = None
+        self.manifest["pending"] = None
+        _save_manifest(self.directory / MANIFEST_NAME, self.manifest)
+
+    def _abort_line(self):
+        """Throw away everything written for the line being added."""
+        self._tiles.clear()
+        shutil.rmtree(self.directory / STAGING_NAME, ignore_errors=True)
+        self._staging = None
+        self.manifest["pending"] = None
+        _save_manifest(self.directory / MANIFEST_NAME, self.manifest)
+
+    def _move_staged_tiles(self):
+        staging = self.directory / STAGING_NAME
+        for path in staging.glob("tile_*.npz"):
+            if not path.name.endswith(".tmp.npz"):  # Left by a save that didn't finish
+                os.replace(path, self.directory / "tiles" / path.name)
+        shutil.rmtree(staging, ignore_errors=True)
+
+    def _recover(self):
+        """Finish or undo the line that was being added when an earlier run stopped, if any."""
+        pending = self.manifest.get("pending")
+        if pending is None:
+            return
+        if pending["state"] == "committing":
+            self._move_staged_tiles()  # The line is recorded; some of its tiles hadn't been moved yet
+        else:
+            shutil.rmtree(self.directory / STAGING_NAME, ignore_errors=True)  # The line was never recorded
+        self.manifest["pending"] = None
+        _save_manifest(self.directory / MANIFEST_NAME, self.manifest)
+
+    def flush(self):
+        """Write out the tiles held in memory (to the staging folder while a line is being added)."""
+        for key, tile in self._tiles.items():
+            path = self.tile_path(key)
+            tile.save(path if self._staging is None else self._staging / path.name)
+        self._tiles.clear()
+
+    def tile_keys(self):
+        keys = []
+        for path in (self.directory / "tiles").glob("tile_*.npz"):
+            _, x, y = path.stem.split("_")
+            keys.append((int(x), int(y)))
+        return sorted(keys)
+
+    def render(self, statistic="mean"):
+        """
+        Put the tiles together into one image.
+
+        Args:
+            statistic: "mean" or "max" intensity of each cell (dB).
+
+        Returns:
+            tuple: (image, extent), where image is a float32 array with north up (NaN where there is
+                no data), and extent is (west, east, south, north) in metres from the origin, as for
+                matplotlib's imshow.
+        """
+        self.flush()
+        keys = self.tile_keys()
+        if not keys:
+            return np.zeros((0, 0), dtype=np.float32), (0.0, 0.0, 0.0, 0.0)
+        xs = [x for x, _ in keys]
+        ys = [y for _, y in keys]
+        size = self.tile_size
+        image = np.full(((max(ys) - min(ys) + 1) * size, (max(xs) - min(xs) + 1) * size), np.nan, dtype=np.float32)
+        for x, y in keys:
+            rows = slice((y - min(ys)) * size, (y - min(ys) + 1) * size)
+            columns = slice((x - min(xs)) * size, (x - min(xs) + 1) * size)
+            image[rows, columns] = Tile.load(self.tile_path((x, y)), size).statistic(statistic)
+        extent = (min(xs) * size * self.cell_size, (max(xs) + 1) * size * self.cell_size,
+                  min(ys) * size * self.cell_size, (max(ys) + 1) * size * self.cell_size)
+        return image[::-1], extent
+
+
+def _covers(done, sender_ids, channels):
+    """Whether an earlier pass over a line (its sender and channel filter) included every ping this filter selects."""
+    return all(added is None or (wanted is not None and set(wanted) <= set(added))
+               for added, wanted in ((done["senders"], sender_ids), (done["channels"], channels)))
+
+
+def _already_added(passes, sender_id, channel):
+    """Mask of the pings (by sender and channel) that an earlier pass over the line already added."""
+    done = np.zeros(len(sender_id), dtype=bool)
+    for added in passes:
+        match = np.ones(len(sender_id), dtype=bool)
+        if added["senders"] is not None:
+            match &= np.isin(sender_id, added["senders"])
+        if added["channels"] is not None:
+            match &= np.isin(channel, added["channels"])
+        done |= match
+    return done
+
+
+def _save_manifest(path, manifest):
+    temporary = Path(str(path) + ".tmp")
+    with open(temporary, "w") as file:
+        json.dump(manifest, file, indent=1)
+    os.replace(temporary, path)
+
+# ================================================================
+# Section: The vehicle track
+# ================================================================
+
+class Track:
+    """Position and altitude of the vehicle at each ping, looked up by the ping's byte position in the .svlog."""
+
+    def __init__(self, position, lat, lon, altitude):
+        order = np.argsort(position, kind="stable")
+        self.position = np.asarray(position, dtype=np.int64)[order]
+        self.lat = np.asarray(lat, dtype=np.float64)[order]
+        self.lon = np.asarray(lon, dtype=np.float64)[order]
+        self.altitude = np.asarray(altitude, dtype=np.float64)[order]
+
+    def lookup(self, positions):
+        """(lat, lon, altitude) of each ping, NaN for pings not in the track."""
+        positions = np.asarray(positions, dtype=np.int64)
+        if len(self.position) == 0:
+            missing = np.full(len(positions), np.nan)
+            return missing, missing, missing
+        rows = np.minimum(np.searchsorted(self.position, positions), len(self.position) - 1)
+        found = self.position[rows] == positions
+        return tuple(np.where(found, values[rows], np.nan) for values in (self.lat, self.lon, self.altitude))
+
+
+def load_track(track_csv):
+    """Read a track CSV (see Mosaic.add_svlog)."""
+    header = pd.read_csv(track_csv, nrows=0).columns
+    use = [name for name in ("position", "lat", "lon", "altitude_m") if name in header]
+    table = pd.read_csv(track_csv, usecols=use)
+    altitude = table["altitude_m"] if "altitude_m" in table else np.full(len(table), np.nan)
+    return Track(table["position"], table["lat"], table["lon"], altitude)
+
+# ================================================================
+# Section: Command line
+# ================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a tiled, georeferenced side-scan mosaic one survey line at a time")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="Add survey lines (.svlog files) to a mosaic, creating it if needed")
+    add.add_argument("mosaic", help="Mosaic folder")
+    add.add_argument("svlog", nargs="+", help="Input .svlog file(s)")
+    add.add_argument("--track", nargs="+", required=True,
+                     help="Track CSV of each .svlog (from alignment/align_sensors.py), in the same order")
+    add.add_argument("--sender-id", type=int, nargs="+", default=None, help="Only add pings from these sender IDs")
+    add.add_argument("--channel", type=int, nargs="+", default=None, help="Only add pings from these channels")
+    add.add_argument("--altitude", type=float, default=None, help="Altitude above the bottom (m) where the track has none")
+    add.add_argument("--sound-speed", type=float, default=None,
+                     help="Real speed of sound (m/s), if it differs from the sonar's setting")
+    add.add_argument("--origin", type=float, nargs=2, default=None, metavar=("LAT", "LON"),
+                     help="Origin of a new mosaic (default: the first position added)")
+    add.add_argument("--cell-size", type=float, default=DEFAULT_CELL_SIZE, help=f"Cell size of a new mosaic in m (default: {DEFAULT_CELL_SIZE})")
+    add.add_argument("--tile-size", type=int, default=DEFAULT_TILE_SIZE, help=f"Tile size of a new mosaic in cells (default: {DEFAULT_TILE_SIZE})")
+
+    render = commands.add_parser("render", help="Put the tiles together into one image (.npz)")
+    render.add_argument("mosaic", help="Mosaic folder")
+    render.add_argument("output", help="Output .npz file")
+    render.add_argument("--statistic", choices=["mean", "max"], default="mean", help="Intensity of each cell (default: mean)")
+    args = parser.parse_args()
+
+    if args.command == "add":
+        if len(args.track) != len(args.svlog):
+            parser.error("give one --track per .svlog")
+        mosaic = Mosaic.open_or_create(args.mosaic, args.origin, args.cell_size, args.tile_size)
+        for svlog, track in zip(args.svlog, args.track):
+            try:
+                entry = mosaic.add_svlog(svlog, track, args.sender_id, args.channel, args.altitude, args.sound_speed)
+            except ValueError as e:
+                print(f"Skipped {svlog}: {e}")
+                continue
+            if entry is None:
+                print(f"{svlog} is already in the mosaic")
+            else:
+                print(f"Added {svlog}: {entry['pings_added']} of {entry['pings']} pings, {len(entry['tiles'])} tiles updated")
+    else:
+        mosaic = Mosaic(args.mosaic)
+        image, extent = mosaic.render(args.statistic)
+        np.savez(args.output, image=image, extent=np.array(extent), origin=np.array(mosaic.origin or (np.nan, np.nan)),
+                 cell_size=mosaic.cell_size, statistic=args.statistic)
+        print(f"Wrote a {image.shape[1]} x {image.shape[0]} cell {args.statistic} mosaic to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# parallel_svlog.py
+
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from svlog_parser import FrameScanner, ParseStats, iter_svlog_packets, packets_from_frames, map_svlog_file, report_decode_failures
+from compressed_io import detect_compression
+
+# ==========================================================================
+# Section: Parsing one svlog file on several cores
+# ==========================================================================
+
+"""
+    The file is split into byte ranges, and each range is scanned and decoded by its own
+    worker process. A worker only reports frames that START inside its range (the last one
+    may run past the end of the range), so every packet belongs to exactly one range.
+
+    A worker has to start scanning at an arbitrary byte, so the start of its chain of frames
+    may differ from what a serial scan would have found there: the last packet of the previous
+    range may straddle the split, or the worker may have locked onto a false "BR" inside it.
+    When merging, the main process rescans serially from where the previous range's chain
+    really ended, until it meets a frame that the worker also found. From that frame on the
+    two chains are identical, so the rest of the worker's results are used as they are. In
+    practice the rescan covers at most a packet or two, and the merged output is exactly what
+    parse_svlog_file would have returned.
+
+    Parse statistics are collected by each worker and added up afterwards. Frames near a split
+    may be scanned both by a worker and by the rescan, so the counters can differ slightly from
+    a serial parse; the packets never do.
+"""
+
+MIN_RANGE_SIZE = 1 << 23  # Ranges smaller than 8 MB are not worth a process of their own
+
+
+def _parse_range(filename, start, stop, included_ids, excluded_ids, sender_ids, collect_stats=False):
+    """
+    Worker: scan and decode the frames that start in [start, stop).
+
+    Returns:
+        tuple: (positions of every valid frame found, decoded packets, end of the last frame or None,
+            ParseStats of the range or None)
+    """
+    stats = ParseStats() if collect_stats else None
+    with map_svlog_file(filename) as data:
+        frames = list(FrameScanner(stats).scan(data, start=start, stop=stop))
+        positions = np.array([frame[0] for frame in frames], dtype=np.int64)
+        packets = list(packets_from_frames(frames, data, included_ids, excluded_ids, sender_ids, stats))
+    end = frames[-1][0] + 8 + frames[-1][1] + 2 if frames else None
+    return positions, packets, end, stats
+
+
+def split_ranges(size, jobs, min_range_size=MIN_RANGE_SIZE):
+    """Split [0, size) into at most jobs contiguous ranges of at least min_range_size bytes."""
+    count = max(1, min(jobs, size // min_range_size))
+    bounds = [size * i // count for i in range(count + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def parse_svlog_file_parallel(filename, included_ids=None, excluded_ids=None, max_packets=None, jobs=None, sender_ids=None,
+                              stats=None):
+    """
+    Parse a .svlog file on several cores. Takes the same arguments and returns the same packets,
+    in the same order, as parse_svlog_file.
+
+    Args:
+        jobs: Number of worker processes (default: the number of CPUs).
+        stats: Optional ParseStats, to which the statistics of every worker are added. Its stage
+            timings are summed over the workers (CPU time, not wall-clock time), and its hook
+            is only called for the rescans done in this process.
+
+    Compressed files are parsed serially (see iter_svlog_packets).
+    """
+    if detect_compression(filename) is not None:
+        # A compressed stream can only be decompressed from its start, so it can't be split
+        packets = iter_svlog_packets(filename, included_ids, excluded_ids, sender_ids=sender_ids, stats=stats)
+        return list(itertools.islice(packets, max_packets))
+    jobs = jobs or os.cpu_count() or 1
+    failures_before = stats.decode_failures if stats is not None else 0
+    size = os.path.getsize(filename)
+    ranges = split_ranges(size, jobs)
+    with ProcessPoolExecutor(max_workers=min(jobs, len(ranges))) as executor:
+        futures = [executor.submit(_parse_range, filename, start, stop, included_ids, excluded_ids, sender_ids,
+                                   stats is not None)
+                   for start, stop in ranges]
+        results = [future.result() for future in futures]
+
+    packets = []
+    chain_end = 0  # Where the serial chain of frames really ended so far
+    with map_svlog_file(filename) as data:
+        for (start, stop), (positions, range_packets, range_end, range_stats) in zip(ranges, results):
+            if range_stats is not None:
+                stats.merge(range_stats)
+            resume = max(chain_end, start)
+            if resume == start:
+                # The serial scan would start this range exactly where the worker did
+                packets.extend(range_packets)
+                chain_end = range_end if range_end is not None else chain_end
+                continue
+            if resume >= stop:
+                continue  # The whole range lies inside a packet of the previous range
+
+            # Rescan serially until the serial chain meets the worker's chain
+            rescanned = []
+            synced_at = None
+            frames = FrameScanner(stats).scan(data, start=resume, stop=stop)
+            try:
+                for frame in frames:
+                    i = np.searchsorted(positions, frame[0])
+                    if i < len(positions) and positions[i] == frame[0]:
+                        synced_at = frame[0]
+                        break
+                    rescanned.append(frame)
+                    chain_end = frame[0] + 8 + frame[1] + 2
+            finally:
+                frames.close()
+            packets.extend(packets_from_frames(rescanned, data, included_ids, excluded_ids, sender_ids, stats))
+            if synced_at is not None:
+                packets.extend(packet for packet in range_packets if packet.pos >= synced_at)
+                chain_end = range_end
+
+    if stats is not None:
+        report_decode_failures(filename, stats, failures_before)
+    return packets[:max_packets]
+
+
+if __name__ == "__main__":
+    # Example usage
+    filename = "2025-03-24-12-14.svlog"  # Replace with your binary file
+    packets = parse_svlog_file_parallel(filename)
+    print(f"Parsed {len(packets)} packets")
@@ -0,0 +1,189 @@
+# svlog_decode.py
+
+import argparse
+import csv
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+from svlog_parser import MESSAGE_REGISTRY, ParseStats, add_stats_arguments, report_stats
+from waterfall import MONO_PROFILE_ID, PREFIX_DTYPE, PREFIX_SIZE
+from columnar_writer import WRITERS, open_profile_writer
+from decode_cache import add_cache_arguments, cache_from_args, cached_mono_profile_blocks, cached_svlog_packets
+from compressed_io import open_output, strip_compression_suffix
+
+# ======================================================================
+# Section: Decoding an svlog straight to flattened, per-channel tables
+# ======================================================================
+
+"""
+    This does in one streaming pass what used to take csv_writer.py followed by
+    decode_payload_csv.py: the packets are filtered on their message ID, sender ID and
+    channel before their payloads are decoded, and the wanted ones are written straight out
+    with one column per payload field.
+
+    The CSV output has the same columns as decode_payload_csv.py (the payload fields plus
+    length, message_id and message_type, sorted by name, with arrays written as JSON lists),
+    so anything that reads those files keeps working.
+"""
+
+
+class CSVProfileWriter:
+    """Write mono profile blocks to a CSV file in the same layout as decode_payload_csv.py."""
+
+    MESSAGE_TYPE = MESSAGE_REGISTRY[MONO_PROFILE_ID].MESSAGE_TYPE
+    FIELDNAMES = sorted(list(PREFIX_DTYPE.names) + ["length", "message_id", "message_type", "pwr_results"])
+
+    def __init__(self, filename):
+        self.file = open_output(filename)  # Compressed if the name ends in .gz/.xz/.zst
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(self.FIELDNAMES)
+
+    def write_block(self, columns, pwr_results, sample_counts):
+        values = {name: columns[name].tolist() for name in PREFIX_DTYPE.names}
+        values["length"] = (PREFIX_SIZE + 2 * sample_counts).tolist()
+        values["message_id"] = [MONO_PROFILE_ID] * len(sample_counts)
+        values["message_type"] = [self.MESSAGE_TYPE] * len(sample_counts)
+        values["pwr_results"] = [json.dumps(row[:count]) for row, count in zip(pwr_results.tolist(), sample_counts.tolist())]
+        self.writer.writerows(zip(*(values[name] for name in self.FIELDNAMES)))
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _open_writer(output_filename, output_format):
+    if output_format == "csv" or (output_format is None and strip_compression_suffix(output_filename).suffix.lower() == ".csv"):
+        return CSVProfileWriter(output_filename)
+    return open_profile_writer(output_filename, output_format)
+
+
+def decode_mono_profiles_by_channel(input_filename, output_filename, output_format=None, sender_ids=None, channels=None, split=True,
+                                    stats=None, cache=None):
+    """
+    Decode the os_mono_profile packets of a .svlog file into one table per (sender, channel).
+
+    Args:
+        input_filename: Path to the input .svlog file.
+        output_filename: Path to the output file. When split is True, "_sender<S>_ch<C>" is
+            added to its name for each (sender, channel) found.
+        output_format: "csv", "parquet" or "hdf5" (inferred from the extension if None).
+        sender_ids: If given, only pings from these sender IDs are written.
+        channels: If given, only pings with these channel numbers are written.
+        split: Whether to write one file per (sender, channel), or everything to output_filename.
+        stats: Optional ParseStats to collect counters and stage timings into.
+        cache: Optional DecodeCache (see decode_cache.py) to load the decoded pings from, or store them in.
+
+    Returns:
+        dict: {output filename: number of pings written}
+    """
+    output_path = strip_compression_suffix(output_filename)
+    compression_suffix = Path(output_filename).suffix if output_path != Path(output_filename) else ""
+    writers = {}
+    counts = {}
+    try:
+        for columns, pwr_results, sample_counts in cached_mono_profile_blocks(input_filename, sender_ids=sender_ids, channels=channels,
+                                                                              cache=cache, stats=stats):
+            started = time.perf_counter()
+            if split:
+                keys = columns["sender_id"].astype(np.int64) * 256 + columns["channel_number"]
+                groups = [(divmod(key, 256), keys == key) for key in dict.fromkeys(keys.tolist())]
+            else:
+                groups = [(None, slice(None))]
+            for key, rows in groups:
+                if key is None:
+                    filename = str(output_filename)
+                else:
+                    filename = str(output_path.with_name(f"{output_path.stem}_sender{key[0]}_ch{key[1]}{output_path.suffix}"
+                                                         f"{compression_suffix}"))
+                if filename not in writers:
+                    writers[filename] = _open_writer(filename, output_format)
+                    counts[filename] = 0
+                writers[filename].write_block({name: column[rows] for name, column in columns.items()},
+                                              pwr_results[rows], sample_counts[rows])
+                counts[filename] += len(sample_counts[rows])
+            if stats is not None:
+                stats.add_time("write", time.perf_counter() - started, len(sample_counts))
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return counts
+
+
+def decode_messages_to_csv(input_filename, output_filename, message_id, sender_ids=None, stats=None, cache=None):
+    """
+    Decode every packet of one (non-sidescan) message type to a CSV, one column per payload field.
+    If stats (a ParseStats) is given, counters and stage timings are collected into it, and if
+    cache (a DecodeCache) is given, the packets are loaded from it or stored in it.
+
+    Returns:
+        dict: {output filename: number of packets written}
+    """
+    message_class = MESSAGE_REGISTRY[message_id]
+    fieldnames = sorted(list(message_class.FORMAT) + ["length", "message_id", "message_type"])
+    written = 0
+    with open_output(output_filename) as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=fieldnames)
+        writer.writeheader()
+        seconds = 0.0
+        for packet in cached_svlog_packets(input_filename, included_ids={message_id}, sender_ids=sender_ids, cache=cache, stats=stats):
+            started = time.perf_counter()
+            row = {key: json.dumps(value.tolist() if isinstance(value, np.ndarray) else value)
+                   if isinstance(value, (list, np.ndarray)) else value
+                   for key, value in packet.payload.to_dict().items()}
+            writer.writerow(row)
+            written += 1
+            seconds += time.perf_counter() - started
+        if stats is not None:
+            stats.add_time("write", seconds, written)
+    return {output_filename: written}
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Decode an svlog file straight into flattened per-channel tables, in a single pass.")
+    parser.add_argument("input_file", help="Path to the input svlog file (may be gzip/xz/zstd compressed).")
+    parser.add_argument("output_file", help="Path to the output file (.csv, .parquet or .h5; .csv.gz, .csv.xz or .csv.zst for compressed CSV). Sidescan data gets one file per sender and channel, e.g. output_sender1_ch0.csv.")
+    parser.add_argument("--message-id", type=int, default=MONO_PROFILE_ID, help=f"Message ID to decode (default: {MONO_PROFILE_ID}, the sidescan data).")
+    parser.add_argument("--sender-id", nargs="*", type=int, default=[], help="Sender IDs to include (default: all).")
+    parser.add_argument("--channel", nargs="*", type=int, default=[], help="Channel numbers to include (default: all). Sidescan messages only.")
+    parser.add_argument("--format", choices=["csv"] + sorted(WRITERS), default=None, help="Output format (default: inferred from the output file extension).")
+    parser.add_argument("--no-split", action="store_true", help="Write all senders and channels to one file instead of one file each.")
+    add_stats_arguments(parser)
+    add_cache_arguments(parser)
+
+    args = parser.parse_args()
+    stats = ParseStats() if args.stats or args.json_stats else None
+    cache = cache_from_args(args)
+
+    if args.message_id not in MESSAGE_REGISTRY:
+        parser.error(f"Unknown message ID {args.message_id}; known IDs are {sorted(MESSAGE_REGISTRY)}")
+    if args.message_id == MONO_PROFILE_ID:
+        written = decode_mono_profiles_by_channel(
+            args.input_file,
+            args.output_file,
+            output_format=args.format,
+            sender_ids=args.sender_id or None,
+            channels=args.channel or None,
+            split=not args.no_split,
+            stats=stats,
+            cache=cache
+        )
+    else:
+        if args.channel:
+            parser.error("--channel only applies to sidescan (2198) messages")
+        if args.format not in (None, "csv"):
+            parser.error("Only CSV output is supported for messages other than 2198")
+        written = decode_messages_to_csv(args.input_file, args.output_file, args.message_id, sender_ids=args.sender_id or None,
+                                         stats=stats, cache=cache)
+
+    for filename, count in written.items():
+        print(f"{count} packets written to {filename}")
+    if stats is not None:
+        report_stats(args, stats)
@@ -0,0 +1,227 @@
+# svlog_index.py
+
+import argparse
+import hashlib
+import os
+import struct
+
+import numpy as np
+from svlog_parser import FrameScanner, OsMonoProfileMessage, Packet, map_svlog_file
+from compressed_io import detect_compression
+
+# ==================================================================
+# Section: Defining the binary index sidecar written next to an svlog
+# ==================================================================
+
+"""
+    The index of "example.svlog" is written to "example.svlog.idx". It is a fixed-size header
+    followed by one INDEX_DTYPE record per valid packet, in file order:
+
+        magic               8 bytes, b"SVLGIDX1"
+        indexed_through     U64, end of the last indexed packet (scanning resumes from here)
+        source_size         U64, size of the svlog when it was last indexed
+        source_head         32 bytes, SHA-256 of the first HEAD_BYTES of the svlog
+
+    When the svlog has grown since it was indexed (same head, larger size), only the bytes
+    after indexed_through are scanned and the new records are appended. If the svlog has
+    shrunk or its head has changed, the index is rebuilt from scratch.
+"""
+
+INDEX_MAGIC = b"SVLGIDX1"
+INDEX_HEADER = struct.Struct("<8sQQ32s")
+HEAD_BYTES = 1 << 16
+
+INDEX_DTYPE = np.dtype([
+    ("offset", "<u8"),          # Byte position of the packet ('B' of "BR") in the svlog
+    ("length", "<u4"),          # Length of the whole packet (header + payload + checksum) in bytes
+    ("message_id", "<u2"),
+    ("sender_id", "u1"),
+    ("receiver_id", "u1"),
+    ("ping_number", "<u4"),     # Only for os_mono_profile packets; NOT_A_PING otherwise
+    ("timestamp_ms", "<u4"),    # Only for os_mono_profile packets; NOT_A_PING otherwise
+])
+NOT_A_PING = 0xFFFFFFFF
+
+MONO_PROFILE_ID = OsMonoProfileMessage.MESSAGE_ID
+_PROFILE_DTYPE = OsMonoProfileMessage.LAYOUT.numpy_dtype()
+PING_NUMBER_OFFSET = _PROFILE_DTYPE.fields["ping_number"][1]
+TIMESTAMP_OFFSET = _PROFILE_DTYPE.fields["timestamp_ms"][1]
+
+
+def index_path(svlog_path):
+    """Return the path of the index sidecar for an svlog file."""
+    return str(svlog_path) + ".idx"
+
+
+def _head_hash(data):
+    return hashlib.sha256(data[:HEAD_BYTES]).digest()
+
+
+def _index_records(data, frames):
+    """Turn a batch of (pos, payload_length, message_id) frames into index records."""
+    positions = np.array([frame[0] for frame in frames], dtype=np.int64)
+    records = np.zeros(len(frames), dtype=INDEX_DTYPE)
+    records["offset"] = positions
+    records["length"] = [frame[1] + 10 for frame in frames]
+    records["message_id"] = [frame[2] for frame in frames]
+    view = np.frombuffer(data, dtype=np.uint8)
+    records["sender_id"] = view[positions + 6]
+    records["receiver_id"] = view[positions + 7]
+
+    # Pull the ping number and timestamp out of the os_mono_profile payloads, without decoding them
+    records["ping_number"] = NOT_A_PING
+    records["timestamp_ms"] = NOT_A_PING
+    pings = (records["message_id"] == MONO_PROFILE_ID) & (records["length"] >= 10 + _PROFILE_DTYPE.itemsize)
+    payloads = positions[pings] + 8
+    for name, offset in (("ping_number", PING_NUMBER_OFFSET), ("timestamp_ms", TIMESTAMP_OFFSET)):
+        field_bytes = view[(payloads + offset)[:, None] + np.arange(4)]
+        records[name][pings] = field_bytes.view("<u4").ravel()
+    del view
+    return records
+
+
+def build_index(svlog_path, rebuild=False, batch_size=65536):
+    """
+    Create or extend the index sidecar of an svlog file.
+
+    Args:
+        svlog_path: Path to the .svlog file.
+        rebuild: Whether to rebuild the index from scratch even if it could be extended.
+        batch_size: Number of packets to index before appending them to the sidecar.
+
+    Returns:
+        int: The number of packets added to the index.
+
+    Raises:
+        ValueError: If the file is compressed (an index is only useful for seeking, which a
+            compressed file can't do).
+    """
+    compression = detect_compression(svlog_path)
+    if compression is not None:
+        raise ValueError(f"{svlog_path} is {compression}-compressed; decompress it to index it")
+    idx_path = index_path(svlog_path)
+    added = 0
+    with map_svlog_file(svlog_path) as data:
+        head = _head_hash(data)
+        start = 0
+        if not rebuild and os.path.exists(idx_path):
+            with open(idx_path, "rb") as f:
+                magic, indexed_through, source_size, source_head = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+            if magic == INDEX_MAGIC and source_head == head and source_size <= len(data):
+                if source_size == len(data):
+                    return 0  # Already up to date
+                start = indexed_through
+        if start == 0:
+            with open(idx_path, "wb") as f:
+                f.write(INDEX_HEADER.pack(INDEX_MAGIC, 0, 0, head))
+
+        indexed_through = start
+        with open(idx_path, "r+b") as f:
+            # Drop any records appended after indexed_through by an interrupted earlier run
+            offsets = np.fromfile(f, dtype=INDEX_DTYPE, offset=INDEX_HEADER.size)["offset"]
+            f.truncate(INDEX_HEADER.size + int(np.searchsorted(offsets, start)) * INDEX_DTYPE.itemsize)
+            f.seek(0, os.SEEK_END)
+            del offsets
+
+            frames = FrameScanner().scan(data, start=start)
+            try:
+                batch = []
+                for pos, payload_length, message_id, _ in frames:
+                    batch.append((pos, payload_length, message_id))
+                    indexed_through = pos + 8 + payload_length + 2
+                    if len(batch) == batch_size:
+                        f.write(_index_records(data, batch).tobytes())
+                        added += len(batch)
+                        batch = []
+                if batch:
+                    f.write(_index_records(data, batch).tobytes())
+                    added += len(batch)
+            finally:
+                frames.close()
+            # Only record the new end once the records are safely written
+            f.seek(0)
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, indexed_through, len(data), head))
+    return added
+
+
+def load_index(svlog_path, update=True):
+    """
+    Load the index records of an svlog file, building or extending the index first if needed.
+
+    Returns:
+        numpy.ndarray: One INDEX_DTYPE record per valid packet, in file order.
+    """
+    if update:
+        build_index(svlog_path)
+    return np.fromfile(index_path(svlog_path), dtype=INDEX_DTYPE, offset=INDEX_HEADER.size)
+
+
+def _in_range(values, value_range):
+    low, high = value_range
+    keep = values != NOT_A_PING
+    if low is not None:
+        keep &= values >= low
+    if high is not None:
+        keep &= values <= high
+    return keep
+
+
+def _as_list(value):
+    return [value] if isinstance(value, int) else list(value)
+
+
+def select(svlog_path, time_range=None, ping_range=None, sender=None, message_id=None):
+    """
+    Yield the packets of an svlog file that match the given criteria, seeking straight to them
+    through the index instead of rescanning the file.
+
+    Example usage:
+        # All sidescan pings from sender 2 in a five minute window
+        for packet in select("2025-03-24-12-14.svlog", time_range=(600000, 900000), sender=2):
+            print(packet.payload.ping_number, packet.payload.timestamp_ms)
+
+    Args:
+        svlog_path: Path to the .svlog file.
+        time_range: (first, last) timestamp_ms, inclusive; either end may be None.
+        ping_range: (first, last) ping_number, inclusive; either end may be None.
+        sender: A sender ID, or a collection of them.
+        message_id: A message ID, or a collection of them.
+        Note: time_range and ping_range only match os_mono_profile packets.
+
+    Yields:
+        Packet: Each matching packet, in file order. Packets whose payload doesn't fit their
+            message type are skipped, as iter_svlog_packets skips them.
+    """
+    records = load_index(svlog_path)
+    keep = np.ones(len(records), dtype=bool)
+    if time_range is not None:
+        keep &= _in_range(records["timestamp_ms"], time_range)
+    if ping_range is not None:
+        keep &= _in_range(records["ping_number"], ping_range)
+    if sender is not None:
+        keep &= np.isin(records["sender_id"], _as_list(sender))
+    if message_id is not None:
+        keep &= np.isin(records["message_id"], _as_list(message_id))
+
+    with map_svlog_file(svlog_path) as data:
+        for offset, length in zip(records["offset"][keep].tolist(), records["length"][keep].tolist()):
+            checksum = struct.unpack_from("<H", data, offset + length - 2)[0]
+            try:
+                packet = Packet.from_frame(offset, data, length - 10, checksum)
+            except ValueError as e:  # A valid frame whose payload doesn't fit its format, skipped as the parser does
+                print(f"Error decoding payload of packet at byte {offset}: {e}")
+                continue
+            yield packet
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Build or extend the packet index (.idx sidecar) of svlog files.")
+    parser.add_argument("input_files", nargs="+", help="Paths to the svlog files to index.")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the index from scratch instead of extending it.")
+
+    args = parser.parse_args()
+
+    for input_file in args.input_files:
+        added = build_index(input_file, rebuild=args.rebuild)
+        print(f"Indexed {added} new packets of {input_file} into {index_path(input_file)}")
@@ -1,5 +1,14 @@
-import re
+import collections
+import contextlib
+import itertools
+import json
+import mmap
+import os
 import struct
+import time
+
+import numpy as np
+from compressed_io import detect_compression, iter_decompressed_chunks
 
 # ================================================================
 # Section: Defining struct format codes for unpacking binary data
@@ -11,6 +20,8 @@ U32 = "I"  # Unsigned 32-bit integer
 FLOAT = "f"  # 4-byte float
 CHAR = "s"  # 1-byte character
 
+PARSER_VERSION = 2  # Bump whenever the decoded output changes, so that cached decodes (see decode_cache.py) are redone
+
 """
     Important notes:
 
@@ -30,12 +41,184 @@ CHAR = "s"  # 1-byte character
         
         2.  A string is represented as [CHAR] in the format dictionary 
             (but don't worry, it will be unpacked as a normal string).
+
+        3.  A trailing variable-length array is normally unpacked as a list. To get it as a
+            (read-only) NumPy array instead, wrap it in NumpyArray:
+
+                NumpyArray([U8])....indicates an array of unsigned 8-bit integers, unpacked as a NumPy array
 """
 
+class NumpyArray(list):
+    """Marks a trailing variable-length array (e.g. NumpyArray([U8])) to be unpacked as a NumPy array rather than a list."""
+
+# Equivalent little-endian NumPy type codes, for viewing binary data as arrays
+_NUMPY_CODES = {U8: "u1", U16: "<u2", U32: "<u4", FLOAT: "<f4", CHAR: "S1"}
+
 # ===================================================================
 # Section: Defining function to unpack binary data of a given format
 # ===================================================================
 
+class CompiledFormat:
+    """
+    A format dictionary compiled into a single struct.Struct, so that a whole payload can be
+    unpacked with one unpack_from call instead of one struct call per attribute.
+
+    Every fixed-size attribute (including fixed-length arrays like [U16]*2) goes into the 
+    precompiled prefix. A trailing variable-length array (e.g. [U16] or [CHAR]) is described 
+    separately, since its length is only known once we see the data.
+
+    Args:
+        format_dict: A dictionary mapping attribute names to struct format codes or arrays thereof.
+    """
+
+    def __init__(self, format_dict):
+        self.format = format_dict
+        self.names = list(format_dict)
+        self.fields = []  # (attribute_name, index into the unpacked tuple, count, kind)
+        self.tail = None  # (attribute_name, data_type, item_size) for a trailing variable-length array
+        self.tail_as_numpy = False  # True if the trailing array is unpacked as a NumPy array
+
+        fmt = "<"
+        index = 0
+        for position, (attribute_name, format_code) in enumerate(format_dict.items()):
+            if isinstance(format_code, list):
+                data_type = format_code[0]  # Assume all elements are the same type
+                if len(format_code) == 1:
+                    # A variable-length array can only be sized from the remaining data, so it must come last
+                    if position != len(format_dict) - 1:
+                        raise ValueError(f"Variable-length array '{attribute_name}' must be the last attribute in the format")
+                    self.tail = (attribute_name, data_type, struct.calcsize("<" + data_type))
+                    self.tail_as_numpy = isinstance(format_code, NumpyArray)
+                    continue
+                length = len(format_code)
+                fmt += f"{length}{data_type}"
+                if data_type == CHAR:
+                    # A fixed-length string unpacks to a single bytes object
+                    self.fields.append((attribute_name, index, 1, "string"))
+                    index += 1
+                else:
+                    self.fields.append((attribute_name, index, length, "array"))
+                    index += length
+            else:
+                fmt += format_code
+                self.fields.append((attribute_name, index, 1, "value"))
+                index += 1
+
+        self.prefix = struct.Struct(fmt)
+        self.prefix_size = self.prefix.size
+        # If every attribute is a plain value, the unpacked tuple can be zipped straight onto the names
+        self.simple = all(kind == "value" for _, _, _, kind in self.fields)
+        self.prefix_names = [attribute_name for attribute_name, _, _, _ in self.fields]
+        self.prefix_strings = any(kind == "string" for _, _, _, kind in self.fields)
+        self.tail_string = self.tail is not None and self.tail[1] == CHAR
+        self._tail_structs = {}  # Cache of struct.Struct objects for each tail length seen so far
+
+    def numpy_dtype(self):
+        """
+        Return a packed NumPy structured dtype equivalent to the fixed prefix, so that prefixes 
+        can be viewed straight out of a buffer (the trailing variable-length array is not included).
+        """
+        formats = []
+        for attribute_name, format_code in self.format.items():
+            if self.tail is not None and attribute_name == self.tail[0]:
+                continue
+            if isinstance(format_code, list):
+                if format_code[0] == CHAR:
+                    formats.append(f"S{len(format_code)}")
+                else:
+                    formats.append((_NUMPY_CODES[format_code[0]], len(format_code)))
+            else:
+                formats.append(_NUMPY_CODES[format_code])
+        return np.dtype({"names": self.prefix_names, "formats": formats})
+
+    def _tail_struct(self, length):
+        tail_struct = self._tail_structs.get(length)
+        if tail_struct is None:
+            tail_struct = self._tail_structs[length] = struct.Struct(f"<{length}{self.tail[1]}")
+        return tail_struct
+
+    def check_size(self, size):
+        """
+        Raises:
+            ValueError: If a payload of size bytes does not match the format.
+        """
+        if size < self.prefix_size or (self.tail is None and size != self.prefix_size):
+            raise ValueError(f"Format does not match data size: {size} bytes")
+        if self.tail is not None and (size - self.prefix_size) % self.tail[2]:
+            raise ValueError(f"Format does not match data size: {size} bytes")
+
+    def check(self, data):
+        """
+        Check that data can be unpacked: its size matches the format, and its strings are ASCII.
+        Strings are only decoded when they are first accessed, so a bad one must be caught here
+        for the packet to be skipped, rather than fail later (e.g. while it is being written out).
+
+        Raises:
+            ValueError: If the data does not match the format (UnicodeDecodeError, for a string
+                that is not ASCII, is a ValueError too).
+        """
+        self.check_size(len(data))
+        if self.prefix_strings:
+            self.unpack_prefix(data)
+        if self.tail_string:
+            bytes(data[self.prefix_size:]).decode('ascii')
+
+    def unpack(self, data):
+        """
+        Unpack binary data into a dictionary of {attribute_name : extracted_value} pairs.
+
+        Raises:
+            ValueError: If the data size does not match the format.
+        """
+        self.check_size(len(data))
+        unpacked_data = self.unpack_prefix(data)
+        if self.tail is not None:
+            unpacked_data[self.tail[0]] = self.unpack_tail(data)
+        return unpacked_data
+
+    def unpack_prefix(self, data):
+        """Unpack the fixed-size attributes only, into a dictionary (the size must already have been checked)."""
+        values = self.prefix.unpack_from(data)
+
+        if self.simple:
+            unpacked_data = dict(zip(self.prefix_names, values))
+        else:
+            unpacked_data = {}
+            for attribute_name, index, count, kind in self.fields:
+                if kind == "value":
+                    unpacked_data[attribute_name] = values[index]
+                elif kind == "string":
+                    unpacked_data[attribute_name] = values[index].decode('ascii').rstrip("\x00")
+                else:
+                    unpacked_data[attribute_name] = list(values[index:index + count])
+        return unpacked_data
+
+    def unpack_tail(self, data):
+        """Unpack the trailing variable-length array only (the size must already have been checked)."""
+        _, data_type, item_size = self.tail
+        if data_type == CHAR:
+            # The value is a string
+            return bytes(data[self.prefix_size:]).decode('ascii').rstrip("\x00")
+        if self.tail_as_numpy:
+            # The value is a NumPy array, viewed straight out of the (immutable) payload bytes
+            if not isinstance(data, bytes) and not (isinstance(data, memoryview) and data.readonly):
+                data = bytes(data)
+            return np.frombuffer(data, dtype=_NUMPY_CODES[data_type], offset=self.prefix_size)
+        # The value is a true array
+        length = (len(data) - self.prefix_size) // item_size
+        return list(self._tail_struct(length).unpack_from(data, self.prefix_size))
+
+
+_COMPILED_FORMATS = {}  # id(format_dict) -> (format_dict, CompiledFormat), for formats used without registration
+
+def compile_format(format_dict):
+    """Return the CompiledFormat for a format dictionary, compiling it on first use."""
+    cached = _COMPILED_FORMATS.get(id(format_dict))
+    if cached is None or cached[0] is not format_dict:
+        cached = _COMPILED_FORMATS[id(format_dict)] = (format_dict, CompiledFormat(format_dict))
+    return cached[1]
+
+
 def unpack_from_format(format_dict, data):
     """
     Unpack binary data into usable form based on the provided format dictionary.
@@ -47,43 +230,7 @@ def unpack_from_format(format_dict, data):
     Returns:
         dict: The unpacked data, in {attribute_name : extracted_value} pairs
     """
-    unpacked_data = {}
-    pos = 0
-    for attribute_name, format_code in format_dict.items():
-
-        if isinstance(format_code, list):
-            data_type = format_code[0]  # Assume all elements are the same type
-            # If the array only has one value, assume you're supposed to fill it with the rest of the data 
-            if len(format_code) == 1:
-                length = (len(data) - pos) // struct.calcsize(data_type)
-            # Otherwise, assume the correct length has been specified
-            else:
-                length = len(format_code)
-            
-            fmt = '<' + f"{length}{data_type}"
-            size = struct.calcsize(fmt)
-            try:
-                # Attempt to unpack the data
-                value = struct.unpack(fmt, data[pos:pos+size])
-            except struct.error as e:
-                raise ValueError(f"Error unpacking data with length {len(data[pos:pos+size])} at position {pos}: {e}")
-            if data_type == CHAR:
-                # The value is a string
-                value = value[0].decode('ascii').rstrip("\x00")
-            else:
-                # The value is a true array 
-                value = list(value)
-        else:
-            fmt = '<' + format_code
-            size = struct.calcsize(fmt)
-            value = struct.unpack(fmt, data[pos:pos+size])[0]
-
-        unpacked_data[attribute_name] = value
-        pos += size
-    
-    if pos != len(data) or len(unpacked_data) != len(format_dict):
-        raise ValueError(f"Format does not match data size: {len(data)} bytes")
-    return unpacked_data
+    return compile_format(format_dict).unpack(data)
 
 
 # ===============================================================
@@ -93,13 +240,18 @@ def unpack_from_format(format_dict, data):
 class Header:
     """
     Class to represent a packet header (including initial 'BR').
+
+    Only the 'BR' signature is checked when the header is created; the attributes defined in
+    FORMAT are unpacked the first time one of them is read, and then kept.
     
     Args:
-        header_data: The 8-byte binary data that will be translated into usable form
-            and loaded into the attributes defined in FORMAT.  For details on the 
-            Ping Protocol header format, see https://docs.bluerobotics.com/ping-protocol/ 
+        header_data: The 8-byte binary data (bytes or a memoryview of them) that will be 
+            translated into usable form and loaded into the attributes defined in FORMAT.  For 
+            details on the Ping Protocol header format, see https://docs.bluerobotics.com/ping-protocol/ 
     """
 
+    __slots__ = ("_data", "_values")
+
     FORMAT = {
         "br": [CHAR]*2,
         "payload_length": U16,  # Two bytes for an integer representing the payload length (in bytes)
@@ -107,16 +259,37 @@ class Header:
         "sender_id": U8,        # One byte for an integer representing the sender ID (typically 1 or 2 for the sidescan sonars)
         "receiver_id": U8,      # One byte for an integer representing the receiver ID (typically 0 for the topside computer)
     }
+    LAYOUT = CompiledFormat(FORMAT)
     
     def __init__(self, header_data):
-        # Translate the binary data into usable form, and load it into this object's attributes
-        unpacked_data = unpack_from_format(self.FORMAT, header_data)
-        for attribute, value in unpacked_data.items():
-            setattr(self, attribute, value)
-
+        self.LAYOUT.check_size(len(header_data))
         # Make sure the first two bytes are 'BR'
-        if self.br != 'BR':
-            raise ValueError(f"Invalid header signature: {self.br}")
+        if header_data[:2] != b"BR":
+            raise ValueError(f"Invalid header signature: {bytes(header_data[:2]).decode('ascii', 'replace')}")
+        self._data = header_data
+
+    def __getattr__(self, name):
+        # Only called for attributes that are not set: unpack the header on first access
+        if name.startswith("_"):
+            raise AttributeError(name)
+        try:
+            values = self._values
+        except AttributeError:
+            values = self._values = self.LAYOUT.unpack_prefix(self._data)
+        try:
+            return values[name]
+        except KeyError:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'") from None
+
+    def to_dict(self):
+        """The attributes of the header, as {attribute_name : value} pairs."""
+        return {name: getattr(self, name) for name in self.LAYOUT.names}
+
+    def __getstate__(self):
+        return bytes(self._data)
+
+    def __setstate__(self, state):
+        self._data = state
     
     def __repr__(self):
         return f"Header(br='{self.br}', payload_length={self.payload_length}, message_id={self.message_id}, sender_id={self.sender_id}, receiver_id={self.receiver_id})"
@@ -128,8 +301,8 @@ class Payload:
     
     To instantiate, use Payload.create(message_id, payload_data) instead of Payload().
     These will return an object from the appropriate message subclass (e.g. NackMessage 
-    or OsMonoProfileMessage), with all of the attributes automatically unpacked from the
-    binary data and saved in the object.
+    or OsMonoProfileMessage), whose attributes are unpacked from the binary data as they
+    are needed.
 
     Example usage:
         payload = Payload.create(message_id=2198, payload_data)
@@ -137,9 +310,19 @@ class Payload:
         print("Ping frequency is", payload.ping_hz)
 
     To recap: any attribute included in the format dictionary of the relevant subclass
-    will be saved in the Payload object as an attribute of the SAME NAME.
+    is available on the Payload object as an attribute of the SAME NAME. Only the size of the
+    data is checked when the payload is created. The fixed-size attributes are all unpacked 
+    together on the first access to one of them, and a trailing variable-length array 
+    (e.g. pwr_results) only when it is itself accessed; either way the values are kept, so 
+    packets that are only counted or filtered on cost next to nothing to decode. Use to_dict()
+    to get every attribute at once.
+
+    Payloads use __slots__, so subclasses should declare __slots__ = () as well (they still 
+    work without it, at the cost of a __dict__ per payload).
     """
 
+    __slots__ = ("_data", "_layout", "_values", "message_id", "message_type")
+
     @staticmethod
     def create(message_id, payload_data):
         """Factory method to instantiate the correct subclass."""
@@ -151,21 +334,73 @@ class Payload:
             return Payload(payload_data, message_id)  # Default to base class
             
     def __init__(self, payload_data, message_id, message_type="Unknown message type", format=None):
-        self.length = len(payload_data)  # In bytes
+        self._data = payload_data
         self.message_id = message_id 
         self.message_type = message_type
+        layout = None
         if format is not None:
-            # Translate the binary data into usable form, and load it into this object's attributes
-            unpacked_data = unpack_from_format(format, payload_data)
-            for attribute, value in unpacked_data.items():
-                setattr(self, attribute, value)
+            # Use the layout compiled at registration if this is the registered format
+            layout = getattr(self, "LAYOUT", None)
+            if layout is None or layout.format is not format:
+                layout = compile_format(format)
+            # Check the size and strings now, so a payload that doesn't fit its format fails here rather than on first access
+            layout.check(payload_data)
+        self._layout = layout
+
+    @property
+    def length(self):
+        """Size of the payload, in bytes."""
+        return len(self._data)
+
+    def __getattr__(self, name):
+        # Only called for attributes that are not set: unpack the fixed-size attributes on first
+        # access, and the trailing array when it is asked for
+        if name.startswith("_"):
+            raise AttributeError(name)
+        layout = self._layout
+        if layout is not None:
+            try:
+                values = self._values
+            except AttributeError:
+                values = self._values = layout.unpack_prefix(self._data)
+            if name in values:
+                return values[name]
+            if layout.tail is not None and name == layout.tail[0]:
+                value = values[name] = layout.unpack_tail(self._data)
+                return value
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    def to_dict(self):
+        """Every attribute of the payload (length, message_id, message_type, then the FORMAT ones), as {attribute_name : value} pairs."""
+        attributes = {"length": self.length, "message_id": self.message_id, "message_type": self.message_type}
+        if self._layout is not None:
+            for name in self._layout.names:
+                attributes[name] = getattr(self, name)
+        return attributes
+
+    def __getstate__(self):
+        # Only the raw bytes are pickled (a memoryview can't be); the attributes are unpacked again on access
+        layout = self._layout
+        if layout is not None and layout is getattr(type(self), "LAYOUT", None):
+            layout = True  # The class's own layout, found again when unpickling
+        elif layout is not None:
+            layout = layout.format
+        return bytes(self._data), self.message_id, self.message_type, layout
+
+    def __setstate__(self, state):
+        self._data, self.message_id, self.message_type, layout = state
+        if layout is True:
+            layout = type(self).LAYOUT
+        elif layout is not None:
+            layout = compile_format(layout)
+        self._layout = layout
     
     def __repr__(self):
         attrs = ", ".join(
             f"{key}='{value}'" if isinstance(value, str) else
-            f"{key}=[{len(value)} values]" if isinstance(value, (list, tuple, dict)) else
+            f"{key}=[{len(value)} values]" if isinstance(value, (list, tuple, dict, np.ndarray)) else
             f"{key}={value}"
-            for key, value in vars(self).items()
+            for key, value in self.to_dict().items()
         )
         return f"{self.__class__.__name__}({attrs})"
 
@@ -173,35 +408,90 @@ class Payload:
 class Packet:
     """
     Class to represent a packet (header + payload + checksum).
+
+    The packet keeps its own copy of the header and payload bytes (so nothing holds on to the 
+    file it came from), and only builds its header and payload, as memoryviews of those bytes,
+    when they are first accessed.
     
     Args:
         pos: The header start index within the provided data.
         data: The data that contains the packet.
     """
 
+    __slots__ = ("pos", "checksum", "corrupted", "_frame", "_header", "_payload")
+
     def __init__(self, pos, data):
         self.pos = pos
-        self.header = Header(data[pos:pos + 8])
+        header = Header(data[pos:pos + 8])
+        payload_length = header.payload_length
 
-        if len(data) - pos < 8 + self.header.payload_length + 2:
-            raise ValueError(f"Not enough data for full packet at position {pos} with header {self.header}")
+        if len(data) - pos < 8 + payload_length + 2:
+            raise ValueError(f"Not enough data for full packet at position {pos} with header {header}")
         
-        self.checksum = struct.unpack("<H", data[pos + 8 + self.header.payload_length : pos + 8 + self.header.payload_length + 2])[0]
-        self.corrupted = self.checksum != self.compute_checksum(data, pos, self.header.payload_length)
+        self.checksum = struct.unpack("<H", data[pos + 8 + payload_length : pos + 8 + payload_length + 2])[0]
+        self.corrupted = self.checksum != self.compute_checksum(data, pos, payload_length)
+        self._frame = bytes(data[pos:pos + 8 + payload_length])
+        self._header = header
         
         if not self.corrupted:
             try:
-                self.payload = Payload.create(self.header.message_id, data[pos + 8 : pos + 8 + self.header.payload_length])
+                self._payload = Payload.create(header.message_id, memoryview(self._frame)[8:])
             except struct.error as e:
-                raise ValueError(f"Error unpacking payload for message with header {self.header}: {e}")
+                raise ValueError(f"Error unpacking payload for message with header {header}: {e}")
         else:
-            self.payload = None
+            self._payload = None
 
-    def compute_checksum(self, data, pos, payload_length):
+    @property
+    def header(self):
+        try:
+            return self._header
+        except AttributeError:
+            header = self._header = Header(memoryview(self._frame)[:8])
+            return header
+
+    @property
+    def frame(self):
+        """The header and payload bytes of the packet (without the checksum)."""
+        return self._frame
+
+    @property
+    def payload(self):
+        try:
+            return self._payload
+        except AttributeError:
+            frame = self._frame
+            payload = self._payload = Payload.create(frame[4] | (frame[5] << 8), memoryview(frame)[8:])
+            return payload
+
+    @staticmethod
+    def compute_checksum(data, pos, payload_length):
         """Compute checksum by summing header + payload (excluding checksum)."""
         packet_data = data[pos:pos + 8 + payload_length]  # Header + Payload
         return sum(packet_data) & 0xFFFF  # Truncate to 16 bits
     
+    @classmethod
+    def from_frame(cls, pos, data, payload_length, checksum):
+        """
+        Build a packet from a frame that has already been located and validated (e.g. by a
+        FrameScanner), without decoding the header twice or recomputing the checksum.
+        """
+        frame = data[pos:pos + 8 + payload_length]  # A copy, unless data is e.g. a memoryview
+        if not isinstance(frame, bytes):
+            frame = bytes(frame)
+        # The header and payload are built on first access, but a payload that doesn't fit its
+        # format (or has a string that isn't ASCII) must still fail here
+        layout = getattr(MESSAGE_REGISTRY.get(frame[4] | (frame[5] << 8)), "LAYOUT", None)
+        if layout is not None:
+            layout.check_size(payload_length)
+            if layout.prefix_strings or layout.tail_string:
+                layout.check(memoryview(frame)[8:])
+        packet = cls.__new__(cls)
+        packet.pos = pos
+        packet.checksum = checksum
+        packet.corrupted = False
+        packet._frame = frame
+        return packet
+
     @classmethod
     def from_bytes(cls, pos, data):
         header = Header(data[pos:pos + 8])
@@ -209,6 +499,15 @@ class Packet:
             return None
         return cls(pos, data)
 
+    def __getstate__(self):
+        # The header and payload are memoryviews, which can't be pickled; they are rebuilt on access
+        return self.pos, self.checksum, self.corrupted, self._frame
+
+    def __setstate__(self, state):
+        self.pos, self.checksum, self.corrupted, self._frame = state
+        if self.corrupted:
+            self._payload = None
+
     def __repr__(self):
         return f"Packet(header={self.header}, payload={self.payload}, checksum={self.checksum})"
     
@@ -220,6 +519,8 @@ class Packet:
 MESSAGE_REGISTRY = {}
 
 def register(cls):
+    # Compile the message format once here, rather than re-interpreting it for every packet
+    cls.LAYOUT = compile_format(cls.FORMAT)
     MESSAGE_REGISTRY[cls.MESSAGE_ID] = cls
     return cls
 
@@ -227,6 +528,8 @@ def register(cls):
 class NackMessage(Payload):
     """Subclass for message ID 2, representing a NACK (not acknowledged) message."""
 
+    __slots__ = ()
+
     MESSAGE_ID = 2
     MESSAGE_TYPE = "Not acknowledged"
     FORMAT = {
@@ -242,6 +545,8 @@ class NackMessage(Payload):
 @register
 class JSONMessage(Payload):
     """Subclass for message ID 10, representing a JSON header message."""
+
+    __slots__ = ()
     
     MESSAGE_ID = 10
     MESSAGE_TYPE = "JSON header"
@@ -257,6 +562,8 @@ class JSONMessage(Payload):
 @register
 class OsMonoProfileMessage(Payload):
     """Subclass for message ID 2198, representing an os_mono_profile message for the Omniscan 450."""
+
+    __slots__ = ()
     
     MESSAGE_ID = 2198
     MESSAGE_TYPE = "Omniscan 450 Mono Profile"
@@ -290,11 +597,136 @@ class OsMonoProfileMessage(Payload):
                          message_type=self.MESSAGE_TYPE, format=self.FORMAT)
 
 
+# Blue Robotics Ping1D (echosounder/altimeter) and Ping360 (scanning sonar) messages, as logged
+# by PingViewer (see pings/pingviewer_log.py). For details, see https://docs.bluerobotics.com/ping-protocol/
+
+@register
+class Ping1DDistanceSimpleMessage(Payload):
+    """Subclass for message ID 1211, representing a Ping1D distance_simple message."""
+
+    __slots__ = ()
+
+    MESSAGE_ID = 1211
+    MESSAGE_TYPE = "Ping1D Distance Simple"
+    FORMAT = {
+        "distance": U32,            # The current return distance determined for the most recent acoustic measurement, in mm
+        "confidence": U8,           # Confidence in the most recent range measurement (0-100%)
+    }
+
+    def __init__(self, payload_data):
+        super().__init__(payload_data, message_id=self.MESSAGE_ID, 
+                         message_type=self.MESSAGE_TYPE, format=self.FORMAT)
+
+
+@register
+class Ping1DDistanceMessage(Payload):
+    """Subclass for message ID 1212, representing a Ping1D distance message."""
+
+    __slots__ = ()
+
+    MESSAGE_ID = 1212
+    MESSAGE_TYPE = "Ping1D Distance"
+    FORMAT = {
+        "distance": U32,            # The current return distance determined for the most recent acoustic measurement, in mm
+        "confidence": U16,          # Confidence in the most recent range measurement (0-100%)
+        "transmit_duration": U16,   # The acoustic pulse length during acoustic transmission/activation, in us
+        "ping_number": U32,         # The pulse/measurement count since boot
+        "scan_start": U32,          # The beginning of the scan region in mm from the transducer
+        "scan_length": U32,         # The length of the scan region, in mm
+        "gain_setting": U32,        # The current gain setting (0-6)
+    }
+
+    def __init__(self, payload_data):
+        super().__init__(payload_data, message_id=self.MESSAGE_ID, 
+                         message_type=self.MESSAGE_TYPE, format=self.FORMAT)
+
+
+@register
+class Ping1DProfileMessage(Payload):
+    """Subclass for message ID 1300, representing a Ping1D profile message."""
+
+    __slots__ = ()
+
+    MESSAGE_ID = 1300
+    MESSAGE_TYPE = "Ping1D Profile"
+    FORMAT = {
+        "distance": U32,            # The current return distance determined for the most recent acoustic measurement, in mm
+        "confidence": U16,          # Confidence in the most recent range measurement (0-100%)
+        "transmit_duration": U16,   # The acoustic pulse length during acoustic transmission/activation, in us
+        "ping_number": U32,         # The pulse/measurement count since boot
+        "scan_start": U32,          # The beginning of the scan region in mm from the transducer
+        "scan_length": U32,         # The length of the scan region, in mm
+        "gain_setting": U32,        # The current gain setting (0-6)
+        "profile_data_length": U16, # Length of profile_data
+        "profile_data": NumpyArray([U8])  # Signal strength (0-255) of each sample across the scan region, as a NumPy array
+    }
+
+    def __init__(self, payload_data):
+        super().__init__(payload_data, message_id=self.MESSAGE_ID, 
+                         message_type=self.MESSAGE_TYPE, format=self.FORMAT)
+
+
+@register
+class Ping360DeviceDataMessage(Payload):
+    """Subclass for message ID 2300, representing a Ping360 device_data message (one angle of a scan)."""
+
+    __slots__ = ()
+
+    MESSAGE_ID = 2300
+    MESSAGE_TYPE = "Ping360 Device Data"
+    FORMAT = {
+        "mode": U8,                 # Operating mode (1 for Ping360)
+        "gain_setting": U8,         # Analog gain setting (0 = low, 1 = normal, 2 = high)
+        "angle": U16,               # Head angle, in gradians (0-399)
+        "transmit_duration": U16,   # Acoustic transmission duration, in us (1-1000)
+        "sample_period": U16,       # Time interval between individual signal intensity samples, in 25 ns increments
+        "transmit_frequency": U16,  # Acoustic operating frequency, in kHz
+        "number_of_samples": U16,   # Number of samples per reflected signal
+        "data_length": U16,         # Length of data
+        "data": NumpyArray([U8])    # 8 bit intensity of each sample, as a NumPy array
+    }
+
+    def __init__(self, payload_data):
+        super().__init__(payload_data, message_id=self.MESSAGE_ID, 
+                         message_type=self.MESSAGE_TYPE, format=self.FORMAT)
+
+
+@register
+class Ping360AutoDeviceDataMessage(Payload):
+    """Subclass for message ID 2301, representing a Ping360 auto_device_data message (one angle of an automatic scan)."""
+
+    __slots__ = ()
+
+    MESSAGE_ID = 2301
+    MESSAGE_TYPE = "Ping360 Auto Device Data"
+    FORMAT = {
+        "mode": U8,                 # Operating mode (1 for Ping360)
+        "gain_setting": U8,         # Analog gain setting (0 = low, 1 = normal, 2 = high)
+        "angle": U16,               # Head angle, in gradians (0-399)
+        "transmit_duration": U16,   # Acoustic transmission duration, in us (1-1000)
+        "sample_period": U16,       # Time interval between individual signal intensity samples, in 25 ns increments
+        "transmit_frequency": U16,  # Acoustic operating frequency, in kHz
+        "start_angle": U16,         # Head angle to begin the scan sector, in gradians
+        "stop_angle": U16,          # Head angle to end the scan sector, in gradians
+        "num_steps": U8,            # Number of 0.9 degree motor steps between pings
+        "delay": U8,                # An additional delay between successive transmit pulses, in ms
+        "number_of_samples": U16,   # Number of samples per reflected signal
+        "data_length": U16,         # Length of data
+        "data": NumpyArray([U8])    # 8 bit intensity of each sample, as a NumPy array
+    }
+
+    def __init__(self, payload_data):
+        super().__init__(payload_data, message_id=self.MESSAGE_ID, 
+                         message_type=self.MESSAGE_TYPE, format=self.FORMAT)
+
+
 @register
 class ImplementYourOwnMessage(Payload):
     """Subclass for your custom message ID, representing a custom message."""
     # Note: you must also include @register above this class definition to place it in the MESSAGE_REGISTRY.
 
+    __slots__ = ()  # Keep this too, so your payloads don't each carry a __dict__
+
     MESSAGE_ID = 99999  # Replace with your custom message ID
     MESSAGE_TYPE = "Your custom message type"
     FORMAT = {
@@ -309,40 +741,500 @@ class ImplementYourOwnMessage(Payload):
                          message_type=self.MESSAGE_TYPE, format=self.FORMAT)
         
     
+# ==========================================================================
+# Section: Collecting statistics about a parse
+# ==========================================================================
+
+class ParseStats:
+    """
+    Counters and stage timings of a parse, for spotting damaged logs and slow runs.
+
+    Pass one to the parsing functions (e.g. iter_svlog_packets(..., stats=stats)) and read it
+    afterwards. The counters are cumulative, so one object can collect over several files.
+
+    Attributes:
+        bytes_scanned: Bytes searched for packets.
+        candidates: "BR" sync candidates tried.
+        false_syncs: Candidates that turned out not to be a valid packet (checksum_failures + truncated).
+        checksum_failures: Candidates whose checksum did not match.
+        truncated: Candidates whose payload_length ran past the end of the data.
+        decode_failures: Valid packets whose payload was too short for its message type.
+        bytes_skipped: Bytes that did not belong to any valid packet.
+        packets: Valid packets found.
+        by_message_id: {message ID: valid packets}.
+        by_sender: {sender ID: valid packets}.
+        timings: {stage: seconds} spent in each stage ("scan", "checksum", "decode", "write").
+        hook: Optional callback, hook(stage, seconds, count), called whenever time is added to a
+            stage (once per chunk of the file or batch of packets, not per packet).
+    """
+
+    STAGES = ("scan", "checksum", "decode", "write")
+
+    def __init__(self, hook=None):
+        self.bytes_scanned = 0
+        self.candidates = 0
+        self.checksum_failures = 0
+        self.truncated = 0
+        self.decode_failures = 0
+        self.bytes_skipped = 0
+        self.packets = 0
+        self.by_message_id = {}
+        self.by_sender = {}
+        self.timings = dict.fromkeys(self.STAGES, 0.0)
+        self.hook = hook
+
+    @property
+    def false_syncs(self):
+        return self.checksum_failures + self.truncated
+
+    def add_time(self, stage, seconds, count=0):
+        """Add time spent in a stage (on count packets or bytes), and call the hook."""
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+        if self.hook is not None:
+            self.hook(stage, seconds, count)
+
+    @contextlib.contextmanager
+    def timed(self, stage, count=0):
+        """Context manager adding the time spent inside it to a stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start, count)
+
+    def count_packet(self, message_id, sender_id):
+        self.packets += 1
+        self.by_message_id[message_id] = self.by_message_id.get(message_id, 0) + 1
+        self.by_sender[sender_id] = self.by_sender.get(sender_id, 0) + 1
+
+    def merge(self, other):
+        """Add the counters and timings of another ParseStats (e.g. from a worker process) to this one."""
+        for name in ("bytes_scanned", "candidates", "checksum_failures", "truncated", "decode_failures",
+                     "bytes_skipped", "packets"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for counts, other_counts in ((self.by_message_id, other.by_message_id), (self.by_sender, other.by_sender)):
+            for key, count in other_counts.items():
+                counts[key] = counts.get(key, 0) + count
+        for stage, seconds in other.timings.items():
+            self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    def to_dict(self):
+        """The statistics as a JSON-serializable dict."""
+        total = sum(self.timings.values())
+        return {
+            "bytes_scanned": self.bytes_scanned,
+            "candidates": self.candidates,
+            "false_syncs": self.false_syncs,
+            "checksum_failures": self.checksum_failures,
+            "truncated": self.truncated,
+            "decode_failures": self.decode_failures,
+            "bytes_skipped": self.bytes_skipped,
+            "packets": self.packets,
+            "by_message_id": {str(key): count for key, count in sorted(self.by_message_id.items())},
+            "by_sender": {str(key): count for key, count in sorted(self.by_sender.items())},
+            "timings": {stage: round(seconds, 6) for stage, seconds in self.timings.items()},
+            "mb_per_s": round(self.bytes_scanned / 1e6 / total, 2) if total else None,
+        }
+
+    def summary(self):
+        """A few lines of human-readable statistics."""
+        lines = [
+            f"{self.bytes_scanned} bytes scanned, {self.packets} valid packets, {self.candidates} sync candidates tried",
+            f"{self.false_syncs} false syncs ({self.checksum_failures} checksum failures, {self.truncated} truncated), "
+            f"{self.decode_failures} decode failures, {self.bytes_skipped} bytes skipped",
+            "Packets by message ID: " + ", ".join(f"{key}: {count}" for key, count in sorted(self.by_message_id.items())),
+            "Packets by sender: " + ", ".join(f"{key}: {count}" for key, count in sorted(self.by_sender.items())),
+            "Time: " + ", ".join(f"{stage} {seconds:.3f} s" for stage, seconds in self.timings.items()),
+        ]
+        return "\n".join(lines)
+
+
+def add_stats_arguments(parser):
+    """Add the --stats and --json-stats options to a command-line parser."""
+    parser.add_argument("--stats", action="store_true", help="Print parse statistics (counts of packets, failures and time per stage).")
+    parser.add_argument("--json-stats", default=None, metavar="PATH", help="Write parse statistics as JSON to PATH ('-' for stdout).")
+
+
+def report_stats(args, stats):
+    """Print and/or write the statistics, as asked for by the options of add_stats_arguments."""
+    if args.stats:
+        print(stats.summary())
+    if args.json_stats == "-":
+        print(json.dumps(stats.to_dict(), indent=1))
+    elif args.json_stats:
+        with open(args.json_stats, "w") as file:
+            json.dump(stats.to_dict(), file, indent=1)
+
+
+# ==========================================================================
+# Section: Defining a framing engine to locate valid packets in a byte stream
+# ==========================================================================
+
+def validate_frames(window, candidates):
+    """
+    Validate a batch of candidate frames at once, using a cumulative byte sum over the window.
+
+    The running sum is kept in uint16, so it wraps exactly like the 16-bit Ping Protocol 
+    checksum: the checksum of any frame is then one subtraction of two prefix sums, and the 
+    whole batch is checked with a single array comparison.
+
+    Args:
+        window: uint8 NumPy array holding the data.
+        candidates: Positions of the "BR" candidates within window.
+
+    Returns:
+        tuple: (ends, message_ids, fits, valid) arrays, one element per candidate. ends is the
+            position just past each frame, fits is False where the frame runs past the window,
+            and valid is True where the frame fits and its checksum matches.
+    """
+    size = len(window)
+    padded = np.zeros(size + 8, dtype=np.uint8)  # Lets headers be read even for candidates near the end
+    padded[:size] = window
+    payload_lengths = padded[candidates + 2] | (padded[candidates + 3].astype(np.int64) << 8)
+    message_ids = padded[candidates + 4] | (padded[candidates + 5].astype(np.int64) << 8)
+    ends = candidates + 8 + payload_lengths + 2
+    fits = (candidates + 8 <= size) & (ends <= size)
+
+    prefix_sums = np.zeros(size + 1, dtype=np.uint16)
+    np.cumsum(window, dtype=np.uint16, out=prefix_sums[1:])  # Wraps modulo 2**16, like the checksum itself
+
+    checksum_pos = np.where(fits, ends - 2, 0)
+    stored = window[checksum_pos] | (window[checksum_pos + 1].astype(np.uint16) << 8)
+    computed = prefix_sums[checksum_pos] - prefix_sums[np.where(fits, candidates, 0)]
+    valid = fits & (stored == computed)
+    return ends, message_ids, fits, valid
+
+
+class FrameScanner:
+    """
+    Locates valid Ping Protocol frames in a buffer.
+
+    After a frame validates, scanning jumps straight past it to the next candidate, so "BR" 
+    byte pairs that happen to occur inside payloads (e.g. in pwr_results) are never tried.
+    Only after a length or checksum failure does the scanner fall back to a byte-by-byte 
+    resync, trying the next "BR" after the failed candidate.
+
+    The data is processed in chunks: all candidates in a chunk are found and validated in one
+    vectorized pass (see validate_frames), and only the walk from one valid frame to the next
+    happens in Python.
+
+    The counters are cumulative, so one scanner can be reused to report on several scans.
+
+    Attributes:
+        frames: Number of valid frames found.
+        header_decodes: Number of candidate headers that were inspected.
+        length_failures: Candidates whose payload_length ran past the end of the data.
+        checksum_failures: Candidates whose checksum did not match.
+        bytes_skipped: Bytes that did not belong to any valid frame (skipped while resyncing).
+        stats: Optional ParseStats, which then also gets the bytes scanned, the packets found per
+            message ID and sender, and the time spent finding candidates ("scan") and checking
+            them ("checksum").
+    """
+
+    CHUNK_SIZE = 1 << 24  # Candidates are validated 16 MB at a time
+    MAX_FRAME_SIZE = 8 + 0xFFFF + 2  # Header + largest possible payload + checksum
+
+    def __init__(self, stats=None):
+        self.stats = stats
+        self.frames = 0
+        self.header_decodes = 0
+        self.length_failures = 0
+        self.checksum_failures = 0
+        self.bytes_skipped = 0
+
+    def scan(self, data, start=0, stop=None):
+        """
+        Yield every valid frame in data, in order.
+
+        Args:
+            data: A bytes-like object (bytes, mmap, ...).
+            start: Position to start scanning from (e.g. the end of the last frame seen before).
+            stop: If given, only frames starting before this position are yielded (the last one
+                may still end after it).
+
+        Yields:
+            tuple: (pos, payload_length, message_id, checksum) for each valid frame.
+        """
+        view = np.frombuffer(data, dtype=np.uint8)
+        size = len(view)
+        stop = size if stop is None else min(stop, size)
+        stats = self.stats
+        resume = start  # End of the last valid frame; everything between it and the next frame is skipped
+        pos = start
+        while pos < stop:
+            # Candidates must start before limit; the window extends far enough to hold any frame starting there
+            limit = min(pos + self.CHUNK_SIZE, stop)
+            window = view[pos:min(limit + self.MAX_FRAME_SIZE, size)]
+            for start, end, message_id in self._walk_window(window, limit - pos):
+                start += pos
+                end += pos
+                self.bytes_skipped += start - resume
+                payload_length = end - start - 10
+                checksum = int(view[end - 2]) | (int(view[end - 1]) << 8)
+                if stats is not None:
+                    stats.bytes_skipped += start - resume
+                    stats.count_packet(message_id, int(view[start + 6]))
+                yield start, payload_length, message_id, checksum
+                resume = end
+            if stats is not None:
+                stats.bytes_scanned += min(max(limit, resume), size) - pos
+            pos = max(limit, resume)
+        self.bytes_skipped += max(stop - resume, 0)
+        if stats is not None:
+            stats.bytes_skipped += max(stop - resume, 0)
+
+    def scan_stream(self, chunks):
+        """
+        Like scan, for data that arrives as a stream of byte chunks (e.g. from a decompressor)
+        rather than as one buffer.
+
+        Chunks are gathered into windows of at least CHUNK_SIZE bytes, plus enough bytes after
+        them to hold any frame starting in the window. Whatever follows the last frame found is
+        carried over into the next window, so the frames found are exactly those scan would
+        find in the whole stream. If the stream fails part-way (e.g. a truncated archive), what
+        arrived before the failure is scanned before its error is raised.
+
+        Args:
+            chunks: Iterable of bytes objects.
+
+        Yields:
+            tuple: (window, base, frames): window is a bytes object holding the stream from byte
+                base on, and frames an iterator of (pos, payload_length, message_id, checksum)
+                for the frames that start in the window, with pos relative to window. frames
+                must be used before the next window is asked for.
+        """
+        chunks = iter(chunks)
+        window = b""
+        base = 0  # Position in the stream of window[0]
+        start = 0  # Position in window to carry on scanning from
+        done = False
+        error = None
+        while not done:
+            parts = [window[start:]]
+            size = len(parts[0])
+            while size < self.CHUNK_SIZE + self.MAX_FRAME_SIZE:
+                try:
+                    chunk = next(chunks, None)
+                except Exception as e:
+                    chunk, error = None, e
+                if chunk is None:
+                    done = True
+                    break
+                parts.append(chunk)
+                size += len(chunk)
+            base += start
+            window = b"".join(parts)
+            # Until the stream ends, only frames that a later chunk can't change are scanned
+            stop = len(window) if done else len(window) - self.MAX_FRAME_SIZE
+            end = [0]
+            frames = self._track_end(self.scan(window, 0, stop), end)
+            yield window, base, frames
+            collections.deque(frames, maxlen=0)  # Finish the scan, if the caller didn't
+            start = max(stop, end[0])
+        if error is not None:
+            raise error
+
+    @staticmethod
+    def _track_end(frames, end):
+        """Pass frames on, keeping the end of the last one in end[0]."""
+        for frame in frames:
+            end[0] = frame[0] + 8 + frame[1] + 2
+            yield frame
+
+    def _walk_window(self, window, limit):
+        """Walk the chain of valid frames starting before limit, yielding (start, end, message_id)."""
+        stats = self.stats
+        started = time.perf_counter()
+        candidates = np.flatnonzero((window[:-1] == 0x42) & (window[1:] == 0x52))  # Match "BR"
+        candidates = candidates[candidates < limit]
+        if stats is not None:
+            searched = time.perf_counter()
+            stats.add_time("scan", searched - started, len(window))
+        if len(candidates) == 0:
+            return
+        ends, message_ids, fits, valid = validate_frames(window, candidates)
+        if stats is not None:
+            stats.add_time("checksum", time.perf_counter() - searched, len(candidates))
+        valid_index = np.flatnonzero(valid)
+        fits_count = np.concatenate(([0], np.cumsum(fits)))  # To count length failures in a run of bad candidates
+
+        i = 0
+        while i < len(candidates):
+            # Every candidate before the next valid one is a failure visited during resync
+            k = np.searchsorted(valid_index, i)
+            j = int(valid_index[k]) if k < len(valid_index) else len(candidates)
+            failures = j - i
+            length_failures = failures - int(fits_count[j] - fits_count[i])
+            self.header_decodes += failures
+            self.length_failures += length_failures
+            self.checksum_failures += failures - length_failures
+            if stats is not None:
+                stats.candidates += failures + (j < len(candidates))
+                stats.truncated += length_failures
+                stats.checksum_failures += failures - length_failures
+            if j == len(candidates):
+                return
+            self.header_decodes += 1
+            self.frames += 1
+            yield int(candidates[j]), int(ends[j]), int(message_ids[j])
+            i = int(np.searchsorted(candidates, ends[j]))  # Jump straight past the validated frame
+
+    def summary(self):
+        """Return a one-line human-readable summary of the counters."""
+        return (f"{self.frames} valid frames, {self.header_decodes} headers decoded, "
+                f"{self.checksum_failures} checksum failures, {self.length_failures} length failures, "
+                f"{self.bytes_skipped} bytes skipped while resyncing")
+
+
 # ==========================================================================
 # Section: Defining function to extract message packets from a .svlog file!
 # ==========================================================================
 
-def parse_svlog_file(filename, included_ids=None, excluded_ids=None, max_packets=None):
+@contextlib.contextmanager
+def map_svlog_file(filename):
     """
-    Parse a .svlog file and extract message packets.
-    Note: this function will only extract packets of known message types.
+    Context manager giving read-only, memory-mapped access to a .svlog file.
+
+    Anything holding a view of the map (e.g. a NumPy array from np.frombuffer) must be 
+    released before the context exits.
     """
     with open(filename, "rb") as f:
-        data = f.read()  # Read the entire binary file
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""  # mmap refuses empty files, and there is nothing to parse anyway
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield data
+
+
+def iter_svlog_packets(filename, included_ids=None, excluded_ids=None, scanner=None, sender_ids=None, stats=None):
+    """
+    Lazily extract message packets from a .svlog file, yielding each one as soon as it is found.
+
+    The file is memory-mapped rather than read, so memory use stays flat no matter how big 
+    the file is: only the bytes of the packet currently being decoded are ever copied.
+    A gzip, xz or zstd compressed file is decompressed in chunks on a background thread
+    instead, and scanned as the chunks arrive (see compressed_io.py).
+    Note: this function will only extract packets of known message types.
+
+    Args:
+        filename: Path to the .svlog file.
+        included_ids: If given, only packets with these message IDs are yielded.
+        excluded_ids: If given, packets with these message IDs are skipped.
+        scanner: Optional FrameScanner to use, so the caller can inspect its counters 
+            (e.g. bytes skipped while resyncing) once iteration is done.
+        sender_ids: If given, only packets from these sender IDs are yielded.
+        stats: Optional ParseStats to collect counters and stage timings into (given to the
+            scanner too, unless it already has one). Packets that can't be decoded are then
+            counted, and reported in one line once the file is done, instead of one line each.
+
+    Yields:
+        Packet: Each valid packet, in file order.
+    """
+    if scanner is None:
+        scanner = FrameScanner(stats)
+    elif scanner.stats is None:
+        scanner.stats = stats
+    failures_before = stats.decode_failures if stats is not None else 0
+    if detect_compression(filename) is not None:
+        for window, base, frames in scanner.scan_stream(iter_decompressed_chunks(filename)):
+            yield from packets_from_frames(frames, window, included_ids, excluded_ids, sender_ids, stats, base)
+    else:
+        with map_svlog_file(filename) as data:
+            frames = scanner.scan(data)
+            # The scan holds a NumPy view of the map, so it must be closed before the map is
+            try:
+                yield from packets_from_frames(frames, data, included_ids, excluded_ids, sender_ids, stats)
+            finally:
+                frames.close()
+    if stats is not None:
+        report_decode_failures(filename, stats, failures_before)
+
+
+def report_decode_failures(filename, stats, before=0):
+    """Print how many packets of a file were skipped because their payload could not be decoded, if any."""
+    failures = stats.decode_failures - before
+    if failures:
+        print(f"Skipped {failures} packet(s) of {filename} whose payload could not be decoded")
+
 
-    pattern = re.compile(rb"\x42\x52")  # Match "BR"
-    positions = [match.start() for match in pattern.finditer(data)]
+DECODE_TIMING_BATCH = 4096  # Decode time is handed to ParseStats (and its hook) once per this many packets
+
+
+def packets_from_frames(frames, data, included_ids, excluded_ids, sender_ids=None, stats=None, base=0):
+    """
+    Turn validated frames into Packets, filtering on the header before decoding the payload.
 
-    packets = []
-    for pos in positions:  
+    Payloads that don't fit their message type are skipped. Without stats, each is printed;
+    with stats, they are only counted as decode failures (see report_decode_failures), and the
+    time spent decoding is added to its "decode" stage. base is the position
+    of data in the file (for data scanned a window at a time), and is added to packet.pos.
+    """
+    if stats is not None:
+        yield from _timed_packets_from_frames(frames, data, included_ids, excluded_ids, sender_ids, stats, base)
+        return
+    for pos, payload_length, message_id, checksum in frames:
+        # Filter on the header alone, so unwanted payloads are never decoded
+        if message_id not in MESSAGE_REGISTRY:
+            continue
+        if included_ids is not None and message_id not in included_ids:  # Only include wanted message IDs
+            continue
+        if excluded_ids is not None and message_id in excluded_ids:  # Don't include unwanted message IDs
+            continue
+        if sender_ids is not None and data[pos + 6] not in sender_ids:  # Only include wanted senders
+            continue
         try:
-            packet = Packet.from_bytes(pos, data)
-            if packet is None:
+            packet = Packet.from_frame(pos, data, payload_length, checksum)
+        except ValueError as e:
+            print(f"Error decoding payload of packet at byte {base + pos}: {e}")
+            continue
+        packet.pos += base
+        yield packet
+
+
+def _timed_packets_from_frames(frames, data, included_ids, excluded_ids, sender_ids, stats, base):
+    """packets_from_frames, timing each decode. Kept separate so the untimed loop pays nothing for it."""
+    seconds = 0.0
+    decoded = 0
+    try:
+        for pos, payload_length, message_id, checksum in frames:
+            if message_id not in MESSAGE_REGISTRY:
                 continue
-            if included_ids is not None and packet.header.message_id not in included_ids:  # Only include wanted message IDs
+            if included_ids is not None and message_id not in included_ids:
                 continue
-            if excluded_ids is not None and packet.header.message_id in excluded_ids:  # Don't include unwanted message IDs
+            if excluded_ids is not None and message_id in excluded_ids:
                 continue
-            if packet.corrupted:
-                print(f"Invalid checksum for packet at byte {pos}")
+            if sender_ids is not None and data[pos + 6] not in sender_ids:
                 continue
-            packets.append(packet)
-            if max_packets is not None and len(packets) == max_packets:  # Cap the number of packets included in the output
-                break
-        except ValueError as e:
-            print(f"Error parsing packet at byte {pos}: {e}")
-    
+            started = time.perf_counter()
+            try:
+                packet = Packet.from_frame(pos, data, payload_length, checksum)
+            except ValueError:
+                stats.decode_failures += 1  # Reported once per file, not once per packet
+                continue
+            finally:
+                seconds += time.perf_counter() - started
+            packet.pos += base
+            decoded += 1
+            if decoded == DECODE_TIMING_BATCH:
+                stats.add_time("decode", seconds, decoded)
+                seconds = 0.0
+                decoded = 0
+            yield packet
+    finally:
+        if decoded or seconds:
+            stats.add_time("decode", seconds, decoded)
+
+
+def parse_svlog_file(filename, included_ids=None, excluded_ids=None, max_packets=None, stats=None):
+    """
+    Parse a .svlog file and extract message packets.
+    Note: this function will only extract packets of known message types.
+    """
+    scanner = FrameScanner(stats)
+    packets = iter_svlog_packets(filename, included_ids=included_ids, excluded_ids=excluded_ids, scanner=scanner, stats=stats)
+    packets = list(itertools.islice(packets, max_packets))  # Cap the number of packets included in the output
+    if scanner.checksum_failures or scanner.length_failures:
+        print(f"Resynced while parsing {filename}: {scanner.summary()}")
     return packets
 
 
@@ -0,0 +1,222 @@
+# swath.py
+
+import argparse
+import numpy as np
+from waterfall import PWR_DTYPE, read_waterfalls
+
+"""
+    Pairs the pings of the port and starboard Omniscan 450s into full-swath rows.
+
+    The two side-scan units are separate devices (sender 1 and sender 2), each pinging on its
+    own, so a port ping is matched with the starboard ping closest to it in time, as long as
+    they are within a tolerance. Each ping is used at most once. Every pair becomes one row of
+    the swath:
+
+        port pwr_results, reversed | nadir gap (zeros) | starboard pwr_results
+
+    so that the samples nearest the vehicle meet in the middle. Both sonars are assumed to use
+    the same range and number of samples.
+"""
+
+DEFAULT_TOLERANCE_MS = 50  # Pings further apart than this are not paired
+NADIR_GAP_SAMPLES = 10  # Zero samples between the two sides, marking the nadir
+
+# ================================================================
+# Section: Matching pings by time
+# ================================================================
+
+def _nearest(sorted_times, query_times):
+    """Index of the nearest of sorted_times (which must not be empty) to each query time."""
+    after = np.searchsorted(sorted_times, query_times)
+    before = np.clip(after - 1, 0, len(sorted_times) - 1)
+    after = np.clip(after, 0, len(sorted_times) - 1)
+    take_after = np.abs(sorted_times[after] - query_times) < np.abs(query_times - sorted_times[before])
+    return np.where(take_after, after, before)
+
+
+def match_times(times_a, times_b, tolerance):
+    """
+    Pair up two sets of times one-to-one, nearest first, without looping over the times.
+
+    Each round pairs every time with its nearest unpaired time in the other set, where the two
+    are each other's nearest (and within the tolerance); the paired times are then set aside and
+    the rest go through another round. The closest remaining pair is always mutual, so every round
+    pairs at least one, and usually one or two rounds pair everything that can be paired.
+
+    Args:
+        times_a: 1-D array of times (any order).
+        times_b: 1-D array of times, in the same units.
+        tolerance: Largest time difference to pair.
+
+    Returns:
+        tuple: (index_a, index_b), int64 arrays of the paired indices into times_a and times_b,
+            in order of index_a's time.
+    """
+    times_a = np.asarray(times_a, dtype=np.int64)
+    times_b = np.asarray(times_b, dtype=np.int64)
+    order_a = np.argsort(times_a, kind="stable")
+    order_b = np.argsort(times_b, kind="stable")
+    free_a = order_a  # Unpaired indices, kept in time order
+    free_b = order_b
+    paired_a = []
+    paired_b = []
+    while len(free_a) and len(free_b):
+        free_times_a = times_a[free_a]
+        free_times_b = times_b[free_b]
+        nearest_b = _nearest(free_times_b, free_times_a)  # For each free a, its nearest free b
+        nearest_a = _nearest(free_times_a, free_times_b)
+        mutual = nearest_a[nearest_b] == np.arange(len(free_a))
+        close = np.abs(free_times_a - free_times_b[nearest_b]) <= tolerance
+        rows = np.flatnonzero(mutual & close)
+        if len(rows) == 0:
+            break
+        paired_a.append(free_a[rows])
+        paired_b.append(free_b[nearest_b[rows]])
+        keep_a = np.ones(len(free_a), dtype=bool)
+        keep_a[rows] = False
+        keep_b = np.ones(len(free_b), dtype=bool)
+        keep_b[nearest_b[rows]] = False
+        free_a = free_a[keep_a]
+        free_b = free_b[keep_b]
+
+    if not paired_a:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    index_a = np.concatenate(paired_a)
+    index_b = np.concatenate(paired_b)
+    order = np.argsort(times_a[index_a], kind="stable")
+    return index_a[order].astype(np.int64), index_b[order].astype(np.int64)
+
+# ================================================================
+# Section: Building the full swath
+# ================================================================
+
+class Swath:
+    """
+    Paired port and starboard pings, as one full-swath waterfall.
+
+    Attributes:
+        pwr_results: 2-D uint16 array (pairs x samples): port reversed, nadir gap, starboard.
+        nadir: Column range (start, stop) of the nadir gap in pwr_results.
+        port_rows: Row of each pair's ping in the port Waterfall.
+        starboard_rows: Row of each pair's ping in the starboard Waterfall.
+        timestamp_ms: Port timestamp_ms of each pair.
+        time_difference_ms: Starboard minus port timestamp_ms (after the clock offset) of each pair.
+        unmatched_port: Number of port pings left without a partner.
+        unmatched_starboard: Number of starboard pings left without a partner.
+    """
+
+    def __init__(self, pwr_results, nadir, port_rows, starboard_rows, timestamp_ms, time_difference_ms,
+                 unmatched_port, unmatched_starboard):
+        self.pwr_results = pwr_results
+        self.nadir = nadir
+        self.port_rows = port_rows
+        self.starboard_rows = starboard_rows
+        self.timestamp_ms = timestamp_ms
+        self.time_difference_ms = time_difference_ms
+        self.unmatched_port = unmatched_port
+        self.unmatched_starboard = unmatched_starboard
+
+    def __len__(self):
+        return len(self.pwr_results)
+
+    def __repr__(self):
+        return (f"Swath(pairs={len(self)}, samples={self.pwr_results.shape[1]}, nadir={self.nadir}, "
+                f"unmatched_port={self.unmatched_port}, unmatched_starboard={self.unmatched_starboard})")
+
+    def save_npz(self, output_npz):
+        """Save the swath and its pairing to a NumPy .npz file."""
+        np.savez(output_npz, pwr_results=self.pwr_results, nadir=np.array(self.nadir), port_rows=self.port_rows,
+                 starboard_rows=self.starboard_rows, timestamp_ms=self.timestamp_ms,
+                 time_difference_ms=self.time_difference_ms,
+                 unmatched=np.array([self.unmatched_port, self.unmatched_starboard]))
+
+
+def pair_swaths(port, starboard, tolerance_ms=DEFAULT_TOLERANCE_MS, nadir_gap=NADIR_GAP_SAMPLES, offset_ms=0):
+    """
+    Pair the pings of two Waterfalls by timestamp_ms and build the full swath.
+
+    Example usage:
+        waterfalls = read_waterfalls("2025-03-24-12-14.svlog")
+        swath = pair_swaths(waterfalls[1, 0], waterfalls[2, 1])
+        swath.pwr_results  # (pairs x samples), port on the left
+
+    Args:
+        port: Waterfall of the port sonar.
+        starboard: Waterfall of the starboard sonar.
+        tolerance_ms: Largest time difference between paired pings.
+        nadir_gap: Number of zero samples between the two sides.
+        offset_ms: Added to the starboard timestamp_ms to put it on the port sonar's clock (each
+            sonar counts from its own power-up).
+
+    Returns:
+        Swath
+    """
+    port_times = port.timestamp_ms.astype(np.int64)
+    starboard_times = starboard.timestamp_ms.astype(np.int64) + offset_ms
+    port_rows, starboard_rows = match_times(port_times, starboard_times, tolerance_ms)
+
+    port_width = port.pwr_results.shape[1]
+    starboard_width = starboard.pwr_results.shape[1]
+    pwr_results = np.zeros((len(port_rows), port_width + nadir_gap + starboard_width), dtype=PWR_DTYPE)
+    # Rows are zero padded at the end, so reversed they are padded at the start, away from the nadir
+    pwr_results[:, :port_width] = port.pwr_results[port_rows, ::-1]
+    pwr_results[:, port_width + nadir_gap:] = starboard.pwr_results[starboard_rows]
+
+    return Swath(
+        pwr_results,
+        (port_width, port_width + nadir_gap),
+        port_rows,
+        starboard_rows,
+        port_times[port_rows],
+        starboard_times[starboard_rows] - port_times[port_rows],
+        len(port_times) - len(port_rows),
+        len(starboard_times) - len(starboard_rows),
+    )
+
+
+def parse_channel(text):
+    """Parse 'SENDER' or 'SENDER:CHANNEL'."""
+    sender, _, channel = text.partition(":")
+    return int(sender), (int(channel) if channel else None)
+
+
+def find_waterfall(waterfalls, sender_id, channel_number):
+    """The Waterfall of a sender (and channel, if given; otherwise the sender must have just one)."""
+    found = [waterfall for (sender, channel), waterfall in waterfalls.items()
+             if sender == sender_id and channel_number in (None, channel)]
+    if len(found) != 1:
+        channels = sorted(channel for sender, channel in waterfalls if sender == sender_id)
+        raise ValueError(f"Sender {sender_id} has channels {channels}; give one as {sender_id}:CHANNEL")
+    return found[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pair port and starboard Omniscan 450 pings into a full-swath waterfall")
+    parser.add_argument("input_file", help="Input .svlog file")
+    parser.add_argument("output_file", help="Output .npz file")
+    parser.add_argument("--port", type=parse_channel, default=(1, None), help="Port sonar, SENDER[:CHANNEL] (default: 1)")
+    parser.add_argument("--starboard", type=parse_channel, default=(2, None), help="Starboard sonar, SENDER[:CHANNEL] (default: 2)")
+    parser.add_argument("--tolerance-ms", type=int, default=DEFAULT_TOLERANCE_MS,
+                        help=f"Largest time difference between paired pings (default: {DEFAULT_TOLERANCE_MS})")
+    parser.add_argument("--nadir-gap", type=int, default=NADIR_GAP_SAMPLES,
+                        help=f"Zero samples between the two sides (default: {NADIR_GAP_SAMPLES})")
+    parser.add_argument("--offset-ms", type=int, default=0,
+                        help="Added to the starboard timestamp_ms to put it on the port sonar's clock (default: 0)")
+    args = parser.parse_args()
+
+    waterfalls = read_waterfalls(args.input_file, sender_ids=[args.port[0], args.starboard[0]])
+    try:
+        port = find_waterfall(waterfalls, *args.port)
+        starboard = find_waterfall(waterfalls, *args.starboard)
+    except ValueError as e:
+        parser.error(str(e))
+
+    swath = pair_swaths(port, starboard, args.tolerance_ms, args.nadir_gap, args.offset_ms)
+    swath.save_npz(args.output_file)
+    print(swath)
+    if len(swath):
+        print(f"Time difference: median {np.median(swath.time_difference_ms):.1f} ms, "
+              f"largest {np.abs(swath.time_difference_ms).max()} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+# waterfall.py
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from svlog_parser import FrameScanner, OsMonoProfileMessage, map_svlog_file
+from compressed_io import detect_compression, iter_decompressed_chunks
+
+# ================================================================
+# Section: Decoding blocks of mono profile pings straight to arrays
+# ================================================================
+
+MONO_PROFILE_ID = OsMonoProfileMessage.MESSAGE_ID
+PREFIX_DTYPE = OsMonoProfileMessage.LAYOUT.numpy_dtype()  # Every field of the payload except pwr_results
+PREFIX_SIZE = PREFIX_DTYPE.itemsize
+PWR_DTYPE = np.dtype("<u2")
+CHANNEL_OFFSET = PREFIX_DTYPE.fields["channel_number"][1]  # Byte offset of channel_number within the payload
+
+
+def decode_mono_profiles(data, positions, payload_lengths):
+    """
+    Decode a batch of os_mono_profile packets straight from the file buffer.
+
+    Args:
+        data: The buffer holding the packets (e.g. a memory-mapped .svlog).
+        positions: Array of packet start positions (the 'B' of "BR") within data.
+        payload_lengths: Array of the corresponding payload lengths. Each must hold the fixed
+            fields and a whole number of samples, as the parser requires.
+
+    Returns:
+        tuple: (columns, pwr_results, sample_counts), where
+            columns: dict of 1-D arrays, one per payload field (ping_number, timestamp_ms, ...),
+                plus "sender_id" from the header and "position" (byte offset in the file).
+            pwr_results: 2-D uint16 array (pings x samples). Rows shorter than the longest ping
+                are padded with zeros.
+            sample_counts: Number of valid samples in each row.
+
+    Raises:
+        ValueError: If a payload length doesn't match the format.
+    """
+    positions = np.asarray(positions, dtype=np.int64)
+    payload_lengths = np.asarray(payload_lengths, dtype=np.int64)
+    view = np.frombuffer(data, dtype=np.uint8)
+
+    # Gather every fixed-size prefix into one (pings x PREFIX_SIZE) byte array and reinterpret it
+    prefix_bytes = view[(positions + 8)[:, None] + np.arange(PREFIX_SIZE)]
+    prefixes = prefix_bytes.view(PREFIX_DTYPE).ravel()
+    columns = {name: prefixes[name] for name in PREFIX_DTYPE.names}
+    columns["sender_id"] = view[positions + 6]
+    columns["position"] = positions
+
+    # pwr_results length is derived from the payload length, exactly as the parser does
+    samples_size = payload_lengths - PREFIX_SIZE
+    if np.any((samples_size < 0) | (samples_size % PWR_DTYPE.itemsize != 0)):
+        raise ValueError("Payload lengths must hold the fixed fields and a whole number of samples")
+    sample_counts = samples_size // PWR_DTYPE.itemsize
+    width = int(sample_counts.max()) if len(sample_counts) else 0
+
+    # Copy every row at once as the longest ping's worth of bytes, then clear what lies past each ping
+    pwr_results = _gather_rows(view, positions + 8 + PREFIX_SIZE, width * PWR_DTYPE.itemsize).view(PWR_DTYPE)
+    pwr_results[np.arange(width) >= sample_counts[:, None]] = 0
+    del view
+    return columns, pwr_results, sample_counts
+
+
+def _gather_rows(view, starts, row_bytes):
+    """
+    Copy row_bytes bytes from each start of a uint8 array into a (starts x row_bytes) array,
+    with zeros where a row runs past the end of the array.
+    """
+    rows = np.zeros((len(starts), row_bytes), dtype=np.uint8)
+    if row_bytes == 0 or len(starts) == 0:
+        return rows
+    last = len(view) - row_bytes  # Rows starting after this run past the end
+    inside = starts <= last
+    if last >= 0:
+        rows[inside] = sliding_window_view(view, row_bytes)[starts[inside]]
+    if not inside.all():
+        # Only rows starting in the last row_bytes bytes: read them from a zero-padded copy of the end
+        tail_start = max(last + 1, 0)
+        tail = np.zeros(len(view) - tail_start + row_bytes, dtype=np.uint8)
+        tail[:len(view) - tail_start] = view[tail_start:]
+        rows[~inside] = sliding_window_view(tail, row_bytes)[starts[~inside] - tail_start]
+    return rows
+
+
+def iter_mono_profile_blocks(filename, block_size=4096, sender_ids=None, channels=None, scanner=None, stats=None):
+    """
+    Decode the os_mono_profile packets of a .svlog file in blocks of at most block_size pings.
+
+    Only one block is held in memory at a time. Packets are filtered by sender and channel
+    straight from the raw bytes, before anything else is decoded. Compressed files are read as
+    iter_svlog_packets reads them.
+
+    Args:
+        filename: Path to the .svlog file.
+        block_size: Maximum number of pings per block.
+        sender_ids: If given, only pings from these sender IDs are included.
+        channels: If given, only pings with these channel numbers are included.
+        scanner: Optional FrameScanner, so the caller can inspect its counters afterwards.
+        stats: Optional ParseStats to collect counters and stage timings into (given to the
+            scanner too, unless it already has one). Pings whose payload doesn't hold the fixed
+            fields and a whole number of samples are skipped, and count as decode failures.
+
+    Yields:
+        tuple: (columns, pwr_results, sample_counts) as returned by decode_mono_profiles.
+    """
+    if scanner is None:
+        scanner = FrameScanner(stats)
+    elif scanner.stats is None:
+        scanner.stats = stats
+    if detect_compression(filename) is not None:
+        # Decompressed and scanned a window at a time; a block never spans two windows
+        for window, base, frames in scanner.scan_stream(iter_decompressed_chunks(filename)):
+            for columns, pwr_results, sample_counts in _iter_blocks(window, frames, block_size, sender_ids, channels, stats):
+                columns["position"] += base
+                yield columns, pwr_results, sample_counts
+        return
+    with map_svlog_file(filename) as data:
+        frames = scanner.scan(data)
+        # The scan holds a NumPy view of the map, so it must be closed before the map is
+        try:
+            yield from _iter_blocks(data, frames, block_size, sender_ids, channels, stats)
+        finally:
+            frames.close()
+
+
+def _decode_block(data, positions, payload_lengths, stats):
+    if stats is None:
+        return decode_mono_profiles(data, positions, payload_lengths)
+    with stats.timed("decode", len(positions)):
+        return decode_mono_profiles(data, positions, payload_lengths)
+
+
+def _iter_blocks(data, frames, block_size, sender_ids, channels, stats=None):
+    positions = []
+    payload_lengths = []
+    for pos, payload_length, message_id, _ in frames:
+        if message_id != MONO_PROFILE_ID:
+            continue
+        if payload_length < PREFIX_SIZE or (payload_length - PREFIX_SIZE) % PWR_DTYPE.itemsize:
+            # The parser rejects these too: not enough bytes for the fixed fields, or half a sample
+            if stats is not None:
+                stats.decode_failures += 1
+            continue
+        # Filter on single bytes of the raw packet, before anything is decoded
+        if sender_ids is not None and data[pos + 6] not in sender_ids:
+            continue
+        if channels is not None and data[pos + 8 + CHANNEL_OFFSET] not in channels:
+            continue
+        positions.append(pos)
+        payload_lengths.append(payload_length)
+        if len(positions) == block_size:
+            yield _decode_block(data, positions, payload_lengths, stats)
+            positions = []
+            payload_lengths = []
+    if positions:
+        yield _decode_block(data, positions, payload_lengths, stats)
+
+
+# ================================================================
+# Section: Assembling per-channel waterfalls
+# ================================================================
+
+class Waterfall:
+    """
+    All the pings of one sonar channel, as NumPy arrays.
+
+    Attributes:
+        sender_id: The sender ID of the sonar (typically 1 or 2).
+        channel_number: The channel number reported in the payload.
+        pwr_results: 2-D uint16 array (pings x samples), padded with zeros where a ping has
+            fewer samples than the longest one.
+        sample_counts: Number of valid samples in each row of pwr_results.
+        columns: dict of parallel 1-D arrays, one per payload field. These are also available
+            as attributes, e.g. waterfall.ping_number, waterfall.timestamp_ms, waterfall.start_mm.
+    """
+
+    def __init__(self, sender_id, channel_number, columns, pwr_results, sample_counts):
+        self.sender_id = sender_id
+        self.channel_number = channel_number
+        self.columns = columns
+        self.pwr_results = pwr_results
+        self.sample_counts = sample_counts
+
+    def __getattr__(self, name):
+        # Only called when normal lookup fails, so this exposes the columns as attributes
+        columns = self.__dict__.get("columns", {})
+        if name in columns:
+            return columns[name]
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    def __len__(self):
+        return len(self.pwr_results)
+
+    def __repr__(self):
+        return f"Waterfall(sender_id={self.sender_id}, channel_number={self.channel_number}, pings={len(self)}, samples={self.pwr_results.shape[1]})"
+
+
+def read_waterfalls(filename, sender_ids=None, channels=None, block_size=4096):
+    """
+    Read every os_mono_profile ping in a .svlog file into one Waterfall per sonar channel.
+
+    Example usage:
+        waterfalls = read_waterfalls("2025-03-24-12-14.svlog")
+        for (sender_id, channel_number), waterfall in waterfalls.items():
+            print(waterfall.pwr_results.shape, waterfall.timestamp_ms[:5])
+
+    Returns:
+        dict: {(sender_id, channel_number): Waterfall}, in order of first appearance.
+    """
+    pieces = {}  # (sender_id, channel_number) -> list of (columns, pwr_results, sample_counts)
+    for columns, pwr_results, sample_counts in iter_mono_profile_blocks(filename, block_size, sender_ids, channels):
+        keys = columns["sender_id"].astype(np.int64) * 256 + columns["channel_number"]
+        for key in dict.fromkeys(keys.tolist()):  # Unique keys, in order of first appearance
+            rows = keys == key
+            pieces.setdefault(divmod(key, 256), []).append(
+                ({name: column[rows] for name, column in columns.items()}, pwr_results[rows], sample_counts[rows]))
+
+    waterfalls = {}
+    for (sender_id, channel_number), blocks in pieces.items():
+        width = max(pwr_results.shape[1] for _, pwr_results, _ in blocks)
+        pwr_results = np.zeros((sum(len(counts) for _, _, counts in blocks), width), dtype=PWR_DTYPE)
+        row = 0
+        for _, block_pwr, _ in blocks:
+            pwr_results[row:row + len(block_pwr), :block_pwr.shape[1]] = block_pwr
+            row += len(block_pwr)
+        columns = {name: np.concatenate([block[0][name] for block in blocks]) for name in blocks[0][0]}
+        sample_counts = np.concatenate([counts for _, _, counts in blocks])
+        waterfalls[sender_id, channel_number] = Waterfall(sender_id, channel_number, columns, pwr_results, sample_counts)
+    return waterfalls
+
+
+if __name__ == "__main__":
+    # Example usage
+    filename = "2025-03-24-12-14.svlog"  # Replace with your binary file
+    for waterfall in read_waterfalls(filename).values():
+        print(waterfall)
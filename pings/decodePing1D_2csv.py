@@ -1,28 +1,118 @@
 #!/usr/bin/env python3
 import csv
 import argparse
-import pandas as pd
-from datetime import time, timedelta
+import time
+import numpy as np
 from pathlib import Path
-from decode_sensor_binary_log import PingViewerLogReader
+from pingviewer_log import PingViewerLogReader, ParseStats, add_cache_arguments, add_stats_arguments, cache_from_args, report_stats
+from ping_time import TimestampConverter, clean_timestamps, format_epoch_ns
+from compressed_io import open_output, strip_compression_suffix
 
-def parse_timestamp(timestamp_str):
+BATCH_SIZE = 4096  # Messages whose timestamps are converted together
+
+def write_rows(writer, converter, batch):
+    """
+    Convert the timestamps of a batch of (timestamp, message) pairs in one step, and write their rows.
+
+    Returns:
+        np.ndarray: The int64 epoch_ns of each message in the batch.
+    """
+    offsets = clean_timestamps([timestamp for timestamp, _ in batch])
+    epoch_ns = converter.convert_clean(offsets)
+    real_times = format_epoch_ns(epoch_ns)
+    for (_, decoded_message), real_time, offset, ns in zip(batch, real_times, offsets, epoch_ns.tolist()):
+        writer.writerow({
+            "real_time": real_time,
+            "timestamp_offset": offset,
+            "message_id": decoded_message.message_id,
+            "distance": getattr(decoded_message, "distance", ""),
+            "confidence": getattr(decoded_message, "confidence", ""),
+            "transmit_duration": getattr(decoded_message, "transmit_duration", ""),
+            "ping_number": getattr(decoded_message, "ping_number", ""),
+            "scan_start": getattr(decoded_message, "scan_start", ""),
+            "scan_length": getattr(decoded_message, "scan_length", ""),
+            "gain_setting": getattr(decoded_message, "gain_setting", ""),
+            "profile_data_length": getattr(decoded_message, "profile_data_length", ""),
+            "epoch_ns": ns
+        })
+    return epoch_ns
+
+def write_profiles(profiles, epoch_ns, output_npz):
     """
-    Remove null bytes and convert a timestamp string in the format 'hh:mm:ss.xxx'
-    into a timedelta.
+    Write the profile_data of every message to a NumPy .npz file: "profile_data" is a 2-D uint8
+    array (messages x samples), zero padded where a message has fewer samples than the longest
+    one, with "profile_data_length" and "epoch_ns" giving the length and time of each row.
+    """
+    lengths = np.array([len(profile) for profile in profiles], dtype=np.uint16)
+    profile_array = np.zeros((len(profiles), int(lengths.max(initial=0))), dtype=np.uint8)
+    for row, profile in enumerate(profiles):
+        profile_array[row, :len(profile)] = profile
+    np.savez(output_npz, profile_data=profile_array, profile_data_length=lengths,
+             epoch_ns=np.concatenate(epoch_ns) if epoch_ns else np.zeros(0, dtype=np.int64))
+
+def decode_file(input_file, output_csv, profiles_npz=None, stats=None, cache=None):
+    """
+    Decode the Ping1D profile messages (message ID 1300) of a PingViewer .bin file to a CSV.
+
+    Args:
+        input_file: Path to the .bin file. Its name gives the base time, e.g. "20250306-115328280.bin".
+        output_csv: Path to the output CSV file.
+        profiles_npz: Optional path to also write the profile data (the signal strength samples) to, as a .npz file.
+        stats: Optional ParseStats to collect counters and stage timings into.
+        cache: Optional DecodeCache to load the decoded messages from, or store them in.
     """
-    clean_str = timestamp_str.replace('\x00', '')
-    t_obj = time.fromisoformat(clean_str)
-    return timedelta(hours=t_obj.hour, minutes=t_obj.minute,
-                     seconds=t_obj.second, microseconds=t_obj.microsecond)
+    input_path = Path(input_file)
+    # The base time comes from the file's stem; message timestamps are converted in batches
+    converter = TimestampConverter(strip_compression_suffix(input_path).stem)
+    
+    log = PingViewerLogReader(str(input_path), stats=stats, cache=cache)
+
+    with open_output(output_csv) as csvfile:  # Compressed if the name ends in .gz/.xz/.zst
+        fieldnames = [
+            "real_time", "timestamp_offset", "message_id", "distance", "confidence",
+            "transmit_duration", "ping_number", "scan_start", "scan_length",
+            "gain_setting", "profile_data_length", "epoch_ns"
+        ]
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer.writeheader()
+
+        # Process each decoded message filtering for Ping1D messages (message ID 1300)
+        batch = []
+        profiles = []  # profile_data of each message, if they are being kept
+        epoch_ns = []
+        seconds = 0.0  # Spent converting timestamps and writing rows
+        for timestamp, decoded_message in log.parser({1300}):
+            batch.append((timestamp, decoded_message))
+            if profiles_npz is not None:
+                profiles.append(decoded_message.profile_data)
+            if len(batch) == BATCH_SIZE:
+                started = time.perf_counter()
+                epoch_ns.append(write_rows(writer, converter, batch))
+                seconds += time.perf_counter() - started
+                batch = []
+        if batch:
+            started = time.perf_counter()
+            epoch_ns.append(write_rows(writer, converter, batch))
+            seconds += time.perf_counter() - started
+        if stats is not None:
+            stats.add_time("write", seconds)
+
+    print(f"Decoded data saved to {output_csv}")
+    if profiles_npz is not None:
+        write_profiles(profiles, epoch_ns, profiles_npz)
+        print(f"Profile data saved to {profiles_npz}")
 
 def main():
     parser = argparse.ArgumentParser(
         description="Decode Ping1D binary file and output sonar data to CSV with real timestamps"
     )
-    parser.add_argument("file", help="Input binary file containing Ping1D data")
+    parser.add_argument("file", help="Input binary file containing Ping1D data (may be gzip/xz/zstd compressed)")
     parser.add_argument("-o", "--output", default="",
-                        help="(Optional) Output CSV file. If not provided, CSV file is written to adjacent 'csv' folder.")
+                        help="(Optional) Output CSV file, compressed if it ends in .gz, .xz or .zst. If not provided, CSV file is written to adjacent 'csv' folder.")
+    parser.add_argument("--profiles", default=None,
+                        help="(Optional) Also write the profile data (signal strength samples of every ping) to this .npz file.")
+    add_stats_arguments(parser)
+    add_cache_arguments(parser)
     args = parser.parse_args()
 
     input_path = Path(args.file)
@@ -33,42 +123,12 @@ def main():
         # Assume input is in .../bin/ so output will be in .../csv/ with the same stem.
         csv_folder = input_path.parent.parent / "csv"
         csv_folder.mkdir(parents=True, exist_ok=True)
-        output_csv = csv_folder / (input_path.stem + ".csv")
-    
-    # Calculate the base time from the file's stem.
-    base_time = pd.to_datetime(input_path.stem, format='%Y%m%d-%H%M%S%f')
-    
-    log = PingViewerLogReader(str(input_path))
+        output_csv = csv_folder / (strip_compression_suffix(input_path).stem + ".csv")
 
-    with open(output_csv, 'w', newline='') as csvfile:
-        fieldnames = [
-            "real_time", "timestamp_offset", "message_id", "distance", "confidence",
-            "transmit_duration", "ping_number", "scan_start", "scan_length",
-            "gain_setting", "profile_data_length"
-        ]
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-
-        # Process each decoded message filtering for Ping1D messages (message ID 1300)
-        for timestamp, decoded_message in log.parser({1300}):
-            if decoded_message.message_id == 1300:
-                offset = parse_timestamp(timestamp)
-                real_time = base_time + offset
-                writer.writerow({
-                    "real_time": real_time,
-                    "timestamp_offset": timestamp.replace('\x00', ''),
-                    "message_id": decoded_message.message_id,
-                    "distance": getattr(decoded_message, "distance", ""),
-                    "confidence": getattr(decoded_message, "confidence", ""),
-                    "transmit_duration": getattr(decoded_message, "transmit_duration", ""),
-                    "ping_number": getattr(decoded_message, "ping_number", ""),
-                    "scan_start": getattr(decoded_message, "scan_start", ""),
-                    "scan_length": getattr(decoded_message, "scan_length", ""),
-                    "gain_setting": getattr(decoded_message, "gain_setting", ""),
-                    "profile_data_length": getattr(decoded_message, "profile_data_length", "")
-                })
-
-    print(f"Decoded data saved to {output_csv}")
+    stats = ParseStats() if args.stats or args.json_stats else None
+    decode_file(input_path, output_csv, args.profiles, stats=stats, cache=cache_from_args(args))
+    if stats is not None:
+        report_stats(args, stats)
 
 if __name__ == "__main__":
     main()
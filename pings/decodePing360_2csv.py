@@ -1,68 +1,158 @@
-    #!/usr/bin/env python3
+#!/usr/bin/env python3
 import numpy as np
-import csv
 import argparse
-import pandas as pd
-from datetime import time, timedelta
+import functools
+import time
 from pathlib import Path
-from decode_sensor_binary_log import PingViewerLogReader
+from pingviewer_log import PingViewerLogReader, ParseStats, add_cache_arguments, add_stats_arguments, cache_from_args, report_stats
+from ping_time import TimestampConverter, clean_timestamps, format_epoch_ns
+from compressed_io import open_output, strip_compression_suffix
 
-def parse_timestamp(timestamp_str):
+SPEED_OF_SOUND = 1500.0  # in m/s
+BATCH_SIZE = 1024  # Messages whose timestamps are converted together
+CSV_HEADER = "real_time,timestamp_offset,angle_deg,sample_index,distance_m,intensity\r\n"
+# Pre-formatted CSV endings for every possible intensity value
+INTENSITY_STRINGS = np.array([f"{value}\r\n" for value in range(256)], dtype=object)
+# Column types of the .npz output (the Ping360 message field types)
+NPZ_DTYPES = {"real_time": "datetime64[ns]", "angle": np.uint16, "gain_setting": np.uint8, "transmit_duration": np.uint16,
+              "sample_period": np.uint16, "transmit_frequency": np.uint16, "number_of_samples": np.uint16}
+
+@functools.lru_cache(maxsize=64)
+def sample_distances(sample_period, number_of_samples):
+    """
+    Distance (in m) of each sample from the transducer, computed once per (sample_period, number_of_samples).
+
+    sample_period is in increments of 25 ns, so the time for each sample is sample_period * 25e-9 seconds.
+    Since the pulse makes a round trip, distance = (speed_of_sound * t_sample) / 2.
+    """
+    t_sample = sample_period * 25e-9  # seconds
+    distance_per_sample = (SPEED_OF_SOUND * t_sample) / 2.0
+    distances = np.arange(number_of_samples) * distance_per_sample
+    distances.flags.writeable = False  # Shared between calls, so nobody may modify it
+    return distances
+
+@functools.lru_cache(maxsize=64)
+def csv_sample_columns(sample_period, number_of_samples):
+    """Pre-formatted 'sample_index,distance_m,' CSV columns, computed once per (sample_period, number_of_samples)."""
+    return np.array([f"{i},{distance}," for i, distance in enumerate(sample_distances(sample_period, number_of_samples).tolist())],
+                    dtype=object)
+
+def write_csv(messages, output_csv):
+    """
+    Write one CSV row per sample. Rows are built from pre-formatted pieces and written one
+    message at a time, rather than with one csv writerow call per sample.
     """
-    Remove null bytes and convert a timestamp string in the format 'hh:mm:ss.xxx'
-    into a timedelta.
+    with open_output(output_csv) as csvfile:  # Compressed if the name ends in .gz/.xz/.zst
+        csvfile.write(CSV_HEADER)
+        for epoch_ns, offsets, decoded_messages in messages:
+            for real_time, timestamp_offset, decoded_message in zip(format_epoch_ns(epoch_ns), offsets, decoded_messages):
+                intensities = np.frombuffer(decoded_message.data, dtype=np.uint8)
+                # Convert angle from gradians to degrees (1 gradian = 0.9 degree)
+                row_start = f"{real_time},{timestamp_offset},{decoded_message.angle * 0.9},"
+                rows = row_start + csv_sample_columns(decoded_message.sample_period, len(intensities)) + INTENSITY_STRINGS[intensities]
+                csvfile.write("".join(rows.tolist()))
+
+def write_npz(messages, output_npz):
+    """
+    Write one row per message to a NumPy .npz file: every scalar field is a 1-D column, and the
+    intensities are a 2-D uint8 array (messages x samples), zero padded where a message has fewer
+    samples than the longest one. The distance of each sample is
+    sample_distances(sample_period[row], number_of_samples[row]).
     """
-    clean_str = timestamp_str.replace('\x00', '')
-    t_obj = time.fromisoformat(clean_str)
-    return timedelta(hours=t_obj.hour, minutes=t_obj.minute, 
-                     seconds=t_obj.second, microseconds=t_obj.microsecond)
+    columns = {name: [] for name in ("real_time", "timestamp_offset", "angle", "gain_setting", "transmit_duration",
+                                     "sample_period", "transmit_frequency", "number_of_samples")}
+    intensities = []
+    for epoch_ns, offsets, decoded_messages in messages:
+        columns["real_time"].extend(epoch_ns.tolist())  # nanoseconds since the epoch
+        columns["timestamp_offset"].extend(offsets)
+        for decoded_message in decoded_messages:
+            for name in ("angle", "gain_setting", "transmit_duration", "sample_period", "transmit_frequency"):
+                columns[name].append(getattr(decoded_message, name))
+            samples = np.frombuffer(decoded_message.data, dtype=np.uint8)
+            columns["number_of_samples"].append(len(samples))
+            intensities.append(samples)
+
+    width = max(columns["number_of_samples"], default=0)
+    intensity_array = np.zeros((len(intensities), width), dtype=np.uint8)
+    for row, samples in enumerate(intensities):
+        intensity_array[row, :len(samples)] = samples
+
+    arrays = {name: np.asarray(values, dtype=NPZ_DTYPES.get(name)) for name, values in columns.items()}
+    arrays["angle_deg"] = arrays["angle"] * 0.9  # Convert angle from gradians to degrees (1 gradian = 0.9 degree)
+    np.savez(output_npz, intensities=intensity_array, **arrays)
+
+def decode_file(input_file, output_file, output_format=None, stats=None, cache=None):
+    """
+    Decode the Ping360 device_data messages (message ID 2300) of a PingViewer .bin file.
+
+    Args:
+        input_file: Path to the .bin file. Its name gives the base time, e.g. "20250306-115328280.bin".
+        output_file: Path to the output file.
+        output_format: "csv" for one row per sample, or "npz" for one row per message
+            (default: "npz" if output_file ends in .npz, otherwise "csv").
+        stats: Optional ParseStats to collect counters and stage timings into.
+        cache: Optional DecodeCache to load the decoded messages from, or store them in.
+    """
+    if output_format is None:
+        output_format = "npz" if Path(output_file).suffix.lower() == ".npz" else "csv"
+
+    # The base time comes from the file's stem.
+    # For example, a file named "20250306-115328280.bin" represents the base time.
+    converter = TimestampConverter(strip_compression_suffix(input_file).stem)
+
+    log = PingViewerLogReader(str(input_file), stats=stats, cache=cache)
+
+    producing = [0.0]  # Seconds spent reading and decoding batches, to tell the writing time apart
+
+    def messages():
+        """Yield batches of (epoch_ns array, timestamp offsets, messages), converting each batch's timestamps in one step."""
+        started = time.perf_counter()
+        batch = []
+        # Iterate over only Ping360 device_data messages (message ID 2300)
+        for timestamp, decoded_message in log.parser({2300}):
+            batch.append((timestamp, decoded_message))
+            if len(batch) == BATCH_SIZE:
+                offsets = clean_timestamps([timestamp for timestamp, _ in batch])
+                converted = converter.convert_clean(offsets), offsets, [decoded_message for _, decoded_message in batch]
+                producing[0] += time.perf_counter() - started
+                yield converted
+                started = time.perf_counter()
+                batch = []
+        if batch:
+            offsets = clean_timestamps([timestamp for timestamp, _ in batch])
+            converted = converter.convert_clean(offsets), offsets, [decoded_message for _, decoded_message in batch]
+            producing[0] += time.perf_counter() - started
+            yield converted
+        else:
+            producing[0] += time.perf_counter() - started
+
+    started = time.perf_counter()
+    if output_format == "npz":
+        write_npz(messages(), output_file)
+    else:
+        write_csv(messages(), output_file)
+    if stats is not None:
+        stats.add_time("write", time.perf_counter() - started - producing[0])
 
 def main():
     parser = argparse.ArgumentParser(
         description="Decode Ping360 binary file and output sonar data to CSV with real timestamps"
     )
-    parser.add_argument("file", help="Input binary file containing Ping360 data")
+    parser.add_argument("file", help="Input binary file containing Ping360 data (may be gzip/xz/zstd compressed)")
     parser.add_argument("-o", "--output", default="output.csv",
-                        help="Output CSV file (default: output.csv)")
+                        help="Output file (default: output.csv). A .npz output is written in the compact one-row-per-message format; "
+                             "a .csv.gz, .csv.xz or .csv.zst output is compressed.")
+    parser.add_argument("--format", choices=["csv", "npz"], default=None,
+                        help="'csv' for one row per sample, 'npz' for one row per message with the intensities as a uint8 array "
+                             "(default: inferred from the output file extension)")
+    add_stats_arguments(parser)
+    add_cache_arguments(parser)
     args = parser.parse_args()
 
-    # Calculate the base time from the file's stem.
-    # For example, a file named "20250306-115328280.bin" represents the base time.
-    base_time = pd.to_datetime(Path(args.file).stem, format='%Y%m%d-%H%M%S%f')
-    
-    log = PingViewerLogReader(args.file)
-
-    # Open CSV file for writing
-    with open(args.output, 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        # Write CSV header
-        writer.writerow(["real_time", "timestamp_offset", "angle_deg", "sample_index", "distance_m", "intensity"])
-        
-        # Iterate over only Ping360 device_data messages (message ID 2300)
-        for timestamp, decoded_message in log.parser({2300}):
-            # Compute the real timestamp by adding the offset (from the message) to the base time.
-            offset = parse_timestamp(timestamp)
-            real_time = base_time + offset
-
-            # Convert angle from gradians to degrees (1 gradian = 0.9 degree)
-            angle_deg = decoded_message.angle * 0.9
-
-            # Convert the raw intensity data into a NumPy array.
-            intensities = np.frombuffer(decoded_message.data, dtype=np.uint8)
-            
-            # Calculate distance per sample:
-            # sample_period is in increments of 25 ns.
-            # The time for each sample is: sample_period * 25e-9 seconds.
-            # Since the pulse makes a round trip, distance = (speed_of_sound * t_sample) / 2.
-            speed_of_sound = 1500.0  # in m/s
-            t_sample = decoded_message.sample_period * 25e-9  # seconds
-            distance_per_sample = (speed_of_sound * t_sample) / 2.0
-
-            # Write one CSV row per sample.
-            for i, intensity in enumerate(intensities):
-                distance = i * distance_per_sample
-                writer.writerow([real_time, timestamp.replace('\x00', ''), angle_deg, i, distance, intensity])
+    stats = ParseStats() if args.stats or args.json_stats else None
+    decode_file(args.file, args.output, args.format, stats=stats, cache=cache_from_args(args))
+    if stats is not None:
+        report_stats(args, stats)
 
 if __name__ == "__main__":
     main()
-
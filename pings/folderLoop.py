@@ -1,39 +1,121 @@
 #!/usr/bin/env python3
-import subprocess
-from pathlib import Path
 import argparse
+import importlib.util
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+# Compressed .bin files are found and named with the helpers shared with the Omniscan 450 tools
+try:
+    from compressed_io import SUFFIXES, glob_logs, strip_compression_suffix
+except ImportError:
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "omniscan450"))
+    from compressed_io import SUFFIXES, glob_logs, strip_compression_suffix
+
+# Decoding modules already imported by this worker process, keyed by script path
+_decoders = {}
+
+def load_decoder(script):
+    """
+    Import a decoding script (e.g. decodePing1D_2csv.py) as a module and return its decode_file function.
+    Each worker process imports the script (and pandas, NumPy, ...) only once, however many files it decodes.
+    """
+    script = str(Path(script).resolve())
+    if script not in _decoders:
+        # Let the script find its neighbours (e.g. pingviewer_log.py), as it would when run directly
+        script_folder = str(Path(script).parent)
+        if script_folder not in sys.path:
+            sys.path.insert(0, script_folder)
+        spec = importlib.util.spec_from_file_location(Path(script).stem, script)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _decoders[script] = module.decode_file
+    return _decoders[script]
+
+def output_path_for(input_path, compress_suffix=""):
+    """
+    If the bin file is in a folder named "bin", the output goes in its parent's parent / "csv".
+    Otherwise, it goes alongside the .bin file. A compressed .bin file (e.g. x.bin.gz) gets the
+    same name as if it weren't (x.csv), plus compress_suffix (e.g. ".gz") if one is given.
+    """
+    name = strip_compression_suffix(input_path).stem + ".csv" + compress_suffix
+    if input_path.parent.name.lower() == "bin":
+        output_folder = input_path.parent.parent / "csv"
+        output_folder.mkdir(parents=True, exist_ok=True)
+        return output_folder / name
+    return input_path.with_name(name)
+
+def decode_one(script, input_path, output_csv):
+    """
+    Worker: decode one file. Returns (input_path, error message or None, seconds taken).
+
+    The output is written under a temporary name and only renamed to output_csv once the decoder
+    has finished, so a decode that fails (or is killed) part-way never leaves a CSV that looks up
+    to date. The temporary name keeps the output's extensions, which the decoders go by.
+    """
+    start = time.perf_counter()
+    temporary = Path(output_csv).with_name(".tmp_" + Path(output_csv).name)
+    try:
+        load_decoder(script)(input_path, temporary)
+        os.replace(temporary, output_csv)
+        return input_path, None, time.perf_counter() - start
+    except Exception:
+        error = traceback.format_exc(limit=3)
+        temporary.unlink(missing_ok=True)
+        return input_path, error, time.perf_counter() - start
 
 def main():
     parser = argparse.ArgumentParser(
         description="Loop through a folder of Ping .bin files and decode each to CSV using a specified decoding script"
     )
-    parser.add_argument("folder", help="Folder containing .bin files")
+    parser.add_argument("folder", help="Folder containing .bin files (compressed ones too)")
     parser.add_argument("--script", default="decodePing1D_2csv.py",
                         help="Path to the decoding script (default: decodePing1D_2csv.py)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="Number of files to decode in parallel (default: number of CPUs)")
+    parser.add_argument("--force", action="store_true",
+                        help="Decode every file, even if its CSV is already newer than the .bin file")
+    parser.add_argument("--compress", choices=[suffix.lstrip(".") for suffix in SUFFIXES], default=None,
+                        help="Write the CSV files compressed (e.g. --compress gz writes x.csv.gz)")
     args = parser.parse_args()
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    compress_suffix = "." + args.compress if args.compress else ""
+
+    # The script is looked up relative to this folder if it isn't found as given
+    script = Path(args.script)
+    if not script.exists():
+        script = Path(__file__).resolve().parent / args.script
 
-    folder_path = Path(args.folder)
-    # Loop over every .bin file in the folder.
-    for bin_file in folder_path.glob("*.bin"):
+    jobs = []
+    skipped = []
+    for bin_file in glob_logs(args.folder, "*.bin"):  # Also .bin.gz, .bin.xz and .bin.zst
         input_path = bin_file.resolve()
-        # If the bin file is in a folder named "bin", we compute the output folder as its parent's parent / "csv"
-        if input_path.parent.name.lower() == "bin":
-            output_folder = input_path.parent.parent / "csv"
-            output_folder.mkdir(parents=True, exist_ok=True)
-            output_csv = output_folder / (input_path.stem + ".csv")
-        else:
-            # Otherwise, just place the CSV alongside the .bin file.
-            output_csv = input_path.with_suffix(".csv")
-        
-        print(f"Processing {input_path} -> {output_csv}")
-        try:
-            # Call the decoding script with the input file and computed output file.
-            subprocess.run(
-                ["python3", args.script, str(input_path), "-o", str(output_csv)],
-                check=True
-            )
-        except subprocess.CalledProcessError as e:
-            print(f"Error processing {input_path}: {e}")
+        output_csv = output_path_for(input_path, compress_suffix)
+        if not args.force and output_csv.exists() and output_csv.stat().st_mtime >= input_path.stat().st_mtime:
+            skipped.append(input_path)
+            continue
+        jobs.append((input_path, output_csv))
+
+    print(f"Decoding {len(jobs)} files with {args.jobs} workers ({len(skipped)} already up to date)")
+    failures = []
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = [executor.submit(decode_one, str(script), input_path, output_csv) for input_path, output_csv in jobs]
+        for future in as_completed(futures):
+            input_path, error, seconds = future.result()
+            if error is None:
+                print(f"Processed {input_path} ({seconds:.1f} s)")
+            else:
+                print(f"Error processing {input_path}:\n{error}")
+                failures.append(input_path)
+
+    # Summary
+    print(f"\n{len(jobs) - len(failures)} succeeded, {len(failures)} failed, {len(skipped)} skipped (up to date)")
+    for input_path in failures:
+        print(f"  FAILED: {input_path}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+import argparse
+import functools
+import numpy as np
+
+"""
+    Turns decoded Ping360 messages (the .npz written by decodePing360_2csv.py) into scans and
+    images:
+
+        1. Consecutive 2300 messages are grouped into revolutions (full or partial), each stored
+           as a uint8 (angle x sample) array with one row per gradian (400 rows).
+        2. Each revolution is turned into a square Cartesian image with a lookup table that
+           maps every pixel to a cell of the polar array. The table only depends on
+           (angle step, angle phase, number of samples, grid size), so it is computed once
+           and cached: converting a scan is then a single gather.
+        3. The images are appended to a stacked .npy file on disk (frames x grid x grid),
+           which can be opened with np.load(path, mmap_mode="r") and scrubbed through.
+"""
+
+GRADIANS = 400  # Ping360 angles are in gradians: 400 per revolution
+SPEED_OF_SOUND = 1500.0  # in m/s
+
+class Scan:
+    """
+    One revolution (or part of one) of the Ping360.
+
+    Attributes:
+        intensities: uint8 array (400 x number_of_samples), one row per gradian. Rows for angles
+            that were not measured are zero.
+        measured: bool array (400,), True for the angles that were measured.
+        sample_period: The sample period (in 25 ns ticks) of every message in the scan.
+        angle_step: The smallest step between measured angles, in gradians.
+        angle_phase: Where the measured angles fall within a step (first measured angle % angle_step),
+            e.g. 1 for angles 1, 3, 5, ... with a step of 2.
+        first_message, last_message: Index of the first and last message of the scan.
+        start_time, end_time: real_time of the first and last message.
+    """
+
+    def __init__(self, intensities, measured, sample_period, angle_step, first_message, last_message, start_time, end_time,
+                 angle_phase=0):
+        self.intensities = intensities
+        self.measured = measured
+        self.sample_period = sample_period
+        self.angle_step = angle_step
+        self.angle_phase = angle_phase
+        self.first_message = first_message
+        self.last_message = last_message
+        self.start_time = start_time
+        self.end_time = end_time
+
+    @property
+    def number_of_samples(self):
+        return self.intensities.shape[1]
+
+    @property
+    def max_range(self):
+        """Distance (in m) covered by the samples."""
+        return self.number_of_samples * SPEED_OF_SOUND * self.sample_period * 25e-9 / 2.0
+
+    def __repr__(self):
+        return (f"Scan(messages={self.first_message}-{self.last_message}, angles={int(self.measured.sum())}, "
+                f"samples={self.number_of_samples}, angle_step={self.angle_step}, angle_phase={self.angle_phase})")
+
+def assemble_scans(angle, intensities, sample_period, number_of_samples, real_time=None):
+    """
+    Group consecutive messages into revolutions.
+
+    A new scan starts whenever an angle comes round again (a full revolution, or the sonar
+    reversing in sector-scan mode), or when the sample_period or number_of_samples changes.
+
+    Args:
+        angle: Angle of each message, in gradians.
+        intensities: uint8 array (messages x samples), zero padded.
+        sample_period, number_of_samples: Value for each message.
+        real_time: Optional time of each message.
+
+    Yields:
+        Scan: Each scan, in order.
+    """
+    angle = np.asarray(angle) % GRADIANS
+    count = len(angle)
+    if count == 0:
+        return
+    if real_time is None:
+        real_time = np.arange(count)
+
+    # Messages where the settings change always start a new scan
+    settings_change = np.zeros(count, dtype=bool)
+    settings_change[1:] = (np.diff(sample_period) != 0) | (np.diff(number_of_samples) != 0)
+
+    start = 0
+    seen = np.zeros(GRADIANS, dtype=bool)
+    for i in range(count):
+        if settings_change[i] or seen[angle[i]]:
+            yield _make_scan(angle, intensities, sample_period, number_of_samples, real_time, start, i)
+            seen[:] = False
+            start = i
+        seen[angle[i]] = True
+    yield _make_scan(angle, intensities, sample_period, number_of_samples, real_time, start, count)
+
+def _make_scan(angle, intensities, sample_period, number_of_samples, real_time, start, stop):
+    samples = int(number_of_samples[start])
+    polar = np.zeros((GRADIANS, samples), dtype=np.uint8)
+    polar[angle[start:stop]] = intensities[start:stop, :samples]
+    measured = np.zeros(GRADIANS, dtype=bool)
+    measured[angle[start:stop]] = True
+    measured_angles = np.flatnonzero(measured)
+    steps = np.diff(measured_angles)
+    angle_step = int(np.gcd.reduce(steps)) if len(steps) else 1
+    angle_phase = int(measured_angles[0]) % angle_step
+    return Scan(polar, measured, int(sample_period[start]), angle_step, start, stop - 1, real_time[start], real_time[stop - 1],
+                angle_phase)
+
+@functools.lru_cache(maxsize=16)
+def polar_lookup(angle_step, angle_phase, number_of_samples, grid_size):
+    """
+    Lookup table from the pixels of a (grid_size x grid_size) image to the cells of a
+    (400 x number_of_samples) polar scan. The sonar is at the centre of the image, with
+    angle 0 pointing up and angles increasing clockwise; each pixel takes the cell of the
+    nearest measured angle (angle_phase plus a multiple of angle_step) and of the sample at
+    its range. The table is in units of samples, so the sample period doesn't change it.
+
+    The table is cached, since it only depends on its arguments.
+
+    Returns:
+        tuple: (flat indices into the polar array, bool mask of the pixels within range),
+            both of shape (grid_size, grid_size).
+    """
+    # Pixel centres in units of samples, with the sonar at the centre of the grid
+    scale = 2.0 * number_of_samples / grid_size
+    coordinates = (np.arange(grid_size) + 0.5 - grid_size / 2.0) * scale
+    x = coordinates[None, :]
+    y = -coordinates[:, None]  # Image rows go down, so flip to make angle 0 point up
+    sample = np.hypot(x, y)
+    theta = np.degrees(np.arctan2(x, y)) % 360.0 / 0.9  # Clockwise from up, in gradians
+
+    row = np.rint((theta - angle_phase) / angle_step) * angle_step + angle_phase
+    # Beyond the last measured angle (or before the first), the nearest is one of those two, across
+    # 0; the gap between them is not a whole step when angle_step doesn't divide 400
+    last_angle = angle_phase + (GRADIANS - 1 - angle_phase) // angle_step * angle_step
+    across = (theta > last_angle) | (theta < angle_phase)
+    to_first = (angle_phase - theta) % GRADIANS
+    to_last = (theta - last_angle) % GRADIANS
+    row = np.where(across, np.where(to_first < to_last, angle_phase, last_angle), row).astype(np.int64)
+    column = sample.astype(np.int64)
+    inside = column < number_of_samples
+    indices = np.where(inside, row * number_of_samples + column, 0)
+    indices.flags.writeable = False
+    inside.flags.writeable = False
+    return indices, inside
+
+def scan_to_image(scan, grid_size=512):
+    """Convert a Scan to a (grid_size x grid_size) uint8 Cartesian image, with one gather through the cached lookup table."""
+    indices, inside = polar_lookup(scan.angle_step, scan.angle_phase, scan.number_of_samples, grid_size)
+    image = scan.intensities.ravel()[indices]
+    image *= inside
+    return image
+
+class FrameStackWriter:
+    """
+    Append equally-shaped frames to a .npy file on disk, without knowing the number of frames
+    in advance. The header is written with room to spare and rewritten with the final frame
+    count on close, so the result is an ordinary .npy file that can be memory-mapped with
+    np.load(path, mmap_mode="r").
+    """
+
+    HEADER_SIZE = 128  # Bytes reserved for the .npy header
+
+    def __init__(self, filename, frame_shape, dtype=np.uint8):
+        self.file = open(filename, "wb")
+        self.frame_shape = tuple(frame_shape)
+        self.dtype = np.dtype(dtype)
+        self.frames = 0
+        self._write_header()
+
+    def _write_header(self):
+        header = repr({"descr": self.dtype.str, "fortran_order": False, "shape": (self.frames,) + self.frame_shape})
+        header = header.encode("latin1")
+        preamble = b"\x93NUMPY\x01\x00"  # Magic string and format version 1.0
+        padding = self.HEADER_SIZE - len(preamble) - 2 - len(header) - 1
+        self.file.seek(0)
+        self.file.write(preamble + (self.HEADER_SIZE - len(preamble) - 2).to_bytes(2, "little") + header + b" " * padding + b"\n")
+        self.file.seek(0, 2)
+
+    def append(self, frame):
+        frame = np.ascontiguousarray(frame, dtype=self.dtype)
+        if frame.shape != self.frame_shape:
+            raise ValueError(f"Frame shape {frame.shape} does not match {self.frame_shape}")
+        self.file.write(frame.tobytes())
+        self.frames += 1
+
+    def close(self):
+        self._write_header()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def write_scan_frames(input_npz, output_npy, grid_size=512, min_angles=1):
+    """
+    Assemble the scans of a decoded Ping360 .npz file and write their Cartesian images to a
+    stacked .npy file. The time span and coverage of each frame are written alongside it
+    to <output>_frames.npz.
+
+    Returns:
+        int: The number of frames written.
+    """
+    data = np.load(input_npz)
+    times = []
+    with FrameStackWriter(output_npy, (grid_size, grid_size)) as writer:
+        for scan in assemble_scans(data["angle"], data["intensities"], data["sample_period"], data["number_of_samples"], data["real_time"]):
+            if scan.measured.sum() < min_angles:
+                continue
+            writer.append(scan_to_image(scan, grid_size))
+            times.append((scan.start_time, scan.end_time, scan.measured.sum(), scan.max_range))
+        frames = writer.frames
+
+    start_time, end_time, angles, max_range = (np.array(column) for column in zip(*times)) if times else ([],) * 4
+    np.savez(str(output_npy).rsplit(".", 1)[0] + "_frames.npz", start_time=start_time, end_time=end_time,
+             measured_angles=angles, max_range_m=max_range)
+    return frames
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Assemble Ping360 revolutions from a decoded .npz file (see decodePing360_2csv.py) and write them as stacked Cartesian images"
+    )
+    parser.add_argument("file", help="Input .npz file written by decodePing360_2csv.py")
+    parser.add_argument("-o", "--output", default="frames.npy", help="Output .npy file of stacked frames (default: frames.npy)")
+    parser.add_argument("--grid", type=int, default=512, help="Width and height of each frame, in pixels (default: 512)")
+    parser.add_argument("--min-angles", type=int, default=1,
+                        help="Skip scans with fewer measured angles than this, e.g. 400 for full revolutions only (default: 1)")
+    args = parser.parse_args()
+
+    frames = write_scan_frames(args.file, args.output, args.grid, args.min_angles)
+    print(f"{frames} frames written to {args.output}")
+
+if __name__ == "__main__":
+    main()
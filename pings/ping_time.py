@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+import numpy as np
+import pandas as pd
+
+"""
+    PingViewer stamps every message with the time since the recording started, as a string
+    'hh:mm:ss.xxx' (with null bytes between the characters). The real time of a message is the
+    base time given by the file name (e.g. "20250306-115328280.bin") plus that offset.
+
+    Rather than converting every message's string on its own, the timestamps are collected in
+    batches and converted in one vectorized step to int64 nanoseconds since the epoch.
+"""
+
+NS_PER_DAY = 86400 * 10**9
+ROLLOVER_THRESHOLD_NS = NS_PER_DAY // 2  # A backwards jump bigger than this is the clock wrapping at midnight
+# Place values (in ms) of the digits of 'hh:mm:ss.xxx'; the ':' and '.' positions are weighted 0
+_DIGIT_WEIGHTS_MS = np.array([36000000, 3600000, 0, 600000, 60000, 0, 10000, 1000, 0, 100, 10, 1], dtype=np.int64)
+_SEPARATORS = {2: ord(":"), 5: ord(":"), 8: ord(".")}
+
+def clean_timestamps(timestamps):
+    """Remove the null bytes from a batch of timestamp strings."""
+    return [timestamp.replace('\x00', '') for timestamp in timestamps]
+
+def offsets_to_ns(clean_timestamps):
+    """
+    Convert a batch of 'hh:mm:ss.xxx' strings (without null bytes) to int64 nanoseconds, in one
+    vectorized step. Strings in any other format fall back to pandas' timedelta parser.
+    """
+    if len(clean_timestamps) == 0:
+        return np.zeros(0, dtype=np.int64)
+    text = np.array(clean_timestamps, dtype="S")
+    if text.dtype.itemsize == 12:
+        characters = text.view(np.uint8).reshape(-1, 12)
+        separators_ok = all((characters[:, column] == value).all() for column, value in _SEPARATORS.items())
+        digits = characters.astype(np.int64) - ord("0")
+        digit_columns = _DIGIT_WEIGHTS_MS != 0
+        if separators_ok and ((digits[:, digit_columns] >= 0) & (digits[:, digit_columns] <= 9)).all():
+            return (digits * _DIGIT_WEIGHTS_MS).sum(axis=1) * 1000000
+    return pd.to_timedelta(pd.Series(clean_timestamps)).to_numpy(dtype="timedelta64[ns]").astype(np.int64)
+
+def base_time_ns(stem):
+    """Base time of a PingViewer file from its name (e.g. "20250306-115328280"), in ns since the epoch."""
+    return pd.to_datetime(stem, format='%Y%m%d-%H%M%S%f').value
+
+class TimestampConverter:
+    """
+    Converts batches of PingViewer timestamps from one file to int64 nanoseconds since the epoch.
+
+    The 'hh:mm:ss.xxx' offset wraps back to 00:00:00 after 24 hours; whenever it jumps backwards
+    by more than half a day, a day is added to it and to every following timestamp. The state
+    is kept between batches, so a wrap between two batches is handled too.
+
+    Example usage:
+        converter = TimestampConverter(Path("20250306-115328280.bin").stem)
+        epoch_ns = converter.convert(timestamps)  # int64 array, one per timestamp
+    """
+
+    def __init__(self, stem):
+        self.base_ns = base_time_ns(stem)
+        self.days = 0
+        self.last_offset_ns = None
+
+    def convert_clean(self, clean_timestamps):
+        """Convert timestamps that have already been stripped of null bytes."""
+        offsets = offsets_to_ns(clean_timestamps)
+        if len(offsets) == 0:
+            return offsets
+        previous = offsets[0] if self.last_offset_ns is None else self.last_offset_ns
+        steps = np.diff(offsets, prepend=previous)
+        days = self.days + np.cumsum(steps < -ROLLOVER_THRESHOLD_NS)
+        self.days = int(days[-1])
+        self.last_offset_ns = int(offsets[-1])
+        return self.base_ns + offsets + days * NS_PER_DAY
+
+    def convert(self, timestamps):
+        """Convert raw timestamps (with null bytes) to int64 nanoseconds since the epoch."""
+        return self.convert_clean(clean_timestamps(timestamps))
+
+def format_epoch_ns(epoch_ns):
+    """
+    Format int64 nanoseconds since the epoch the way str(pd.Timestamp) does (e.g.
+    '2025-03-06 11:53:28.280000', or '2025-03-06 11:53:28' on a whole second), in one step.
+    """
+    times = np.asarray(epoch_ns, dtype=np.int64).astype("datetime64[ns]")
+    with_fraction = np.datetime_as_string(times, unit="us")
+    whole_seconds = np.datetime_as_string(times, unit="s")
+    text = np.where(np.asarray(epoch_ns) % 10**9 == 0, whole_seconds, with_fraction)
+    return np.char.replace(text, "T", " ").tolist()
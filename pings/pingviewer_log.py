@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+import argparse
+import struct
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+# The message definitions and decoding engine are shared with the Omniscan 450 tools
+try:
+    from svlog_parser import MESSAGE_REGISTRY, Packet, ParseStats, add_stats_arguments, map_svlog_file, report_stats
+except ImportError:
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "omniscan450"))
+    from svlog_parser import MESSAGE_REGISTRY, Packet, ParseStats, add_stats_arguments, map_svlog_file, report_stats
+from decode_cache import add_cache_arguments, batched, block_to_packets, cache_from_args, packets_to_block
+from compressed_io import detect_compression, iter_decompressed_chunks, open_compressed
+
+"""
+    Reads the .bin files that PingViewer records, without needing Blue Robotics'
+    decode_sensor_binary_log.py. The messages are decoded by the same engine as the Omniscan 450
+    .svlog files (omniscan450/svlog_parser.py), which has the Ping1D (1211, 1212, 1300) and
+    Ping360 (2300, 2301) messages registered.
+
+    A .bin file is a Qt data stream (all integers big-endian):
+
+        header:  QString  "PingViewer sensor log file" (or similar)
+                 int32    version
+                 QString  hash_commit, date, tag, os_name, os_version
+                 int32    sensor_family, sensor_type     (version 2 and up)
+        records: QString  timestamp, 'hh:mm:ss.xxx' since the recording started
+                 QByteArray message, one whole Ping Protocol packet ("BR" ... checksum)
+
+    A QString is a 4-byte length followed by that many bytes of UTF-16, and a QByteArray is a
+    4-byte length followed by the bytes (a length of 0xFFFFFFFF means a null string/array).
+"""
+
+PING1D_IDS = {1211, 1212, 1300}
+PING360_IDS = {2300, 2301}
+
+_LENGTH = struct.Struct(">I")
+_INT = struct.Struct(">i")
+_NULL_LENGTH = 0xFFFFFFFF
+
+
+class PingViewerHeader:
+    """The build information at the start of a PingViewer .bin file."""
+
+    def __init__(self, header_string, version, hash_commit, date, tag, os_name, os_version, sensor_family=None, sensor_type=None):
+        self.header_string = header_string
+        self.version = version
+        self.hash_commit = hash_commit
+        self.date = date
+        self.tag = tag
+        self.os_name = os_name
+        self.os_version = os_version
+        self.sensor_family = sensor_family
+        self.sensor_type = sensor_type
+
+    def __repr__(self):
+        return (f"PingViewerHeader(version={self.version}, tag='{self.tag}', date='{self.date}', "
+                f"os='{self.os_name} {self.os_version}', sensor_family={self.sensor_family}, sensor_type={self.sensor_type})")
+
+
+def _read_bytes(data, pos):
+    """Read a length-prefixed byte array at pos. Returns (bytes, next position), or (None, pos) if the data runs out."""
+    if pos + 4 > len(data):
+        return None, pos
+    length = _LENGTH.unpack_from(data, pos)[0]
+    pos += 4
+    if length == _NULL_LENGTH:
+        return b"", pos
+    if pos + length > len(data):
+        return None, pos
+    return data[pos:pos + length], pos + length
+
+
+def _read_string(data, pos):
+    """Read a QString (UTF-16, big-endian) at pos. Returns (string, next position), or (None, pos) if the data runs out."""
+    raw, pos = _read_bytes(data, pos)
+    if raw is None:
+        return None, pos
+    return raw.decode("utf-16-be", errors="replace"), pos
+
+
+def read_header(data):
+    """
+    Read the header at the start of a .bin file.
+
+    Returns:
+        tuple: (PingViewerHeader, position of the first record)
+
+    Raises:
+        ValueError: If the data is too short to hold a header.
+    """
+    try:
+        pos = 0
+        header_string, pos = _read_string(data, pos)
+        version = _INT.unpack_from(data, pos)[0]
+        pos += 4
+        fields = []
+        for _ in range(5):  # hash_commit, date, tag, os_name, os_version
+            value, pos = _read_string(data, pos)
+            if value is None:
+                raise ValueError("Header is truncated")
+            fields.append(value)
+        sensor = []
+        if version >= 2:
+            sensor = [_INT.unpack_from(data, pos)[0], _INT.unpack_from(data, pos + 4)[0]]
+            pos += 8
+    except struct.error:
+        raise ValueError("Header is truncated")
+    if header_string is None:
+        raise ValueError("Header is truncated")
+    return PingViewerHeader(header_string, version, *fields, *sensor), pos
+
+
+def read_file_header(filename, sniff_size=4096):
+    """Read the header of a .bin file (compressed or not), reading only as much of the file as it takes."""
+    with open_compressed(filename) as file:
+        data = file.read(sniff_size)
+        while True:
+            try:
+                return read_header(data)[0]
+            except ValueError:
+                more = file.read(len(data))
+                if not more:
+                    raise
+                data += more
+
+
+def iter_records(data, pos):
+    """
+    Yield the records of a .bin file from pos (the end of the header) until the data runs out.
+    A record cut short at the end of the data is dropped.
+
+    Yields:
+        tuple: (timestamp string, message bytes)
+    """
+    while True:
+        timestamp, pos = _read_string(data, pos)
+        if timestamp is None:
+            return
+        message, pos = _read_bytes(data, pos)
+        if message is None:
+            return  # The recording stopped halfway through a record
+        yield timestamp, message
+
+
+class PingViewerLogReader:
+    """
+    Reader for PingViewer .bin files. A drop-in replacement for the PingViewerLogReader of
+    Blue Robotics' decode_sensor_binary_log.py: parser() yields (timestamp, message) pairs,
+    where each message has the fields of its type as attributes (e.g. message.distance).
+    Ping1D profile_data and Ping360 data come back as NumPy uint8 arrays.
+
+    Messages that are not a whole, valid packet (bad "BR", length or checksum) are skipped and
+    counted in self.corrupted. gzip, xz and zstd compressed files are read too, decompressing
+    on a background thread while the records are parsed (see omniscan450/compressed_io.py).
+
+    Example usage:
+        log = PingViewerLogReader("20250306-115328280.bin")
+        for timestamp, message in log.parser({1300}):
+            print(timestamp, message.distance, message.profile_data.mean())
+
+    Args:
+        filename: Path to the .bin file.
+        stats: Optional ParseStats, to collect the message bytes read, the messages tried and
+            found per message ID and sender, the failures and the time spent checking and decoding.
+        cache: Optional DecodeCache (see omniscan450/decode_cache.py). The valid packets found
+            for a set of message IDs are stored in it, and loaded from it the next time, in which
+            case nothing is parsed (so corrupted and stats count nothing).
+    """
+
+    def __init__(self, filename, stats=None, cache=None):
+        self.filename = filename
+        self.header = None  # Filled in once reading starts
+        self.corrupted = 0
+        self.stats = stats
+        self.cache = cache
+
+    def records(self):
+        """
+        Yield the raw records of the file.
+
+        Yields:
+            tuple: (timestamp string, message bytes)
+        """
+        if detect_compression(self.filename) is not None:
+            yield from self._stream_records()
+            return
+        with map_svlog_file(self.filename) as data:
+            self.header, pos = read_header(data)
+            yield from iter_records(data, pos)
+
+    def _stream_records(self):
+        """records(), for a compressed file: decompressed in chunks on a background thread, and parsed as they arrive."""
+        chunks = iter_decompressed_chunks(self.filename)
+        try:
+            data = b""
+            for chunk in chunks:
+                data += chunk
+                try:
+                    self.header, pos = read_header(data)
+                    break
+                except ValueError:
+                    continue  # The header runs on into the next chunk
+            else:
+                self.header, pos = read_header(data)  # Raises: the whole file is too short to hold a header
+            while True:
+                # Yield the whole records in data, then carry the rest over to the next chunk
+                while True:
+                    timestamp, next_pos = _read_string(data, pos)
+                    if timestamp is None:
+                        break
+                    message, next_pos = _read_bytes(data, next_pos)
+                    if message is None:
+                        break
+                    yield timestamp, message
+                    pos = next_pos
+                chunk = next(chunks, None)
+                if chunk is None:
+                    return  # Anything left over is a record cut short at the end of the file
+                data = data[pos:] + chunk
+                pos = 0
+        finally:
+            chunks.close()
+
+    def packets(self, message_ids=None):
+        """
+        Yield the valid packets of the file, with their header (e.g. packet.header.sender_id).
+
+        Args:
+            message_ids: Optional collection of message IDs to keep (default: every registered message).
+
+        Yields:
+            tuple: (timestamp string, Packet)
+        """
+        if isinstance(message_ids, int):
+            message_ids = {message_ids}
+        wanted = set(MESSAGE_REGISTRY) if message_ids is None else set(message_ids) & set(MESSAGE_REGISTRY)
+        if self.cache is None:
+            yield from self._parse(wanted)
+            return
+
+        def encode(batch):
+            block = packets_to_block([packet for _, packet in batch])
+            block["timestamps"] = np.array([timestamp.encode() for timestamp, _ in batch])
+            return block
+
+        def decode(block):
+            return zip([timestamp.decode() for timestamp in block["timestamps"].tolist()], block_to_packets(block))
+
+        self.header = read_file_header(self.filename)  # Cheap, and not cached
+        for batch in self.cache.blocks(self.filename, "pingviewer_packets", {"message_ids": wanted},
+                                       lambda: batched(self._parse(wanted)), encode, decode, compress=True):
+            yield from batch
+
+    def _parse(self, wanted):
+        """Yield (timestamp, Packet) for the valid packets of the wanted message IDs."""
+        if self.stats is not None:
+            yield from self._timed_packets(wanted)
+            return
+        for timestamp, message in self.records():
+            # Check the message ID straight from the bytes, before doing any decoding
+            if len(message) < 10 or message[:2] != b"BR":
+                self.corrupted += 1
+                continue
+            payload_length, message_id = struct.unpack_from("<HH", message, 2)
+            if message_id not in wanted:
+                continue
+            if len(message) < 8 + payload_length + 2:
+                self.corrupted += 1
+                continue
+            checksum = struct.unpack_from("<H", message, 8 + payload_length)[0]
+            if checksum != Packet.compute_checksum(message, 0, payload_length):
+                self.corrupted += 1
+                continue
+            try:
+                yield timestamp, Packet.from_frame(0, message, payload_length, checksum)
+            except (ValueError, struct.error):
+                self.corrupted += 1
+
+    def _timed_packets(self, wanted):
+        """packets(), also filling in self.stats. Kept separate so the plain loop pays nothing for it."""
+        stats = self.stats
+        timings = {"checksum": 0.0, "decode": 0.0}
+        decoded = 0
+        try:
+            for timestamp, message in self.records():
+                stats.bytes_scanned += len(message)
+                stats.candidates += 1
+                if len(message) < 10 or message[:2] != b"BR":
+                    self.corrupted += 1
+                    stats.truncated += len(message) < 10
+                    stats.bytes_skipped += len(message)
+                    continue
+                payload_length, message_id = struct.unpack_from("<HH", message, 2)
+                if message_id not in wanted:
+                    continue
+                if len(message) < 8 + payload_length + 2:
+                    self.corrupted += 1
+                    stats.truncated += 1
+                    stats.bytes_skipped += len(message)
+                    continue
+                started = time.perf_counter()
+                checksum = struct.unpack_from("<H", message, 8 + payload_length)[0]
+                valid = checksum == Packet.compute_checksum(message, 0, payload_length)
+                checked = time.perf_counter()
+                timings["checksum"] += checked - started
+                if not valid:
+                    self.corrupted += 1
+                    stats.checksum_failures += 1
+                    stats.bytes_skipped += len(message)
+                    continue
+                stats.count_packet(message_id, message[6])
+                try:
+                    packet = Packet.from_frame(0, message, payload_length, checksum)
+                except (ValueError, struct.error):
+                    self.corrupted += 1
+                    stats.decode_failures += 1
+                    continue
+                finally:
+                    timings["decode"] += time.perf_counter() - checked
+                decoded += 1
+                yield timestamp, packet
+        finally:
+            stats.add_time("checksum", timings["checksum"], stats.candidates)
+            stats.add_time("decode", timings["decode"], decoded)
+
+    def parser(self, message_ids=None):
+        """
+        Yield the decoded messages of the file.
+
+        Args:
+            message_ids: Optional collection of message IDs to keep (default: every registered message).
+
+        Yields:
+            tuple: (timestamp string, message payload)
+        """
+        for timestamp, packet in self.packets(message_ids):
+            yield timestamp, packet.payload
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize the contents of a PingViewer .bin file")
+    parser.add_argument("file", help="Input .bin file (may be gzip/xz/zstd compressed)")
+    parser.add_argument("-n", "--show", type=int, default=0, help="Also print the first N messages (default: 0)")
+    add_stats_arguments(parser)
+    args = parser.parse_args()
+
+    stats = ParseStats() if args.stats or args.json_stats else None
+    log = PingViewerLogReader(args.file, stats=stats)
+    counts = Counter()
+    for index, (timestamp, message) in enumerate(log.parser()):
+        counts[(message.message_id, message.message_type)] += 1
+        if index < args.show:
+            print(timestamp, message)
+
+    print(log.header)
+    for (message_id, message_type), count in sorted(counts.items()):
+        print(f"{message_id:>6}  {message_type:<28} {count}")
+    if log.corrupted:
+        print(f"{log.corrupted} corrupted messages skipped")
+    if stats is not None:
+        report_stats(args, stats)
+
+
+if __name__ == "__main__":
+    main()
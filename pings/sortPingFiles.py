@@ -1,54 +1,216 @@
 #!/usr/bin/env python3
+import argparse
+import json
 import os
 import shutil
+import struct
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from decode_sensor_binary_log import PingViewerLogReader
+from pingviewer_log import PING1D_IDS, PING360_IDS, iter_records, read_header
+from compressed_io import glob_logs, open_compressed
 
-def determine_file_type(file_path):
+"""
+    Sorts a folder of PingViewer .bin files into Ping1D and Ping360 folders.
+
+    A file is classified from the first Ping1D or Ping360 message ID found near its start, so
+    only the first few KB are read (more only if those hold no such message). Files are sniffed
+    on a pool of threads, and the result for each file is kept in a manifest (a JSON file,
+    keyed by path, with the size and modification time the result is valid for). Running the
+    sort again only reads the files that are new or have changed since.
+"""
+
+SNIFF_SIZE = 4096  # Bytes read first to find the first message
+MAX_SNIFF_SIZE = 1 << 20  # Give up on a file with no Ping1D/Ping360 message in its first 1 MB
+MANIFEST_NAME = ".ping_manifest.json"
+UNREADABLE = "unreadable"  # determine_file_type's result for a file that could not be read; never kept in the manifest
+
+def sniff_file_type(file_path, sniff_size=SNIFF_SIZE, max_sniff_size=MAX_SNIFF_SIZE):
     """
-    Try to open the bin file and inspect the first decoded message.
+    Read the start of a .bin file and look at the message ID of each record, without decoding it.
+
     Returns:
-      - "ping1D" if the first message's ID is in {1211, 1212, 1300}
+      - "ping1D" if the first Ping message ID is in {1211, 1212, 1300}
       - "ping360" if it is in {2300, 2301}
       - None if it cannot be determined.
     """
+    with open_compressed(file_path) as file:  # Compressed files are sniffed from their decompressed start
+        data = file.read(sniff_size)
+        while True:
+            try:
+                _, pos = read_header(data)
+                for _, message in iter_records(data, pos):
+                    if len(message) < 6 or message[:2] != b"BR":
+                        continue
+                    message_id = struct.unpack_from("<H", message, 4)[0]
+                    if message_id in PING1D_IDS:
+                        return "ping1D"
+                    if message_id in PING360_IDS:
+                        return "ping360"
+            except ValueError:
+                pass  # The header runs past what has been read so far
+            # Nothing found yet: read more of the file, if there is more
+            if len(data) >= max_sniff_size:
+                return None
+            more = file.read(len(data))
+            if not more:
+                return None
+            data += more
+
+def determine_file_type(file_path):
+    """
+    Classify one .bin file (see sniff_file_type), printing rather than raising any error, so
+    that one bad file (unreadable, a truncated or corrupt archive, zstd without zstandard, ...)
+    does not stop the sort.
+
+    Returns:
+        The file type, None if it cannot be determined, or UNREADABLE if the file could not be read.
+    """
     try:
-        # Create a log reader for the file.
-        log = PingViewerLogReader(str(file_path))
-        for timestamp, decoded_message in log.parser():
-            mid = decoded_message.message_id
-            if mid in {1211, 1212, 1300}:
-                return "ping1D"
-            elif mid in {2300, 2301}:
-                return "ping360"
-            # If the first message doesn't match either set, continue looking.
+        return sniff_file_type(file_path)
     except Exception as e:
-        print(f"Error processing {file_path}: {e}")
-    return None
+        print(f"Error processing {file_path}: {type(e).__name__}: {e}")
+    return UNREADABLE
+
+def load_manifest(manifest_path):
+    """Load the manifest of earlier classifications: {path: {"size", "mtime_ns", "file_type"}}."""
+    try:
+        with open(manifest_path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(manifest_path, manifest):
+    """Write the manifest, replacing the old one only once the new one is completely written."""
+    temporary = Path(str(manifest_path) + ".tmp")
+    with open(temporary, "w") as file:
+        json.dump(manifest, file, indent=1, sort_keys=True)
+    os.replace(temporary, manifest_path)
+
+def classify_files(paths, manifest, jobs=8):
+    """
+    Classify files, using the manifest for every file whose size and mtime have not changed,
+    and sniffing the rest on a pool of threads. The manifest is updated in place.
+
+    Returns:
+        tuple: ({path: file type}, number of files that had to be read)
+    """
+    results = {}
+    to_sniff = []
+    for path in paths:
+        stat = path.stat()
+        entry = manifest.get(str(path))
+        if entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            results[path] = entry["file_type"]
+        else:
+            to_sniff.append((path, stat))
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for (path, stat), file_type in zip(to_sniff, executor.map(determine_file_type, [path for path, _ in to_sniff])):
+            if file_type == UNREADABLE:
+                results[path] = None  # Unknown this time, and read again next time (e.g. once zstandard is installed)
+                manifest.pop(str(path), None)
+                continue
+            results[path] = file_type
+            manifest[str(path)] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "file_type": file_type}
+    return results, len(to_sniff)
+
+def move_file(source, destination_folder, manifest, copy=False):
+    """
+    Move (or copy) a file into a folder, carrying its manifest entry over to the new path.
+
+    A copy is skipped if the folder already holds the file with the same size and modification
+    time (copies keep the modification time), so sorting again with --copy doesn't copy
+    everything again.
+
+    Returns:
+        bool: True if the file was moved or copied, False if it was already there.
+
+    Raises:
+        FileExistsError: If the folder already holds a file of the same name (other than an
+            earlier copy of this one, when copying). Nothing is overwritten.
+    """
+    destination = destination_folder / source.name
+    if destination == source:
+        return False  # Already sorted
+    if destination.exists():
+        source_stat, destination_stat = source.stat(), destination.stat()
+        if not (copy and source_stat.st_size == destination_stat.st_size
+                and source_stat.st_mtime_ns == destination_stat.st_mtime_ns):
+            raise FileExistsError(f"{destination} already exists")
+        done = False  # Copied by an earlier run
+    elif copy:
+        shutil.copy2(str(source), str(destination))
+        done = True
+    else:
+        shutil.move(str(source), str(destination))
+        done = True
+    entry = manifest.get(str(source)) if copy else manifest.pop(str(source), None)
+    if entry is not None:
+        stat = destination.stat()
+        manifest[str(destination)] = dict(entry, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+    return done
 
 def main():
-    # Define folder paths (update these paths to your actual folders)
-    input_folder = "/Users/courtneyanderson/Downloads/projects/BlueRov/KeckTest/Data/PingView"
-    output_folder_ping1D = "/Users/courtneyanderson/Downloads/projects/BlueRov/KeckTest/Data/1D"
-    output_folder_ping360 = "/Users/courtneyanderson/Downloads/projects/BlueRov/KeckTest/Data/360"
-
-    # Create output folders if they don't exist.
-    os.makedirs(output_folder_ping1D, exist_ok=True)
-    os.makedirs(output_folder_ping360, exist_ok=True)
-
-    # Loop over all .bin files in the input folder.
-    for file_path in Path(input_folder).glob("*.bin"):
-        file_type = determine_file_type(file_path)
-        if file_type == "ping1D":
-            dest = Path(output_folder_ping1D) / file_path.name
-            shutil.move(str(file_path), str(dest))
-            print(f"Moved {file_path.name} to {output_folder_ping1D}")
-        elif file_type == "ping360":
-            dest = Path(output_folder_ping360) / file_path.name
-            shutil.move(str(file_path), str(dest))
-            print(f"Moved {file_path.name} to {output_folder_ping360}")
+    parser = argparse.ArgumentParser(
+        description="Sort PingViewer .bin files into Ping1D and Ping360 folders, by the first message in each file"
+    )
+    parser.add_argument("folder", help="Folder containing .bin files")
+    parser.add_argument("--ping1d", default=None, help="Output folder for Ping1D files (default: <folder>/1D)")
+    parser.add_argument("--ping360", default=None, help="Output folder for Ping360 files (default: <folder>/360)")
+    parser.add_argument("-r", "--recursive", action="store_true",
+                        help="Also look in subfolders (files already in the output folders are left where they are)")
+    parser.add_argument("-j", "--jobs", type=int, default=8, help="Number of files to read at once (default: 8)")
+    parser.add_argument("--copy", action="store_true", help="Copy the files instead of moving them")
+    parser.add_argument("--dry-run", action="store_true", help="Only print where each file would go")
+    parser.add_argument("--manifest", default=None,
+                        help=f"Manifest file caching the classification of each file (default: <folder>/{MANIFEST_NAME})")
+    args = parser.parse_args()
+
+    folder = Path(args.folder).resolve()
+    output_folders = {
+        "ping1D": Path(args.ping1d).resolve() if args.ping1d else folder / "1D",
+        "ping360": Path(args.ping360).resolve() if args.ping360 else folder / "360",
+    }
+    manifest_path = Path(args.manifest) if args.manifest else folder / MANIFEST_NAME
+    manifest = load_manifest(manifest_path)
+
+    paths = glob_logs(folder, "*.bin", args.recursive)  # Also .bin.gz, .bin.xz and .bin.zst
+    results, sniffed = classify_files(paths, manifest, args.jobs)
+    print(f"Classified {len(paths)} files ({sniffed} read, {len(paths) - sniffed} from the manifest)")
+
+    if not args.dry_run:
+        for output_folder in output_folders.values():
+            output_folder.mkdir(parents=True, exist_ok=True)
+
+    moved = 0
+    unknown = 0
+    clashes = 0
+    for path in paths:
+        file_type = results[path]
+        if file_type is None:
+            print(f"Could not determine file type for {path.name}")
+            unknown += 1
+            continue
+        output_folder = output_folders[file_type]
+        if path.parent == output_folder:
+            continue
+        if args.dry_run:
+            print(f"Would move {path.name} to {output_folder}")
         else:
-            print(f"Could not determine file type for {file_path.name}")
+            try:
+                if not move_file(path, output_folder, manifest, args.copy):
+                    continue
+            except FileExistsError as e:
+                print(f"Skipped {path.name}: {e}")  # Never overwrite a different file of the same name
+                clashes += 1
+                continue
+            print(f"{'Copied' if args.copy else 'Moved'} {path.name} to {output_folder}")
+        moved += 1
+
+    if not args.dry_run:
+        save_manifest(manifest_path, manifest)
+    print(f"{moved} files {'to sort' if args.dry_run else 'sorted'}, {unknown} unknown, {clashes} name clashes, "
+          f"{len(paths) - moved - unknown - clashes} already in place")
 
 if __name__ == "__main__":
     main()
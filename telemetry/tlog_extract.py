@@ -0,0 +1,570 @@
+#!/usr/bin/env python3
+import argparse
+import bisect
+import mmap
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+
+# Compressed logs are read with the helpers shared with the Omniscan 450 tools
+try:
+    from compressed_io import detect_compression, glob_logs, iter_decompressed_chunks, strip_compression_suffix
+except ImportError:
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "omniscan450"))
+    from compressed_io import detect_compression, glob_logs, iter_decompressed_chunks, strip_compression_suffix
+
+"""
+    Extracts MAVLink messages from QGroundControl .tlog files straight into NumPy arrays, in one
+    pass over each file and without pymavlink or mavlogdump.py.
+
+    A .tlog file is a sequence of records, each one:
+
+        8 bytes     Time the message was received, in microseconds since 1970 (big-endian)
+        ...         One MAVLink frame, either
+                        v1: 0xFE, len, seq, sysid, compid, msgid,                    payload, crc (2)
+                        v2: 0xFD, len, incompat, compat, seq, sysid, compid, msgid (3), payload, crc (2),
+                            signature (13, only if incompat & 0x01)
+
+    The frames are found with NumPy, 16 MB of the file at a time: every 0xFE/0xFD byte is a
+    candidate, the candidates' lengths say where the next record should start, and the scan
+    follows that chain from one frame to the next (skipping ahead to the next valid candidate
+    if the chain breaks). Only the requested message types are decoded: their CRCs are checked
+    (with each type's CRC_EXTRA), and their payloads are gathered into a 2-D byte array per type
+    and viewed as a structured array. MAVLink v2 trims trailing zero bytes from payloads, so
+    short payloads are padded with zeros first.
+
+    Fields are listed in wire order: MAVLink sorts them by type size (largest first), and
+    appends extension fields after the rest, in the order they were added. See
+    https://mavlink.io/en/messages/common.html and https://mavlink.io/en/guide/serialization.html
+"""
+
+# ==========================================================================
+# Section: Defining the MAVLink message types we know how to decode
+# ==========================================================================
+
+class MessageType:
+    """
+    A MAVLink message type: its ID, CRC_EXTRA and payload layout.
+
+    Args:
+        name: Message name, e.g. "ATTITUDE".
+        msg_id: Message ID.
+        crc_extra: The CRC_EXTRA byte of the message definition.
+        fields: List of (name, NumPy type[, shape]) in wire order.
+        extensions: Extension fields (MAVLink 2 only), in the order they were added.
+    """
+
+    def __init__(self, name, msg_id, crc_extra, fields, extensions=()):
+        self.name = name
+        self.msg_id = msg_id
+        self.crc_extra = crc_extra
+        self.dtype = np.dtype(list(fields) + list(extensions))
+        self.base_length = np.dtype(list(fields)).itemsize  # Payload length without extensions (the MAVLink 1 length)
+        self.length = self.dtype.itemsize  # Full payload length
+
+    def __repr__(self):
+        return f"MessageType({self.name}, id={self.msg_id}, fields={list(self.dtype.names)})"
+
+
+MESSAGE_TYPES = {message_type.name: message_type for message_type in [
+    MessageType("HEARTBEAT", 0, 50, [
+        ("custom_mode", "<u4"), ("type", "u1"), ("autopilot", "u1"), ("base_mode", "u1"),
+        ("system_status", "u1"), ("mavlink_version", "u1")]),
+    MessageType("SYSTEM_TIME", 2, 137, [
+        ("time_unix_usec", "<u8"), ("time_boot_ms", "<u4")]),
+    MessageType("GPS_RAW_INT", 24, 24, [
+        ("time_usec", "<u8"), ("lat", "<i4"), ("lon", "<i4"), ("alt", "<i4"), ("eph", "<u2"), ("epv", "<u2"),
+        ("vel", "<u2"), ("cog", "<u2"), ("fix_type", "u1"), ("satellites_visible", "u1")], [
+        ("alt_ellipsoid", "<i4"), ("h_acc", "<u4"), ("v_acc", "<u4"), ("vel_acc", "<u4"), ("hdg_acc", "<u4"), ("yaw", "<u2")]),
+    MessageType("RAW_IMU", 27, 144, [
+        ("time_usec", "<u8"), ("xacc", "<i2"), ("yacc", "<i2"), ("zacc", "<i2"), ("xgyro", "<i2"), ("ygyro", "<i2"),
+        ("zgyro", "<i2"), ("xmag", "<i2"), ("ymag", "<i2"), ("zmag", "<i2")], [
+        ("id", "u1"), ("temperature", "<i2")]),
+    MessageType("SCALED_PRESSURE", 29, 115, [
+        ("time_boot_ms", "<u4"), ("press_abs", "<f4"), ("press_diff", "<f4"), ("temperature", "<i2")], [
+        ("temperature_press_diff", "<i2")]),
+    MessageType("ATTITUDE", 30, 39, [
+        ("time_boot_ms", "<u4"), ("roll", "<f4"), ("pitch", "<f4"), ("yaw", "<f4"),
+        ("rollspeed", "<f4"), ("pitchspeed", "<f4"), ("yawspeed", "<f4")]),
+    MessageType("GLOBAL_POSITION_INT", 33, 104, [
+        ("time_boot_ms", "<u4"), ("lat", "<i4"), ("lon", "<i4"), ("alt", "<i4"), ("relative_alt", "<i4"),
+        ("vx", "<i2"), ("vy", "<i2"), ("vz", "<i2"), ("hdg", "<u2")]),
+    MessageType("VFR_HUD", 74, 20, [
+        ("airspeed", "<f4"), ("groundspeed", "<f4"), ("alt", "<f4"), ("climb", "<f4"), ("heading", "<i2"), ("throttle", "<u2")]),
+    MessageType("TIMESYNC", 111, 34, [
+        ("tc1", "<i8"), ("ts1", "<i8")], [
+        ("target_system", "u1"), ("target_component", "u1")]),
+    MessageType("SCALED_IMU2", 116, 76, [
+        ("time_boot_ms", "<u4"), ("xacc", "<i2"), ("yacc", "<i2"), ("zacc", "<i2"), ("xgyro", "<i2"), ("ygyro", "<i2"),
+        ("zgyro", "<i2"), ("xmag", "<i2"), ("ymag", "<i2"), ("zmag", "<i2")], [
+        ("temperature", "<i2")]),
+    MessageType("DISTANCE_SENSOR", 132, 85, [
+        ("time_boot_ms", "<u4"), ("min_distance", "<u2"), ("max_distance", "<u2"), ("current_distance", "<u2"),
+        ("type", "u1"), ("id", "u1"), ("orientation", "u1"), ("covariance", "u1")], [
+        ("horizontal_fov", "<f4"), ("vertical_fov", "<f4"), ("quaternion", "<f4", (4,)), ("signal_quality", "u1")]),
+    MessageType("SCALED_PRESSURE2", 137, 195, [
+        ("time_boot_ms", "<u4"), ("press_abs", "<f4"), ("press_diff", "<f4"), ("temperature", "<i2")], [
+        ("temperature_press_diff", "<i2")]),
+    MessageType("AHRS", 163, 127, [
+        ("omegaIx", "<f4"), ("omegaIy", "<f4"), ("omegaIz", "<f4"), ("accel_weight", "<f4"),
+        ("renorm_val", "<f4"), ("error_rp", "<f4"), ("error_yaw", "<f4")]),
+    MessageType("RANGEFINDER", 173, 83, [
+        ("distance", "<f4"), ("voltage", "<f4")]),
+    MessageType("AHRS2", 178, 47, [
+        ("roll", "<f4"), ("pitch", "<f4"), ("yaw", "<f4"), ("altitude", "<f4"), ("lat", "<i4"), ("lng", "<i4")]),
+    MessageType("EKF_STATUS_REPORT", 193, 71, [
+        ("velocity_variance", "<f4"), ("pos_horiz_variance", "<f4"), ("pos_vert_variance", "<f4"),
+        ("compass_variance", "<f4"), ("terrain_alt_variance", "<f4"), ("flags", "<u2")], [
+        ("airspeed_variance", "<f4")]),
+]}
+
+DEFAULT_TYPES = ["TIMESYNC", "RAW_IMU", "ATTITUDE", "SCALED_IMU2"]
+
+# ==========================================================================
+# Section: MAVLink framing and CRC
+# ==========================================================================
+
+MAGIC_V1 = 0xFE
+MAGIC_V2 = 0xFD
+SIGNATURE_LENGTH = 13
+MAX_FRAME_SIZE = 10 + 255 + 2 + SIGNATURE_LENGTH  # Largest possible (signed, v2) frame
+TIMESTAMP_SIZE = 8
+
+def _crc_accumulate(crc, byte):
+    """One step of the X.25 (CRC-16/MCRF4XX) checksum MAVLink uses. Works on ints or NumPy arrays."""
+    tmp = (byte ^ (crc & 0xFF))
+    tmp = (tmp ^ (tmp << 4)) & 0xFF
+    return ((crc >> 8) ^ (tmp << 8) ^ (tmp << 3) ^ (tmp >> 4)) & 0xFFFF
+
+def x25_crc(data, crc_extra):
+    """MAVLink checksum of data (the frame without its magic byte and checksum) followed by the CRC_EXTRA byte."""
+    crc = 0xFFFF
+    for byte in data:
+        crc = _crc_accumulate(crc, byte)
+    return _crc_accumulate(crc, crc_extra)
+
+def x25_crc_rows(rows, crc_extra):
+    """
+    Vectorized x25_crc: the checksum of each row of a 2-D uint8 array, all rows at once.
+
+    Args:
+        rows: (frames x bytes) uint8 array, one frame (without magic byte and checksum) per row.
+        crc_extra: The CRC_EXTRA byte of each row.
+
+    Returns:
+        np.ndarray: The checksum of each row.
+    """
+    crc = np.full(len(rows), 0xFFFF, dtype=np.uint32)
+    for column in rows.T.astype(np.uint32):
+        crc = _crc_accumulate(crc, column)
+    return _crc_accumulate(crc, np.asarray(crc_extra, dtype=np.uint32))
+
+def encode_frame(message_type, values, version=2, seq=0, system_id=1, component_id=1):
+    """
+    Build a MAVLink frame, e.g. to make synthetic .tlog files for testing.
+
+    Args:
+        message_type: A MessageType (or its name).
+        values: {field name: value}. Missing fields are zero.
+        version: 1 or 2. Version 2 trims trailing zero bytes from the payload (but keeps at least one).
+
+    Returns:
+        bytes: The frame.
+    """
+    if isinstance(message_type, str):
+        message_type = MESSAGE_TYPES[message_type]
+    record = np.zeros(1, dtype=message_type.dtype)
+    for name, value in values.items():
+        record[name] = value
+    payload = record.tobytes()
+    if version == 1:
+        payload = payload[:message_type.base_length]
+        header = bytes([MAGIC_V1, len(payload), seq & 0xFF, system_id, component_id, message_type.msg_id])
+    else:
+        payload = payload.rstrip(b"\x00") or b"\x00"
+        header = bytes([MAGIC_V2, len(payload), 0, 0, seq & 0xFF, system_id, component_id]) + message_type.msg_id.to_bytes(3, "little")
+    crc = x25_crc(header[1:] + payload, message_type.crc_extra)
+    return header + payload + crc.to_bytes(2, "little")
+
+def encode_record(timestamp_us, frame):
+    """Build a .tlog record: the big-endian timestamp (us since 1970) followed by the frame."""
+    return int(timestamp_us).to_bytes(TIMESTAMP_SIZE, "big") + frame
+
+# ==========================================================================
+# Section: Scanning a .tlog file
+# ==========================================================================
+
+class TlogScanner:
+    """
+    Finds the frames of a .tlog file and decodes those of the requested types.
+
+    Counters (summed over every scan):
+        frames: Frames found, of any type.
+        decoded: Frames of the requested types decoded.
+        crc_failures: Frames of the requested types dropped for a bad checksum.
+        bytes_skipped: Bytes skipped while resyncing after a broken record.
+
+    Args:
+        types: Names of the message types to decode (see MESSAGE_TYPES).
+    """
+
+    CHUNK_SIZE = 1 << 24  # Candidates are examined 16 MB at a time
+
+    def __init__(self, types):
+        unknown = [name for name in types if name not in MESSAGE_TYPES]
+        if unknown:
+            raise ValueError(f"Unknown message types {unknown}; known types are {sorted(MESSAGE_TYPES)}")
+        self.types = {MESSAGE_TYPES[name].msg_id: MESSAGE_TYPES[name] for name in types}
+        self._wanted_ids = np.array(sorted(self.types), dtype=np.int64)
+        self._crc_extras = np.array([self.types[msg_id].crc_extra for msg_id in self._wanted_ids], dtype=np.uint32)
+        self.frames = 0
+        self.decoded = 0
+        self.crc_failures = 0
+        self.bytes_skipped = 0
+
+    def scan(self, data):
+        """
+        Scan a whole .tlog file.
+
+        Args:
+            data: The file contents (bytes, or an mmap).
+
+        Returns:
+            dict: {type name: {column name: np.ndarray}}, with a "timestamp_us" (the tlog receive
+                time), "system_id" and "component_id" column besides the message fields. Types that
+                were not found have empty columns.
+        """
+        return self.collect(self.scan_blocks(data))
+
+    def collect(self, blocks):
+        """Join the blocks yielded by scan_blocks or scan_stream into the tables scan() returns."""
+        pieces = {msg_id: [] for msg_id in self.types}
+        for block in blocks:
+            for msg_id, message_type in self.types.items():
+                if len(block[message_type.name]["timestamp_us"]):
+                    pieces[msg_id].append(block[message_type.name])
+        return {message_type.name: self._columns(message_type, pieces[msg_id]) for msg_id, message_type in self.types.items()}
+
+    def scan_blocks(self, data):
+        """
+        Scan a .tlog file one chunk at a time, so that only one chunk's messages are held in memory.
+
+        Yields:
+            dict: {type name: {column name: np.ndarray}} for the messages of each chunk, in the same
+                form as scan() returns for the whole file.
+        """
+        start = 0
+        expected = TIMESTAMP_SIZE  # Where the first frame should start
+        while start < len(data):
+            pieces = {msg_id: [] for msg_id in self.types}
+            start, expected = self._scan_chunk(data, start, min(start + self.CHUNK_SIZE, len(data)), expected, pieces)
+            yield {message_type.name: self._columns(message_type, pieces[msg_id]) for msg_id, message_type in self.types.items()}
+
+    def scan_stream(self, chunks):
+        """
+        Like scan_blocks, for a file that arrives as a stream of byte chunks (e.g. from a
+        decompressor). Only the part of the stream that the next chunk scanned still needs is
+        kept, and the blocks are the same as scan_blocks would yield for the whole file. If the
+        stream fails part-way (e.g. a truncated archive), what arrived before the failure is
+        scanned before its error is raised.
+
+        Args:
+            chunks: Iterable of bytes objects.
+
+        Yields:
+            dict: {type name: {column name: np.ndarray}} for the messages of each chunk.
+        """
+        chunks = iter(chunks)
+        buffer = b""
+        offset = 0  # Position in the file of buffer[0]
+        start = 0
+        expected = TIMESTAMP_SIZE
+        done = False
+        error = None
+        while True:
+            # Read until the buffer holds the chunk to scan and a whole frame after it, or the file ends
+            parts = [buffer]
+            size = len(buffer)
+            while not done and size < start - offset + self.CHUNK_SIZE + MAX_FRAME_SIZE:
+                try:
+                    chunk = next(chunks, None)
+                except Exception as e:
+                    chunk, error = None, e
+                if chunk is None:
+                    done = True
+                else:
+                    parts.append(chunk)
+                    size += len(chunk)
+            buffer = b"".join(parts)
+            if start >= offset + len(buffer):
+                if error is not None:
+                    raise error
+                return
+            # The chunk is scanned with positions relative to the buffer
+            stop = min(start + self.CHUNK_SIZE, offset + len(buffer))
+            pieces = {msg_id: [] for msg_id in self.types}
+            start, expected = self._scan_chunk(buffer, start - offset, stop - offset, expected - offset, pieces)
+            start += offset
+            expected += offset
+            yield {message_type.name: self._columns(message_type, pieces[msg_id]) for msg_id, message_type in self.types.items()}
+            # Keep the timestamp in front of the next chunk, and everything after it
+            drop = max(0, start - TIMESTAMP_SIZE - offset)
+            buffer = buffer[drop:]
+            offset += drop
+
+    def _scan_chunk(self, data, start, stop, expected, pieces):
+        # The window reaches back for the timestamp of a frame at start, and forward for a frame that starts before stop.
+        # It is a copy of that part of the file, so no view of the file outlives the scan.
+        base = max(0, start - TIMESTAMP_SIZE)
+        end = min(stop + MAX_FRAME_SIZE, len(data))
+        window = np.frombuffer(data[base:end], dtype=np.uint8)
+        candidates = np.flatnonzero((window == MAGIC_V1) | (window == MAGIC_V2))
+        candidates = candidates[(candidates + base >= max(start, TIMESTAMP_SIZE)) & (candidates + base < stop)]
+        if len(candidates) == 0:
+            return stop, expected
+
+        # Read every candidate's header (indices are clipped, and anything that runs off the window marked as not fitting)
+        last = len(window) - 1
+        def byte_at(offset):
+            return window[np.minimum(candidates + offset, last)].astype(np.int64)
+        v2 = window[candidates] == MAGIC_V2
+        payload_length = byte_at(1)
+        header_length = np.where(v2, 10, 6)
+        signed = v2 & ((byte_at(2) & 0x01) != 0)
+        frame_length = header_length + payload_length + 2 + np.where(signed, SIGNATURE_LENGTH, 0)
+        msg_id = np.where(v2, byte_at(7) | (byte_at(8) << 8) | (byte_at(9) << 16), byte_at(5))
+        valid = candidates + frame_length <= len(window)
+
+        # Check the CRC of the frames of the requested types, grouped by length so each group is one 2-D array
+        type_index = np.searchsorted(self._wanted_ids, msg_id)
+        wanted = valid & (type_index < len(self._wanted_ids))
+        wanted[wanted] = self._wanted_ids[type_index[wanted]] == msg_id[wanted]
+        crc_length = header_length - 1 + payload_length  # Checked bytes: everything between the magic byte and the checksum
+        failed = []
+        for length in np.unique(crc_length[wanted]).tolist():
+            group = np.flatnonzero(wanted & (crc_length == length))
+            rows = window[candidates[group, None] + 1 + np.arange(length)]
+            stored = window[candidates[group] + 1 + length].astype(np.uint32) | (window[candidates[group] + 2 + length].astype(np.uint32) << 8)
+            bad = group[x25_crc_rows(rows, self._crc_extras[type_index[group]]) != stored]
+            valid[bad] = False
+            wanted[bad] = False
+            failed.extend(zip((candidates[bad] + base).tolist(), (candidates[bad] + base + frame_length[bad] + TIMESTAMP_SIZE).tolist()))
+        failed = dict(failed)  # Frames of the requested types with a bad checksum: {position: where the next record would start}
+
+        # Follow the chain from each frame to the next record. When it breaks, the last frame may have been a false
+        # lock (only the requested types' checksums can be checked), so unless it was verified it is dropped, and the
+        # scan resumes at the next valid candidate after it.
+        valid_index = np.flatnonzero(valid)
+        positions = candidates[valid_index] + base
+        next_positions = positions + frame_length[valid_index] + TIMESTAMP_SIZE
+        following = np.searchsorted(positions, next_positions).tolist()
+        verified = wanted[valid_index]
+        # A verified frame can't start inside another frame, so a frame that would jump over one is a false lock
+        verified_positions = positions[verified]
+        after = np.searchsorted(verified_positions, positions, side="right")
+        if len(verified_positions):
+            overshoots = (after < len(verified_positions)) & (verified_positions[np.minimum(after, len(verified_positions) - 1)] < next_positions)
+            overshoots = (overshoots & ~verified).tolist()
+        else:
+            overshoots = [False] * len(positions)
+        verified = verified.tolist()
+        position_list = positions.tolist()
+        next_list = next_positions.tolist()
+        first_expected = expected
+        k = int(np.searchsorted(positions, expected))
+        accepted = []
+        while k < len(position_list):
+            if position_list[k] != expected:
+                if expected in failed:
+                    # The chain leads to a frame with a bad checksum: step over it, and carry on from the record after it
+                    self.crc_failures += 1
+                    expected = failed[expected]
+                    k = bisect.bisect_left(position_list, expected)
+                    continue
+                if accepted and not verified[accepted[-1]]:
+                    k = accepted.pop() + 1
+                    expected = position_list[k] if k < len(position_list) else position_list[k - 1] + 1
+                    continue
+            if overshoots[k]:
+                k += 1
+                expected = position_list[k] if k < len(position_list) else expected
+                continue
+            accepted.append(k)
+            expected = next_list[k]
+            k = following[k]
+
+        # An unverified last frame can only be confirmed by the next chunk, so it is left for the next chunk to scan again
+        next_start = stop
+        if accepted and not verified[accepted[-1]] and position_list[accepted[-1]] > start:
+            next_start = expected = position_list[accepted.pop()]
+        self.frames += len(accepted)
+
+        # Count the bytes skipped between frames
+        if accepted:
+            gap_starts = np.concatenate([[first_expected], next_positions[accepted[:-1]]])
+            self.bytes_skipped += int((positions[accepted] - gap_starts).sum())
+
+        # Decode the accepted frames of each requested type
+        accepted = valid_index[accepted]
+        accepted = accepted[wanted[accepted]]
+        for msg_id_value in np.unique(msg_id[accepted]).tolist():
+            selection = accepted[msg_id[accepted] == msg_id_value]
+            pieces[msg_id_value].append(self._decode(window, self.types[msg_id_value], candidates[selection], v2[selection],
+                                                     header_length[selection], payload_length[selection]))
+            self.decoded += len(selection)
+        return next_start, expected
+
+    @staticmethod
+    def _decode(window, message_type, positions, v2, header_length, payload_length):
+        """Gather the payloads of one type's frames into a zero-padded 2-D array, and view it as a structured array."""
+        columns = np.arange(message_type.length)
+        lengths = np.minimum(payload_length, message_type.length)
+        present = columns < lengths[:, None]
+        payloads = np.zeros((len(positions), message_type.length), dtype=np.uint8)
+        payloads[present] = window[((positions + header_length)[:, None] + columns)[present]]
+        records = payloads.view(message_type.dtype).ravel()
+
+        timestamps = window[(positions - TIMESTAMP_SIZE)[:, None] + np.arange(TIMESTAMP_SIZE)]
+        columns = {"timestamp_us": np.ascontiguousarray(timestamps).view(">u8").ravel().astype(np.uint64)}
+        columns["system_id"] = window[positions + np.where(v2, 5, 3)]
+        columns["component_id"] = window[positions + np.where(v2, 6, 4)]
+        for name in message_type.dtype.names:
+            columns[name] = records[name].copy()
+        return columns
+
+    @staticmethod
+    def _columns(message_type, pieces):
+        if not pieces:
+            empty = np.zeros(0, dtype=message_type.dtype)
+            columns = {"timestamp_us": np.zeros(0, dtype=np.uint64), "system_id": np.zeros(0, dtype=np.uint8),
+                       "component_id": np.zeros(0, dtype=np.uint8)}
+            columns.update((name, empty[name].copy()) for name in message_type.dtype.names)
+            return columns
+        return {name: np.concatenate([piece[name] for piece in pieces]) for name in pieces[0]}
+
+    def summary(self):
+        return (f"{self.frames} frames, {self.decoded} decoded, {self.crc_failures} checksum failures, "
+                f"{self.bytes_skipped} bytes skipped while resyncing")
+
+# ==========================================================================
+# Section: Extracting whole files
+# ==========================================================================
+
+def extract_tlog(filename, types=DEFAULT_TYPES, scanner=None):
+    """
+    Extract the messages of the given types from a .tlog file.
+
+    Example usage:
+        tables = extract_tlog("flight.tlog", ["ATTITUDE", "RAW_IMU"])
+        tables["ATTITUDE"]["roll"]          # float32 array, one value per message
+        tables["ATTITUDE"]["timestamp_us"]  # when each message was received
+
+    Args:
+        filename: Path to the .tlog file. A gzip, xz or zstd compressed file is decompressed on
+            a background thread while it is scanned.
+        types: Names of the message types to decode.
+        scanner: Optional TlogScanner to use (e.g. to read its counters afterwards).
+
+    Returns:
+        dict: {type name: {column name: np.ndarray}}
+    """
+    scanner = scanner or TlogScanner(types)
+    if detect_compression(filename) is not None:
+        return scanner.collect(scanner.scan_stream(iter_decompressed_chunks(filename)))
+    with open(filename, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return scanner.scan(b"")
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return scanner.scan(data)
+
+def iter_tlog_blocks(filename, types=DEFAULT_TYPES, scanner=None):
+    """
+    Like extract_tlog, but yields the messages one 16 MB chunk of the file at a time (see
+    TlogScanner.scan_blocks), so memory use does not grow with the length of the log.
+    """
+    scanner = scanner or TlogScanner(types)
+    if detect_compression(filename) is not None:
+        yield from scanner.scan_stream(iter_decompressed_chunks(filename))
+        return
+    with open(filename, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield from scanner.scan_blocks(data)
+
+def save_npz(tables, output_npz):
+    """Save extracted tables to one .npz file, with keys "<TYPE>.<column>" (e.g. "ATTITUDE.roll")."""
+    np.savez(output_npz, **{f"{type_name}.{column}": values for type_name, table in tables.items() for column, values in table.items()})
+
+def load_npz(input_npz):
+    """Load a .npz file written by save_npz back into {type name: {column name: np.ndarray}}."""
+    tables = {}
+    with np.load(input_npz) as data:
+        for key in data.files:
+            type_name, column = key.split(".", 1)
+            tables.setdefault(type_name, {})[column] = data[key]
+    return tables
+
+def extract_to_npz(input_tlog, output_npz, types):
+    """Worker: extract one file. Returns (input path, {type: count}, scanner summary, error or None, seconds taken)."""
+    start = time.perf_counter()
+    try:
+        scanner = TlogScanner(types)
+        tables = extract_tlog(input_tlog, types, scanner)
+        save_npz(tables, output_npz)
+        counts = {type_name: len(table["timestamp_us"]) for type_name, table in tables.items()}
+        return input_tlog, counts, scanner.summary(), None, time.perf_counter() - start
+    except Exception:
+        return input_tlog, {}, "", traceback.format_exc(limit=3), time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Extract MAVLink messages from .tlog files into .npz files of NumPy arrays (one array per field)"
+    )
+    parser.add_argument("inputs", nargs="+", help=".tlog files, or folders containing .tlog files (compressed ones too)")
+    parser.add_argument("-o", "--output", default=None, help="Output folder (default: next to each .tlog file)")
+    parser.add_argument("--types", default=",".join(DEFAULT_TYPES),
+                        help=f"Comma-separated message types to extract (default: {','.join(DEFAULT_TYPES)}). "
+                             f"Known types: {','.join(sorted(MESSAGE_TYPES))}")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="Number of files to extract in parallel (default: number of CPUs)")
+    parser.add_argument("--force", action="store_true", help="Extract every file, even if its .npz is already newer than the .tlog file")
+    args = parser.parse_args()
+
+    types = [name.strip().upper() for name in args.types.split(",") if name.strip()]
+    unknown = [name for name in types if name not in MESSAGE_TYPES]
+    if unknown:
+        parser.error(f"unknown message types {','.join(unknown)} (known types: {','.join(sorted(MESSAGE_TYPES))})")
+
+    jobs = []
+    skipped = 0
+    for input_path in args.inputs:
+        input_path = Path(input_path)
+        for tlog in (glob_logs(input_path, "*.tlog") if input_path.is_dir() else [input_path]):
+            output_folder = Path(args.output) if args.output else tlog.parent
+            output_folder.mkdir(parents=True, exist_ok=True)
+            output_npz = output_folder / (strip_compression_suffix(tlog).stem + ".npz")
+            if not args.force and output_npz.exists() and output_npz.stat().st_mtime >= tlog.stat().st_mtime:
+                skipped += 1
+                continue
+            jobs.append((tlog, output_npz))
+
+    failures = 0
+    with ProcessPoolExecutor(max_workers=max(1, min(args.jobs, len(jobs)))) as executor:
+        futures = [executor.submit(extract_to_npz, str(tlog), str(output_npz), types) for tlog, output_npz in jobs]
+        for future in as_completed(futures):
+            input_tlog, counts, summary, error, seconds = future.result()
+            if error is None:
+                print(f"Extracted {input_tlog} ({seconds:.1f} s): {summary}")
+                print("    " + ", ".join(f"{type_name} {count}" for type_name, count in counts.items()))
+            else:
+                print(f"Error extracting {input_tlog}:\n{error}")
+                failures += 1
+    print(f"\n{len(jobs) - failures} extracted, {failures} failed, {skipped} skipped (up to date)")
+
+if __name__ == "__main__":
+    main()